@@ -22,18 +22,42 @@ python3 -m aiohttp.web -H 0.0.0.0 -P 8000 app:init_func
 
 """
 
-from asyncio.log import logger
 import os
 import json
 import logging
-from typing import Dict, List, Optional
+import random
+from typing import Awaitable, Callable, Dict, List, Optional
 from dotenv import load_dotenv
+try:
+    # orjson decodes activity bodies several times faster; the standard library is the fallback
+    from orjson import loads as json_loads
+except ImportError:
+    from json import loads as json_loads
+import aiohttp
 from aiohttp import web
 from databricks.sdk import WorkspaceClient
+from databricks.sdk.core import Config
+from databricks.sdk.errors import (
+    DeadlineExceeded,
+    InternalError,
+    PermissionDenied,
+    TemporarilyUnavailable,
+    TooManyRequests,
+    Unauthenticated,
+)
 from databricks.sdk.service.dashboards import GenieAPI
 import asyncio
+import hmac
+import operator
 import sys
+import threading
+import time
 import traceback
+from bisect import bisect_right
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import accumulate
+from json.encoder import encode_basestring_ascii
 from datetime import datetime, timezone, timedelta
 from http import HTTPStatus
 from aiohttp.web import Request, Response, json_response
@@ -42,6 +66,7 @@ from botbuilder.core import (
     BotFrameworkAdapter,
     ActivityHandler,
     TurnContext,
+    serializer_helper,
 )
 from botbuilder.core.integration import aiohttp_error_middleware
 from botbuilder.integration.aiohttp import (
@@ -52,17 +77,43 @@ from botbuilder.schema import (
     Activity,
     ConversationReference,
     ActivityTypes,
+    ActionTypes,
+    CardAction,
     ChannelAccount,
     InvokeResponse,
+    SuggestedActions,
 )
+from msrest.serialization import Model
 import requests
 import re
 
 from config import DefaultConfig
-from botbuilder.core.teams import TeamsInfo
+from log_setup import configure_logging
+from loop_monitor import LoopLagMonitor
+from profiler import MemoryDiff, SamplingProfiler
+from feedback_journal import FeedbackJournal
+from metrics import MetricsRegistry
+from tracing import SpanExporter, Tracer
+from traffic_recorder import TrafficRecorder
+from genie_routing import DEFAULT_TARGET, GenieRouter, RateLimiter, TargetSpec, parse_routes, parse_targets
+from question_index import QuestionIndex
+from prefetch import FollowUpPrefetcher
+from sample_answers import SampleAnswerCache
+from subscriptions import SubscriptionScheduler, SubscriptionStore
+from result_store import ResultStore, frame_to_answer, result_to_frame, run_command
+from botbuilder.core.teams import TeamsInfo, teams_get_channel_id, teams_get_team_info
 
 CONFIG = DefaultConfig()
 
+log_setup = configure_logging(
+    level=CONFIG.LOG_LEVEL,
+    async_handler=CONFIG.LOG_ASYNC,
+    rate_limit_per_minute=CONFIG.LOG_RATE_LIMIT_PER_MINUTE,
+    sample_rate=CONFIG.LOG_SAMPLE_RATE,
+    max_queue=CONFIG.LOG_QUEUE_SIZE,
+)
+logger = logging.getLogger(__name__)
+
 
 class UserSession:
     """Represents a user session with email-based identification"""
@@ -75,10 +126,35 @@ class UserSession:
         self.last_activity = datetime.now(timezone.utc)
         self.is_authenticated = True  # Always true for Teams users
         self.user_context = {}
+        self.conversation_generation = 0  # Bumped on reset so late answers cannot revive an old conversation
+        self.genie_target = DEFAULT_TARGET  # Genie target the current conversation lives in
+        self.conversation_started_at: Optional[datetime] = None
+        self.conversation_message_count = 0
+        self.conversation_latencies: List[float] = []  # Seconds per answered message in the current conversation
+        self.recent_turns: deque = deque(maxlen=3)  # (question, answer summary) carried over on rollover
     
     def update_activity(self):
         """Update the last activity timestamp"""
         self.last_activity = datetime.now(timezone.utc)
+
+    def reset_conversation(self):
+        """Forget the current Genie conversation so the next question starts a new one"""
+        self.conversation_id = None
+        self.conversation_generation += 1
+        self.user_context.pop('last_conversation_id', None)
+        self.conversation_started_at = None
+        self.conversation_message_count = 0
+        self.conversation_latencies = []
+        self.recent_turns.clear()
+
+    def record_turn(self, question: str, summary: str, latency: Optional[float]):
+        """Record an answered message in the current conversation"""
+        if self.conversation_started_at is None:
+            self.conversation_started_at = datetime.now(timezone.utc)
+        self.conversation_message_count += 1
+        if latency is not None:
+            self.conversation_latencies.append(latency)
+        self.recent_turns.append((question, summary))
     
     def to_dict(self):
         """Convert session to dictionary for logging/debugging"""
@@ -96,6 +172,143 @@ class UserSession:
         """Get a friendly display name for the user"""
         return f"{self.name} ({self.email})"
 
+
+class ConversationMessageIndex:
+    """Bounded, append-only index of Genie message IDs per conversation.
+
+    Each conversation keeps a fixed-size ring of its most recent message IDs so the
+    latest or Nth-latest message is an O(1) lookup. Conversations are evicted least
+    recently used first once max_conversations is reached.
+    """
+    def __init__(self, max_conversations: int = 10000, max_messages_per_conversation: int = 50):
+        self.max_conversations = max(1, max_conversations)
+        self.max_messages = max(1, max_messages_per_conversation)
+        # conversation_id -> [total appended count, ring of message IDs]
+        self._conversations: "OrderedDict[str, list]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def append(self, conversation_id: str, message_id: str):
+        """Record a new message ID as the latest message in a conversation"""
+        if not conversation_id or not message_id:
+            return
+        entry = self._conversations.get(conversation_id)
+        if entry is None:
+            entry = [0, [None] * self.max_messages]
+            self._conversations[conversation_id] = entry
+            if len(self._conversations) > self.max_conversations:
+                self._conversations.popitem(last=False)
+        else:
+            self._conversations.move_to_end(conversation_id)
+        entry[1][entry[0] % self.max_messages] = message_id
+        entry[0] += 1
+
+    def peek(self, conversation_id: str, n: int = 0) -> Optional[str]:
+        """Return the Nth most recent message ID (0 = latest), or None if not indexed, without counting a lookup"""
+        entry = self._conversations.get(conversation_id) if conversation_id else None
+        if entry is None or n < 0 or n >= min(entry[0], self.max_messages):
+            return None
+        return entry[1][(entry[0] - 1 - n) % self.max_messages]
+
+    def get(self, conversation_id: str, n: int = 0) -> Optional[str]:
+        """Return the Nth most recent message ID (0 = latest), or None if not indexed"""
+        message_id = self.peek(conversation_id, n)
+        if message_id is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return message_id
+
+    def latest(self, conversation_id: str) -> Optional[str]:
+        """Return the most recent message ID for a conversation"""
+        return self.get(conversation_id, 0)
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            "conversations": len(self._conversations),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+        }
+
+    def __len__(self):
+        return len(self._conversations)
+
+
+class ConversationLatencyStats:
+    """Genie latency by message position within a conversation, and rollover counts by reason.
+
+    Shows how answer latency grows as conversations get longer, for tuning the rollover policy.
+    Positions beyond max_position are pooled into the last bucket.
+    """
+    def __init__(self, max_position: int = 50, samples_per_position: int = 200):
+        self.max_position = max_position
+        self.samples_per_position = samples_per_position
+        self._samples: Dict[int, deque] = {}
+        self._counts: Dict[int, int] = {}
+        self.rollovers: Dict[str, int] = {}
+
+    def record(self, position: int, latency: float):
+        position = min(max(1, position), self.max_position)
+        self._samples.setdefault(position, deque(maxlen=self.samples_per_position)).append(latency)
+        self._counts[position] = self._counts.get(position, 0) + 1
+
+    def record_rollover(self, reason: str):
+        self.rollovers[reason] = self.rollovers.get(reason, 0) + 1
+
+    def summary(self) -> Dict:
+        by_position = {}
+        for position in sorted(self._samples):
+            samples = sorted(self._samples[position])
+            by_position[str(position)] = {
+                "count": self._counts[position],
+                "p50_seconds": round(samples[len(samples) // 2], 2),
+                "p95_seconds": round(samples[min(len(samples) - 1, int(len(samples) * 0.95))], 2),
+            }
+        return {"by_message_position": by_position, "rollovers": dict(self.rollovers)}
+
+
+def rollover_reason(user_session: UserSession) -> Optional[str]:
+    """Return why the user's Genie conversation should be rolled over, or None to keep it"""
+    if user_session.conversation_id is None or user_session.conversation_started_at is None:
+        return None
+    if CONFIG.CONVERSATION_MAX_MESSAGES and user_session.conversation_message_count >= CONFIG.CONVERSATION_MAX_MESSAGES:
+        return "max_messages"
+    age = datetime.now(timezone.utc) - user_session.conversation_started_at
+    if CONFIG.CONVERSATION_MAX_AGE_MINUTES and age > timedelta(minutes=CONFIG.CONVERSATION_MAX_AGE_MINUTES):
+        return "max_age"
+    latencies = user_session.conversation_latencies
+    window = CONFIG.CONVERSATION_LATENCY_WINDOW
+    if CONFIG.CONVERSATION_LATENCY_REGRESSION_FACTOR and len(latencies) >= 2 * window:
+        # Compare the latest messages with the conversation's first ones
+        baseline = sorted(latencies[:window])[window // 2]
+        recent = sorted(latencies[-window:])[window // 2]
+        if recent >= CONFIG.CONVERSATION_LATENCY_FLOOR_SECONDS and recent > baseline * CONFIG.CONVERSATION_LATENCY_REGRESSION_FACTOR:
+            return "latency_regression"
+    return None
+
+
+def answer_summary(answer_json: Dict, max_chars: int = 120) -> str:
+    """A one-line gist of an answer, carried into the next conversation on rollover"""
+    if "error" in answer_json:
+        return ""
+    text = answer_json.get("query_description") or answer_json.get("message") or ""
+    text = " ".join(str(text).split())
+    return text if len(text) <= max_chars else text[: max_chars - 1].rstrip() + "…"
+
+
+def rollover_context(user_session: UserSession, question: str) -> str:
+    """Prefix a question with a short summary of the conversation it rolls over from"""
+    turns = "; ".join(
+        f"\"{turn_question}\"" + (f" ({summary})" if summary else "") for turn_question, summary in user_session.recent_turns
+    )
+    context = f"Context from my earlier questions: {turns}."
+    if len(context) > CONFIG.CONVERSATION_SUMMARY_MAX_CHARS:
+        context = context[: CONFIG.CONVERSATION_SUMMARY_MAX_CHARS - 1].rstrip() + "…"
+    return f"{context}\n\n{question}"
+
+
 # For local development with Bot Framework Emulator, use BotFrameworkAdapter
 if CONFIG.APP_ID and CONFIG.APP_PASSWORD:
     # Production: Use CloudAdapter
@@ -109,7 +322,7 @@ else:
 async def on_error(context: TurnContext, error: Exception):
     import traceback
     stack = traceback.format_exc()
-    logger.error(f"❌ Unhandled error in bot: {error}\n{stack}")
+    logger.error("❌ Unhandled error in bot: %s\n%s", error, stack)
     # Optional: echo a safe message back to Teams (for testing only)
     try:
         await context.send_activity(f"⚠️ Internal bot error:\n```\n{error}\n```")
@@ -120,134 +333,729 @@ async def on_error(context: TurnContext, error: Exception):
 ADAPTER.on_turn_error = on_error
 
 # Initialize Databricks client with error handling
-def get_databricks_client():
-    """Get Databricks WorkspaceClient with proper error handling"""
+def get_databricks_client(spec: TargetSpec):
+    """Get a Databricks WorkspaceClient for a Genie target with proper error handling"""
 
     try:
-        # Debug environment variable loading
-        logger.info(f"Loading Databricks configuration...")
-        logger.info(f"DATABRICKS_HOST: {CONFIG.DATABRICKS_HOST}")
-        logger.info(f"DATABRICKS_TOKEN present: {bool(CONFIG.DATABRICKS_TOKEN)}")
-        logger.info(f"DATABRICKS_TOKEN length: {len(CONFIG.DATABRICKS_TOKEN) if CONFIG.DATABRICKS_TOKEN else 0}")
-        
-        if not CONFIG.DATABRICKS_TOKEN:
-            raise ValueError("DATABRICKS_TOKEN environment variable is not set")
+        logger.info("Loading Databricks configuration for Genie target '%s' (%s)", spec.name, spec.host)
+
+        if not spec.token:
+            raise ValueError(f"No Databricks token is set for Genie target '{spec.name}'")
         
+        # Keep the SDK's own retry window short; ask_genie retries with backoff under the question deadline.
+        # The connection pool is sized to the target's executor threads.
         client = WorkspaceClient(
-            host=CONFIG.DATABRICKS_HOST, 
-            token=CONFIG.DATABRICKS_TOKEN
+            config=Config(
+                host=spec.host,
+                token=spec.token,
+                retry_timeout_seconds=CONFIG.DATABRICKS_SDK_RETRY_TIMEOUT_SECONDS,
+                max_connections_per_pool=spec.max_workers,
+            )
         )
         logger.info("Databricks client initialized successfully")
         return client
     except Exception as e:
-        logger.error(f"Failed to initialize Databricks client: {str(e)}")
+        logger.error("Failed to initialize Databricks client: %s", e)
         raise
 
-# Initialize clients
-workspace_client = get_databricks_client()
-genie_api = GenieAPI(workspace_client.api_client)
+message_index = ConversationMessageIndex(
+    CONFIG.MESSAGE_INDEX_MAX_CONVERSATIONS, CONFIG.MESSAGE_INDEX_MAX_MESSAGES
+)
+
+# Durable feedback journal (SQLite WAL, group-committed by a background writer thread)
+feedback_journal = (
+    FeedbackJournal(
+        CONFIG.FEEDBACK_JOURNAL_PATH,
+        batch_size=CONFIG.FEEDBACK_JOURNAL_BATCH_SIZE,
+        flush_interval=CONFIG.FEEDBACK_JOURNAL_FLUSH_INTERVAL,
+        max_queue=CONFIG.FEEDBACK_JOURNAL_MAX_QUEUE,
+    )
+    if CONFIG.ENABLE_FEEDBACK_JOURNAL
+    else None
+)
+
+# Last tabular result per user, kept as typed DataFrames for local re-slicing commands
+result_store = ResultStore(int(CONFIG.RESULT_STORE_MAX_MB * 1024 * 1024))
+
+# Daily question subscriptions; the scheduler that runs them is created with the adapter below
+subscription_store = SubscriptionStore(CONFIG.SUBSCRIPTIONS_PATH) if CONFIG.ENABLE_SUBSCRIPTIONS else None
+
+# Recent questions and answers that start a conversation, for reuse across near-identical questions
+question_index = (
+    QuestionIndex(
+        threshold=CONFIG.QUESTION_REUSE_THRESHOLD,
+        ttl_seconds=CONFIG.QUESTION_REUSE_TTL_MINUTES * 60,
+        max_entries=CONFIG.QUESTION_INDEX_MAX_ENTRIES,
+        max_bytes=int(CONFIG.QUESTION_INDEX_MAX_MB * 1024 * 1024),
+    )
+    if CONFIG.ENABLE_QUESTION_REUSE
+    else None
+)
+
+# Genie latency by position within a conversation, to see where rollover pays off
+conversation_latency_stats = ConversationLatencyStats()
+
+# Prometheus metrics served at /metrics. Histograms and counters are recorded inline on the
+# event loop; gauges are callbacks read only when /metrics is scraped.
+metrics = MetricsRegistry()
+stage_seconds = metrics.histogram(
+    "genie_bot_stage_seconds", "Time spent in each stage of handling a question", ("stage",)
+)
+databricks_call_seconds = metrics.histogram(
+    "genie_bot_databricks_call_seconds", "Databricks SDK call latency including retries", ("call", "target")
+)
+question_errors = metrics.counter(
+    "genie_bot_question_errors_total", "Questions that failed, by error class", ("error_class",)
+)
+databricks_call_errors = metrics.counter(
+    "genie_bot_databricks_call_errors_total", "Databricks SDK calls that failed after retries", ("call", "target", "error_class")
+)
+event_loop_lag_seconds = metrics.histogram(
+    "genie_bot_event_loop_lag_seconds", "How late the event loop heartbeat woke up",
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+event_loop_stalls = metrics.counter(
+    "genie_bot_event_loop_stalls_total", "Times the event loop was blocked for longer than LOOP_LAG_THRESHOLD_MS"
+)
+
+# Event loop lag, and the stack of whatever blocks the loop when it stalls
+loop_monitor = LoopLagMonitor(
+    interval=CONFIG.LOOP_MONITOR_INTERVAL_MS / 1000,
+    threshold=CONFIG.LOOP_LAG_THRESHOLD_MS / 1000,
+    on_lag=event_loop_lag_seconds.observe,
+    on_stall=lambda stall: event_loop_stalls.inc(),
+) if CONFIG.ENABLE_LOOP_MONITOR else None
+
+# Per-turn tracing: a root span per activity with child spans for Databricks and Connector calls
+tracer = Tracer(
+    SpanExporter(
+        CONFIG.TRACE_EXPORTER,
+        path=CONFIG.TRACE_EXPORT_PATH,
+        endpoint=CONFIG.TRACE_OTLP_ENDPOINT,
+        service_name=CONFIG.TRACE_SERVICE_NAME,
+    )
+    if CONFIG.TRACE_EXPORTER != "none"
+    else None,
+    sample_rate=CONFIG.TRACE_SAMPLE_RATE,
+)
+
+# Recording of incoming activities and Databricks responses for offline replay (opt-in)
+traffic_recorder = (
+    TrafficRecorder(CONFIG.TRAFFIC_RECORDING_PATH, max_bytes=int(CONFIG.TRAFFIC_RECORDING_MAX_MB * 1024 * 1024))
+    if CONFIG.ENABLE_TRAFFIC_RECORDING
+    else None
+)
+
+# Application-scoped HTTP client for raw REST calls to DATABRICKS_HOST.
+# Created in on_startup and closed on cleanup so every call reuses pooled keep-alive connections.
+databricks_http_session: Optional[aiohttp.ClientSession] = None
+
+
+def create_databricks_http_session() -> aiohttp.ClientSession:
+    """Create the shared aiohttp session used for direct Databricks REST calls"""
+    connector = aiohttp.TCPConnector(
+        limit=CONFIG.DATABRICKS_HTTP_POOL_SIZE,
+        limit_per_host=CONFIG.DATABRICKS_HTTP_POOL_SIZE_PER_HOST,
+        ttl_dns_cache=CONFIG.DATABRICKS_HTTP_DNS_CACHE_TTL,
+        keepalive_timeout=CONFIG.DATABRICKS_HTTP_KEEPALIVE_TIMEOUT,
+    )
+    timeout = aiohttp.ClientTimeout(
+        total=CONFIG.DATABRICKS_HTTP_TOTAL_TIMEOUT,
+        connect=CONFIG.DATABRICKS_HTTP_CONNECT_TIMEOUT,
+        sock_read=CONFIG.DATABRICKS_HTTP_READ_TIMEOUT,
+    )
+    return aiohttp.ClientSession(
+        connector=connector,
+        timeout=timeout,
+        headers={
+            "Authorization": f"Bearer {CONFIG.DATABRICKS_TOKEN}",
+            "Content-Type": "application/json",
+        },
+    )
+
+
+def get_databricks_http_session() -> aiohttp.ClientSession:
+    """Return the shared Databricks HTTP session, creating it if startup has not run yet"""
+    global databricks_http_session
+    if databricks_http_session is None or databricks_http_session.closed:
+        databricks_http_session = create_databricks_http_session()
+    return databricks_http_session
+
+
+async def close_databricks_http_session():
+    """Close the shared Databricks HTTP session and release pooled connections"""
+    global databricks_http_session
+    if databricks_http_session is not None and not databricks_http_session.closed:
+        await databricks_http_session.close()
+    databricks_http_session = None
+
+
+async def databricks_rest_request(
+    method: str, path: str, payload: Optional[Dict] = None, host: Optional[str] = None, token: Optional[str] = None
+) -> tuple[int, str]:
+    """Send a raw REST request to DATABRICKS_HOST (or another workspace host) over the shared session.
+
+    Returns the HTTP status code and response body text.
+    """
+    url = f"{(host or CONFIG.DATABRICKS_HOST).rstrip('/')}/{path.lstrip('/')}"
+    headers = {"Authorization": f"Bearer {token}"} if token else None
+    session = get_databricks_http_session()
+    async with session.request(method, url, json=payload, headers=headers) as response:
+        return response.status, await response.text()
+
+
+class Deadline:
+    """Time budget for one question, shared by every stage that works on it"""
+    def __init__(self, seconds: float):
+        self.seconds = seconds
+        self.expires_at = time.monotonic() + seconds
+
+    def remaining(self) -> float:
+        """Seconds left before the deadline (never negative)"""
+        return max(self.expires_at - time.monotonic(), 0.0)
+
+    @property
+    def expired(self) -> bool:
+        return time.monotonic() >= self.expires_at
+
+
+class GenieRun:
+    """An in-flight Genie question: its deadline and the IDs needed to cancel it.
+
+    IDs are filled in as they become known so cancellation can stop the work that
+    has actually started.
+    """
+    def __init__(self, target: "GenieTarget", deadline: Deadline):
+        self.target = target
+        self.space_id = target.space_id
+        self.deadline = deadline
+        self.conversation_id: Optional[str] = None
+        self.message_id: Optional[str] = None
+        self.statement_id: Optional[str] = None
+        self.cancel_reason: Optional[str] = None
+
+
+# Databricks error classes used to decide whether to retry and what to tell the user
+ERROR_THROTTLED = "throttled"
+ERROR_TRANSIENT = "transient"
+ERROR_AUTH = "auth"
+ERROR_ACL = "acl"
+ERROR_OTHER = "other"
+
+
+def classify_databricks_error(error: BaseException) -> str:
+    """Map an exception from a Databricks call to one of the ERROR_* classes"""
+    message = str(error).lower()
+    # Error message format: "Source IP address: X.X.X.X is blocked by Databricks IP ACL for workspace"
+    if "ip acl" in message and "blocked" in message:
+        return ERROR_ACL
+    if isinstance(error, TooManyRequests):
+        return ERROR_THROTTLED
+    if isinstance(error, (Unauthenticated, PermissionDenied)):
+        return ERROR_AUTH
+    if isinstance(error, (TemporarilyUnavailable, InternalError, DeadlineExceeded)):
+        return ERROR_TRANSIENT
+    if isinstance(error, (requests.exceptions.ConnectionError, requests.exceptions.Timeout, ConnectionError)):
+        return ERROR_TRANSIENT
+    return ERROR_OTHER
+
+
+class CircuitBreaker:
+    """Consecutive-failure circuit breaker for the Databricks backend.
+
+    After failure_threshold consecutive throttled/transient failures the breaker opens:
+    requests fail fast with a cached status message while a background task probes the
+    backend every probe_interval seconds and closes the breaker once a probe succeeds.
+    """
+    CLOSED = "closed"
+    OPEN = "open"
+
+    def __init__(
+        self, failure_threshold: int, probe_interval: float, probe: Callable[[], Awaitable[None]], name: str = DEFAULT_TARGET
+    ):
+        self.name = name
+        self.failure_threshold = max(1, failure_threshold)
+        self.probe_interval = probe_interval
+        self.probe = probe
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at: Optional[datetime] = None
+        self.status_message = ""
+        self._probe_task: Optional[asyncio.Task] = None
+
+    @property
+    def is_open(self) -> bool:
+        return self.state == self.OPEN
+
+    def record_success(self):
+        self.consecutive_failures = 0
+
+    def record_failure(self, error_class: str):
+        """Count a failed call; only backend-health failures can open the breaker"""
+        if error_class not in (ERROR_THROTTLED, ERROR_TRANSIENT):
+            return
+        self.consecutive_failures += 1
+        if self.state == self.CLOSED and self.consecutive_failures >= self.failure_threshold:
+            self._open(error_class)
+
+    def _open(self, error_class: str):
+        self.state = self.OPEN
+        self.opened_at = datetime.now(timezone.utc)
+        reason = "is rate limiting requests" if error_class == ERROR_THROTTLED else "is temporarily unavailable"
+        self.status_message = (
+            f"⚠️ **Databricks {reason}**\n\n"
+            f"Requests have been paused since {self.opened_at.strftime('%H:%M UTC')} to let the service recover. "
+            "I'm checking in the background and will resume automatically - please try again in a few minutes."
+        )
+        logger.error(
+            "Circuit breaker for Genie target '%s' opened after %s consecutive %s failures",
+            self.name, self.consecutive_failures, error_class,
+        )
+        if self._probe_task is None or self._probe_task.done():
+            self._probe_task = asyncio.get_running_loop().create_task(self._probe_until_recovered())
+
+    async def _probe_until_recovered(self):
+        while self.state == self.OPEN:
+            await asyncio.sleep(self.probe_interval)
+            try:
+                await self.probe()
+            except Exception as e:
+                logger.warning("Circuit breaker probe for Genie target '%s' failed: %s", self.name, e)
+                continue
+            self.state = self.CLOSED
+            self.consecutive_failures = 0
+            logger.info("Circuit breaker for Genie target '%s' closed - Databricks probe succeeded", self.name)
+
+    async def close(self):
+        """Stop the background probe (used on shutdown)"""
+        if self._probe_task is not None:
+            self._probe_task.cancel()
+            await asyncio.gather(self._probe_task, return_exceptions=True)
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling Databricks while the circuit breaker is open"""
+
+
+class GenieTarget:
+    """A Genie space and the Databricks resources dedicated to it.
+
+    Each target has its own SDK client (and HTTP connection pool), executor threads for
+    blocking SDK calls, rate limiter and circuit breaker, so a slow or throttled target
+    cannot hold up questions routed to the others.
+    """
+    def __init__(self, spec: TargetSpec):
+        self.name = spec.name
+        self.space_id = spec.space_id
+        self.host = spec.host
+        self.token = spec.token
+        self.workspace_client = get_databricks_client(spec)
+        self.genie_api = GenieAPI(self.workspace_client.api_client)
+        self.executor = ThreadPoolExecutor(max_workers=spec.max_workers, thread_name_prefix=f"genie-{spec.name}")
+        self.limiter = RateLimiter(spec.rate_limit_per_second, spec.rate_limit_burst)
+        self.breaker = CircuitBreaker(
+            CONFIG.DATABRICKS_BREAKER_FAILURE_THRESHOLD, CONFIG.DATABRICKS_BREAKER_PROBE_INTERVAL, self.probe, spec.name
+        )
+        self.calls_in_flight = 0
+
+    async def probe(self):
+        """Cheap authenticated call used to detect that Databricks has recovered"""
+        await asyncio.get_running_loop().run_in_executor(self.executor, self.workspace_client.current_user.me)
+
+    async def run(self, func, *args):
+        """Run a blocking SDK call on this target's executor"""
+        self.calls_in_flight += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self.executor, func, *args)
+        finally:
+            self.calls_in_flight -= 1
+
+    def stats(self) -> Dict:
+        return {
+            "space_id": self.space_id,
+            "circuit": self.breaker.state,
+            "calls_in_flight": self.calls_in_flight,
+            "rate_limiter": self.limiter.stats(),
+        }
+
+    async def close(self):
+        await self.breaker.close()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+# Genie targets and the routes that map teams, channels and command prefixes to them
+_default_target_spec = TargetSpec(
+    DEFAULT_TARGET,
+    CONFIG.DATABRICKS_SPACE_ID,
+    CONFIG.DATABRICKS_HOST,
+    CONFIG.DATABRICKS_TOKEN,
+    CONFIG.GENIE_TARGET_MAX_WORKERS,
+    CONFIG.GENIE_TARGET_RATE_LIMIT_PER_SECOND,
+    CONFIG.GENIE_TARGET_RATE_LIMIT_BURST,
+)
+_target_specs = parse_targets(
+    CONFIG.GENIE_TARGETS,
+    _default_target_spec,
+    CONFIG.GENIE_TARGET_MAX_WORKERS,
+    CONFIG.GENIE_TARGET_RATE_LIMIT_PER_SECOND,
+    CONFIG.GENIE_TARGET_RATE_LIMIT_BURST,
+)
+genie_targets: Dict[str, GenieTarget] = {name: GenieTarget(spec) for name, spec in _target_specs.items()}
+genie_router = GenieRouter(parse_routes(CONFIG.GENIE_ROUTES, _target_specs), list(_target_specs))
+default_target = genie_targets[DEFAULT_TARGET]
+
+
+async def call_databricks(run: GenieRun, func, *args, idempotent: bool = True):
+    """Run a blocking Databricks SDK call in the executor, bounded by the run's deadline.
+
+    Calls go through the run's Genie target: its breaker, rate limiter and executor.
+    Throttled calls, and transient failures of idempotent calls, are retried with
+    full-jitter exponential backoff for as long as attempts and the deadline allow.
+    """
+    target = run.target
+    if target.breaker.is_open:
+        raise CircuitOpenError(target.breaker.status_message)
+    call_name = getattr(func, "__name__", "call")
+    started = time.perf_counter()
+    with tracer.start_span(f"databricks.{call_name}", {"genie.target": target.name}) as span:
+        attempt = 0
+        while True:
+            try:
+                await target.limiter.acquire(run.deadline.remaining())
+                result = await asyncio.wait_for(target.run(func, *args), run.deadline.remaining())
+            except asyncio.CancelledError:
+                raise
+            except asyncio.TimeoutError:
+                databricks_call_errors.inc(call_name, target.name, "timeout")
+                raise
+            except Exception as e:
+                error_class = classify_databricks_error(e)
+                retryable = error_class == ERROR_THROTTLED or (error_class == ERROR_TRANSIENT and idempotent)
+                delay = random.uniform(
+                    0, min(CONFIG.DATABRICKS_RETRY_MAX_DELAY, CONFIG.DATABRICKS_RETRY_BASE_DELAY * (2 ** attempt))
+                )
+                if not retryable or attempt >= CONFIG.DATABRICKS_RETRY_MAX_ATTEMPTS or delay >= run.deadline.remaining():
+                    target.breaker.record_failure(error_class)
+                    databricks_call_errors.inc(call_name, target.name, error_class)
+                    if traffic_recorder is not None:
+                        traffic_recorder.record_call(call_name, args, time.perf_counter() - started, error_class=error_class, error=e)
+                    span.set_attribute("error.class", error_class)
+                    span.set_attribute("retries", attempt)
+                    raise
+                attempt += 1
+                logger.warning(
+                    "%s error from %s, retry %s/%s in %.2fs: %s",
+                    error_class.capitalize(), getattr(func, '__name__', func), attempt, CONFIG.DATABRICKS_RETRY_MAX_ATTEMPTS, delay, e,
+                )
+                await asyncio.sleep(delay)
+                continue
+            target.breaker.record_success()
+            if attempt:
+                span.set_attribute("retries", attempt)
+            elapsed = time.perf_counter() - started
+            databricks_call_seconds.observe(elapsed, call_name, target.name)
+            if traffic_recorder is not None:
+                traffic_recorder.record_call(call_name, args, elapsed, result)
+            return result
+
+
+def cancel_genie_run(run: GenieRun):
+    """Stop the warehouse work behind a run without waiting for the result.
+
+    The Genie chat API has no endpoint to cancel a message, so the SQL statement it
+    started (if any) is cancelled through the Statement Execution API.
+    """
+    if not run.statement_id:
+        return
+
+    def _log_result(future):
+        if future.exception() is not None:
+            logger.warning("Failed to cancel statement %s: %s", run.statement_id, future.exception())
+        else:
+            logger.info("Cancelled statement %s for message %s", run.statement_id, run.message_id)
+
+    future = asyncio.get_running_loop().run_in_executor(
+        run.target.executor, run.target.workspace_client.statement_execution.cancel_execution, run.statement_id
+    )
+    future.add_done_callback(_log_result)
+
+
+# User-facing messages for each Databricks error class
+ERROR_MESSAGES = {
+    ERROR_ACL: "⚠️ **IP Access Blocked**\n\n"
+               "The bot's IP address is blocked by Databricks Account IP Access Control Lists (ACLs).\n\n"
+               "**Administrator Action Required:**\n"
+               "Please check the TROUBLESHOOTING.md documentation for instructions on adding "
+               "the bot's IP address to your Databricks Account IP allow list.",
+    ERROR_AUTH: "🔑 **Databricks Authentication Failed**\n\n"
+                "The bot's Databricks credentials were rejected or lack access to this Genie space.\n\n"
+                f"Please contact the bot administrator at: {CONFIG.ADMIN_CONTACT_EMAIL}",
+    ERROR_THROTTLED: "⏳ **Genie is busy right now**\n\n"
+                     "Databricks is rate limiting requests. Please try again in a minute.",
+    ERROR_TRANSIENT: "⚠️ **Databricks is temporarily unavailable**\n\n"
+                     "Please try again in a few minutes.",
+    ERROR_OTHER: "An error occurred while processing your request.",
+}
+
+
+# Genie message states that end polling
+GENIE_TERMINAL_STATUSES = ("COMPLETED", "FAILED", "CANCELLED", "QUERY_RESULT_EXPIRED")
+
+# Status lines shown in the progress message while a Genie message is being processed
+GENIE_STATUS_MESSAGES = {
+    "SUBMITTED": "📨 Question submitted to Genie...",
+    "FETCHING_METADATA": "🔎 Fetching metadata...",
+    "FILTERING_CONTEXT": "🧭 Finding the relevant data...",
+    "ASKING_AI": "💭 Genie is working out the answer...",
+    "PENDING_WAREHOUSE": "⏳ Waiting for the SQL warehouse to start...",
+    "EXECUTING_QUERY": "⚙️ Running the query...",
+    "COMPLETED": "📊 Preparing your results...",
+}
+
+
+async def wait_for_genie_message(
+    space_id: str,
+    conversation_id: str,
+    message_id: str,
+    on_progress: Optional[Callable[[str], Awaitable[None]]] = None,
+    timeout: float = 1200,
+    run: Optional[GenieRun] = None,
+):
+    """Poll a Genie message until it reaches a terminal state.
+
+    Unlike the SDK's *_and_wait helpers, sleeping between polls happens on the event loop,
+    so no executor thread is held for the whole run. on_progress is awaited with the new
+    status name whenever the message changes state. If a run is given, the statement ID
+    of the generated query is recorded on it so the query can be cancelled.
+    """
+    if run is None:
+        run = GenieRun(default_target, Deadline(timeout))
+    loop = asyncio.get_running_loop()
+    give_up_at = loop.time() + min(timeout, run.deadline.remaining())
+    interval = CONFIG.GENIE_POLL_INITIAL_INTERVAL
+    last_status = None
+    while True:
+        message = await call_databricks(run, run.target.genie_api.get_message, space_id, conversation_id, message_id)
+        status = message.status.value if message.status is not None else None
+        if run.statement_id is None:
+            for attachment in message.attachments or []:
+                if attachment.query and attachment.query.statement_id:
+                    run.statement_id = attachment.query.statement_id
+                    break
+        if status != last_status:
+            last_status = status
+            if on_progress is not None and status:
+                try:
+                    await on_progress(status)
+                except Exception as e:
+                    logger.warning("Progress update failed: %s", e)
+        if status == "COMPLETED":
+            return message
+        if status in GENIE_TERMINAL_STATUSES:
+            error = getattr(message.error, "error", None) if message.error else None
+            raise Exception(f"Genie message {message_id} ended with status {status}: {error or 'no details'}")
+        if loop.time() >= give_up_at:
+            raise TimeoutError(f"Timed out after {timeout}s waiting for Genie message {message_id} (status {status})")
+        await asyncio.sleep(min(interval, max(give_up_at - loop.time(), 0)))
+        interval = min(interval * 1.5, CONFIG.GENIE_POLL_MAX_INTERVAL)
 
 
 async def ask_genie(
-    question: str, space_id: str, user_session: UserSession, conversation_id: Optional[str] = None
+    question: str,
+    target: GenieTarget,
+    user_session: UserSession,
+    conversation_id: Optional[str] = None,
+    on_progress: Optional[Callable[[str], Awaitable[None]]] = None,
+    run: Optional[GenieRun] = None,
 ) -> tuple[str, str, str]:
-    try:
-        # Add user context to the question for better tracking in Databricks
-        contextual_question = f"[{user_session.email}] {question}"
+    """Ask a Genie target a question and return (answer JSON, conversation ID, Genie message ID).
+
+    Every stage - starting the message, waiting for Genie, and fetching results - shares the
+    run's deadline. When the deadline expires or the task is cancelled, the run's warehouse
+    statement is cancelled too.
+    """
+    if run is None:
+        run = GenieRun(target, Deadline(CONFIG.GENIE_QUESTION_TIMEOUT_SECONDS))
+    space_id = target.space_id
+    genie_api = target.genie_api
+    run.conversation_id = conversation_id
+    started = time.perf_counter()
+    with tracer.start_span("genie.ask", {"genie.target": target.name, "genie.space_id": space_id}) as span:
+        try:
+            # Add user context to the question for better tracking in Databricks
+            contextual_question = f"[{user_session.email}] {question}"
         
-        loop = asyncio.get_running_loop()
-        if conversation_id is None:
-            # Start a new conversation
-            initial_message = await loop.run_in_executor(
-                None, genie_api.start_conversation_and_wait, space_id, contextual_question
-            )
-            conversation_id = initial_message.conversation_id
-        else:
-            # Continue existing conversation with a new message
-            initial_message = await loop.run_in_executor(
-                None, genie_api.create_message_and_wait, space_id, conversation_id, contextual_question
+            if conversation_id is None:
+                # Start a new conversation
+                waiter = await call_databricks(
+                    run, genie_api.start_conversation, space_id, contextual_question, idempotent=False
+                )
+                conversation_id = waiter.conversation_id
+            else:
+                # Continue existing conversation with a new message
+                waiter = await call_databricks(
+                    run, genie_api.create_message, space_id, conversation_id, contextual_question, idempotent=False
+                )
+            run.conversation_id = conversation_id
+            run.message_id = waiter.message_id
+            span.set_attribute("genie.conversation_id", conversation_id)
+            span.set_attribute("genie.message_id", waiter.message_id)
+            message_index.append(conversation_id, waiter.message_id)
+            submitted = time.perf_counter()
+            stage_seconds.observe(submitted - started, "genie_submit")
+            # The completed message returned by polling already carries the attachments
+            initial_message = message_content = await wait_for_genie_message(
+                space_id, conversation_id, waiter.message_id, on_progress, run.deadline.remaining(), run
             )
+            answered = time.perf_counter()
+            stage_seconds.observe(answered - submitted, "genie_wait")
            
-        query_result = None
-        if initial_message.query_result is not None:
-            query_result = await loop.run_in_executor(
-                None,
-                genie_api.get_message_attachment_query_result,
-                #genie_api.get_message_query_result,
-                space_id,
-                initial_message.conversation_id,
-                initial_message.message_id,
-                initial_message.attachments[0].attachment_id,
-           )
-        message_content = await loop.run_in_executor(
-            None,
-            genie_api.get_message,
-            space_id,
-            initial_message.conversation_id,
-            initial_message.message_id,
-        )
-        if query_result and query_result.statement_response:
-            results = await loop.run_in_executor(
-                None,
-                workspace_client.statement_execution.get_statement,
-                query_result.statement_response.statement_id,
-            )
+            # Follow-up questions Genie suggests alongside its answer
+            suggested_questions = [
+                question
+                for attachment in message_content.attachments or []
+                if attachment.suggested_questions and attachment.suggested_questions.questions
+                for question in attachment.suggested_questions.questions
+            ]
 
-            query_description = ""
-            for attachment in message_content.attachments:
-                if attachment.query and attachment.query.description:
-                    query_description = attachment.query.description
-                    break
+            query_result = None
+            if initial_message.query_result is not None:
+                query_result = await call_databricks(
+                    run,
+                    genie_api.get_message_attachment_query_result,
+                    #genie_api.get_message_query_result,
+                    space_id,
+                    initial_message.conversation_id,
+                    initial_message.message_id,
+                    initial_message.attachments[0].attachment_id,
+                )
+            if query_result and query_result.statement_response:
+                run.statement_id = query_result.statement_response.statement_id
+                results = await call_databricks(
+                    run,
+                    target.workspace_client.statement_execution.get_statement,
+                    query_result.statement_response.statement_id,
+                )
+                stage_seconds.observe(time.perf_counter() - answered, "result_fetch")
+
+                query_description = ""
+                for attachment in message_content.attachments:
+                    if attachment.query and attachment.query.description:
+                        query_description = attachment.query.description
+                        break
+
+                return (
+                    json.dumps(
+                        {
+                            "columns": results.manifest.schema.as_dict(),
+                            "data": results.result.as_dict(),
+                            "query_description": query_description,
+                            "suggested_questions": suggested_questions,
+                        }
+                    ),
+                    conversation_id,
+                    initial_message.message_id,
+                )
+
+            if message_content.attachments:
+                for attachment in message_content.attachments:
+                    if attachment.text and attachment.text.content:
+                        return (
+                            json.dumps({"message": attachment.text.content, "suggested_questions": suggested_questions}),
+                            conversation_id,
+                            initial_message.message_id,
+                        )
 
             return (
-                json.dumps(
-                    {
-                        "columns": results.manifest.schema.as_dict(),
-                        "data": results.result.as_dict(),
-                        "query_description": query_description,
-                    }
-                ),
+                json.dumps({"message": message_content.content, "suggested_questions": suggested_questions}),
                 conversation_id,
                 initial_message.message_id,
             )
-
-        if message_content.attachments:
-            for attachment in message_content.attachments:
-                if attachment.text and attachment.text.content:
-                    return (
-                        json.dumps({"message": attachment.text.content}),
-                        conversation_id,
-                        initial_message.message_id,
-                    )
-
-        return json.dumps({"message": message_content.content}), conversation_id, initial_message.message_id
-    except Exception as e:
-        error_str = str(e).lower()  # Convert to lowercase for case-insensitive matching
-        error_original = str(e)  # Keep original for logging
-        logger.error(f"Error in ask_genie for user {user_session.get_display_name()}: {error_original}")
-        
-        # Check for IP ACL blocking - look for "blocked" + "ip acl" pattern
-        # Error message format: "Source IP address: X.X.X.X is blocked by Databricks IP ACL for workspace"
-        if "ip acl" in error_str and "blocked" in error_str:
-            logger.error(f"IP ACL blocking detected: {error_original}")
+        except asyncio.CancelledError:
+            logger.info("Genie question for %s cancelled (%s)", user_session.get_display_name(), run.cancel_reason or 'shutdown')
+            question_errors.inc("cancelled")
+            cancel_genie_run(run)
+            raise
+        except (asyncio.TimeoutError, TimeoutError):
+            question_errors.inc("timeout")
+            span.set_attribute("error.class", "timeout")
+            logger.warning(
+                "Genie question for %s exceeded its %.0fs deadline (message %s)",
+                user_session.get_display_name(), run.deadline.seconds, run.message_id,
+            )
+            cancel_genie_run(run)
             return (
                 json.dumps({
-                    "error": "⚠️ **IP Access Blocked**\n\n"
-                            "The bot's IP address is blocked by Databricks Account IP Access Control Lists (ACLs).\n\n"
-                            "**Administrator Action Required:**\n"
-                            "Please check the TROUBLESHOOTING.md documentation for instructions on adding "
-                            "the bot's IP address to your Databricks Account IP allow list."
+                    "error": "⏱️ **Request Timed Out**\n\n"
+                            f"Genie did not finish within {run.deadline.seconds:.0f} seconds, so the request was cancelled. "
+                            "Please try again or ask a narrower question."
                 }),
                 conversation_id,
                 None,
             )
-        
-        # Generic error for other cases
-        return (
-            json.dumps({"error": "An error occurred while processing your request."}),
-            conversation_id,
-            None,
-        )
+        except CircuitOpenError as e:
+            question_errors.inc("circuit_open")
+            span.set_attribute("error.class", "circuit_open")
+            logger.warning("Circuit breaker open, failing fast for user %s", user_session.get_display_name())
+            return json.dumps({"error": str(e)}), conversation_id, None
+        except Exception as e:
+            error_class = classify_databricks_error(e)
+            question_errors.inc(error_class)
+            span.set_attribute("error.class", error_class)
+            span.record_error(e)
+            logger.error("Error in ask_genie (%s) for user %s: %s", error_class, user_session.get_display_name(), e)
+            return (
+                json.dumps({"error": ERROR_MESSAGES.get(error_class, ERROR_MESSAGES[ERROR_OTHER])}),
+                conversation_id,
+                None,
+            )
+        finally:
+            span.set_attribute("genie.statement_id", run.statement_id)
+            stage_seconds.observe(time.perf_counter() - started, "ask_genie")
+
+
+# Commands matched on the whole lower-cased message, and the MyBot methods that answer them.
+# Looked up in one dict probe per message; anything else goes on to the pattern commands and Genie.
+TEXT_COMMANDS = {
+    **dict.fromkeys(("info", "/info"), "_info_command"),
+    **dict.fromkeys(("whoami", "/whoami", "who am i", "me"), "_whoami_command"),
+    **dict.fromkeys(("hi", "hello", "start", "hey"), "_hello_command"),
+    **dict.fromkeys(("help", "/help", "commands", "/commands", "information", "about", "what is this"), "_help_command"),
+    **dict.fromkeys(
+        (
+            "new conversation", "new chat", "start over", "reset", "clear conversation",
+            "/new", "/reset", "/clear", "/start", "begin again", "fresh start", "logout", "/logout",
+        ),
+        "_reset_command",
+    ),
+    **dict.fromkeys(("rerun", "re-run", "rerun fresh", "re-run fresh", "/rerun"), "_rerun_command"),
+}
+SUBSCRIPTION_LIST_COMMANDS = frozenset(("subscriptions", "my subscriptions", "list subscriptions", "/subscriptions"))
+SUBSCRIBE_COMMAND = re.compile(
+    r"^subscribe\s+(?:to\s+)?(?P<question>.+?)\s+(?:daily|every\s+day)\s+at\s+"
+    r"(?P<hour>\d{1,2})(?::(?P<minute>\d{2}))?\s*(?P<meridiem>am|pm)?$",
+    re.IGNORECASE,
+)
+UNSUBSCRIBE_COMMAND = re.compile(r"^unsubscribe\s+#?(?P<target>\d+|all)$", re.IGNORECASE)
+
+
+FLOAT_TYPE_NAMES = ("DECIMAL", "DOUBLE", "FLOAT")
+INTEGER_TYPE_NAMES = ("INT", "BIGINT", "LONG")
+
+
+def format_result_column(values, type_name: str) -> List[str]:
+    """Format one result column for display, choosing the formatter once per column"""
+    if type_name in FLOAT_TYPE_NAMES:
+        return ["NULL" if value is None else f"{float(value):,.2f}" for value in values]
+    if type_name in INTEGER_TYPE_NAMES:
+        return ["NULL" if value is None else f"{int(value):,}" for value in values]
+    return ["NULL" if value is None else str(value) for value in values]
+
+
+def format_result_columns(columns: List[Dict], rows: List[List]) -> List[List[str]]:
+    """Transpose result rows and format them column by column"""
+    column_values = list(zip(*rows)) if rows else [()] * len(columns)
+    return [format_result_column(values, col["type_name"]) for values, col in zip(column_values, columns)]
 
 
 def process_query_results(answer_json: Dict) -> str:
@@ -263,19 +1071,10 @@ def process_query_results(answer_json: Dict) -> str:
             header = "| " + " | ".join(col["name"] for col in columns["columns"]) + " |"
             separator = "|" + "|".join(["---" for _ in columns["columns"]]) + "|"
             response += header + "\n" + separator + "\n"
-            for row in data["data_array"]:
-                formatted_row = []
-                for value, col in zip(row, columns["columns"]):
-                    if value is None:
-                        formatted_value = "NULL"
-                    elif col["type_name"] in ["DECIMAL", "DOUBLE", "FLOAT"]:
-                        formatted_value = f"{float(value):,.2f}"
-                    elif col["type_name"] in ["INT", "BIGINT", "LONG"]:
-                        formatted_value = f"{int(value):,}"
-                    else:
-                        formatted_value = str(value)
-                    formatted_row.append(formatted_value)
-                response += "| " + " | ".join(formatted_row) + " |\n"
+            formatted_columns = format_result_columns(columns["columns"], data["data_array"])
+            response += "".join(
+                "| " + " | ".join(formatted_row) + " |\n" for formatted_row in zip(*formatted_columns)
+            )
         else:
             response += f"Unexpected column format: {columns}\n\n"
     elif "error" in answer_json:
@@ -288,12 +1087,108 @@ def process_query_results(answer_json: Dict) -> str:
     return response
 
 
+def render_answer(header: str, answer_json: Dict, deadline: Optional[Deadline] = None) -> tuple[str, Optional[Dict]]:
+    """Render an answer as (text, optional result card) according to RESULT_RENDER_MODE.
+
+    Rendering is synchronous, so once the question's deadline has expired only the first
+    RESULT_DEADLINE_FALLBACK_ROWS rows of a tabular result are rendered.
+    """
+    started = time.perf_counter()
+    try:
+        rows = (answer_json.get("data") or {}).get("data_array") or []
+        if deadline is not None and deadline.expired and len(rows) > CONFIG.RESULT_DEADLINE_FALLBACK_ROWS:
+            shown = CONFIG.RESULT_DEADLINE_FALLBACK_ROWS
+            header += f"\n\n⏱️ Showing the first {shown} of {len(rows)} rows: the question used up its {deadline.seconds:.0f} second time budget."
+            answer_json = {**answer_json, "data": {**answer_json["data"], "data_array": rows[:shown]}}
+        # Tabular results can be rendered as a compact Adaptive Card table
+        if CONFIG.RESULT_RENDER_MODE == "adaptive_card":
+            table_card = build_result_table_card(answer_json, CONFIG.RESULT_CARD_MAX_BYTES - len(header.encode("utf-8")))
+            if table_card is not None:
+                return header, table_card
+        # Add user context to response
+        return f"{header}\n\n{process_query_results(answer_json)}", None
+    finally:
+        stage_seconds.observe(time.perf_counter() - started, "render")
+
+
+def _table_cell(text: str) -> Dict:
+    return {"type": "TableCell", "items": [{"type": "TextBlock", "text": text, "wrap": True}]}
+
+
+# Every table cell and row comes from the same template, so their encoded overhead is
+# computed once; a cell's encoded size is that overhead plus its JSON-encoded text.
+_TABLE_CELL_OVERHEAD = len(json.dumps(_table_cell(""))) - len('""')
+_TABLE_ROW_OVERHEAD = len(json.dumps({"type": "TableRow", "cells": []})) + len(", ")
+_TABLE_NOTE_RESERVE = len(json.dumps({"type": "TextBlock", "text": "Showing 0000000 of 0000000 rows", "isSubtle": True, "size": "Small", "wrap": True})) + len(", ")
+
+
+def build_result_table_card(answer_json: Dict, max_bytes: int) -> Optional[Dict]:
+    """Render query results as an Adaptive Card Table that fits within max_bytes.
+
+    Cells are formatted column-wise and their encoded sizes summed per row, so the number
+    of rows that fit under the channel's message limit is chosen before any row is built.
+    Returns None if the answer has no tabular results.
+    """
+    columns_info = answer_json.get("columns")
+    if not isinstance(columns_info, dict) or "columns" not in columns_info or "data" not in answer_json:
+        return None
+
+    columns = columns_info["columns"]
+    rows = (answer_json.get("data") or {}).get("data_array") or []
+    total_rows = len(rows)
+    formatted_columns = format_result_columns(columns, rows)
+
+    body = []
+    if answer_json.get("query_description"):
+        body.append({"type": "TextBlock", "text": "Query Description", "weight": "Bolder"})
+        body.append({"type": "TextBlock", "text": answer_json["query_description"], "wrap": True})
+    table = {
+        "type": "Table",
+        "firstRowAsHeader": True,
+        "columns": [
+            {"width": 1, "horizontalCellContentAlignment": "Right"}
+            if col.get("type_name") in FLOAT_TYPE_NAMES + INTEGER_TYPE_NAMES
+            else {"width": 1}
+            for col in columns
+        ],
+        "rows": [{"type": "TableRow", "cells": [_table_cell(col["name"]) for col in columns]}],
+    }
+    body.append(table)
+    card = {"type": "AdaptiveCard", "version": "1.5", "body": body}
+
+    # Estimate the encoded size of each row from the cell templates, column by column
+    row_sizes = [_TABLE_ROW_OVERHEAD + max(len(columns) - 1, 0) * len(", ")] * total_rows
+    for formatted in formatted_columns:
+        cell_sizes = [_TABLE_CELL_OVERHEAD + len(encode_basestring_ascii(text)) for text in formatted]
+        row_sizes = list(map(operator.add, row_sizes, cell_sizes))
+    budget = max_bytes - len(json.dumps(card)) - _TABLE_NOTE_RESERVE
+    shown_rows = bisect_right(list(accumulate(row_sizes)), budget) if budget > 0 else 0
+
+    table["rows"].extend(
+        {"type": "TableRow", "cells": [_table_cell(text) for text in formatted_row]}
+        for formatted_row in zip(*(formatted[:shown_rows] for formatted in formatted_columns))
+    )
+    if shown_rows < total_rows:
+        body.append({
+            "type": "TextBlock",
+            "text": f"Showing {shown_rows:,} of {total_rows:,} rows",
+            "isSubtle": True,
+            "size": "Small",
+            "wrap": True,
+        })
+    return card
+
+
 class MyBot(ActivityHandler):
     def __init__(self):
         self.user_sessions: Dict[str, UserSession] = {}  # Maps Teams user ID to UserSession
         self.email_sessions: Dict[str, UserSession] = {}  # Maps email to UserSession for easy lookup
-        self.message_feedback: Dict[str, Dict] = {}  # Track feedback for each message
         self.pending_email_input: Dict[str, bool] = {}  # Track users waiting for email input
+        self.inflight_questions: Dict[str, List[tuple]] = {}  # Maps Teams user ID to (GenieRun, task) pairs
+        # Text and result card of recent combined answer activities, so feedback can update them in place
+        self.combined_answers: "OrderedDict[str, tuple]" = OrderedDict()
+        # TEXT_COMMANDS bound to this bot, so dispatching a command is a single dict lookup
+        self._commands = {text: getattr(self, name) for text, name in TEXT_COMMANDS.items()}
 
     async def get_or_create_user_session(self, turn_context: TurnContext) -> UserSession:
         """Get or create a user session based on Teams user information"""
@@ -306,10 +1201,9 @@ class MyBot(ActivityHandler):
             
             # Check if conversation has timed out (4 hours)
             if self._is_conversation_timed_out(session):
-                logger.info(f"Conversation timed out for user {session.get_display_name()}, resetting conversation")
+                logger.info("Conversation timed out for user %s, resetting conversation", session.get_display_name())
                 # Reset conversation ID and user context to start fresh
-                session.conversation_id = None
-                session.user_context.pop('last_conversation_id', None)
+                session.reset_conversation()
                 # Update activity time
                 session.update_activity()
                 return session
@@ -325,9 +1219,9 @@ class MyBot(ActivityHandler):
             member = await TeamsInfo.get_member(turn_context, user_id)
             email = getattr(member, "email", None) or getattr(member, "userPrincipalName", None)
             name = getattr(member, "name", None)
-            logger.info(f"✅ Found Teams member via get_member(): {name} ({email})")
+            logger.info("✅ Found Teams member via get_member(): %s (%s)", name, email)
         except Exception as e:
-            logger.warning(f"get_member() failed for {user_id}: {e}")
+            logger.warning("get_member() failed for %s: %s", user_id, e)
 
         # --- 2️⃣ If still no email, try get_members() (helps 1:1 chats) ---
         if not email:
@@ -339,22 +1233,22 @@ class MyBot(ActivityHandler):
                         if m.id != turn_context.activity.recipient.id:
                             email = getattr(m, "email", None) or getattr(m, "userPrincipalName", None)
                             name = getattr(m, "name", None)
-                            logger.info(f"✅ Found Teams member via get_members(): {name} ({email})")
+                            logger.info("✅ Found Teams member via get_members(): %s (%s)", name, email)
                             break
             except Exception as e:
-                logger.warning(f"get_members() also failed for {user_id}: {e}")
+                logger.warning("get_members() also failed for %s: %s", user_id, e)
 
         # --- 3️⃣ Final fallback if Teams provides nothing ---
         if not email:
             email = "NoEmail"
             name = getattr(turn_context.activity.from_property, "name", None) or "Unknown User"
-            logger.info(f"⚠️ No Teams email found for {user_id}. Using placeholder 'NoEmail'.")
+            logger.info("⚠️ No Teams email found for %s. Using placeholder 'NoEmail'.", user_id)
 
         # --- 4️⃣ Create and store session ---
         session = UserSession(user_id, email, name or email.split("@")[0])
         self.user_sessions[user_id] = session
         self.email_sessions[email] = session
-        logger.info(f"✅ Created new user session for {session.get_display_name()}")
+        logger.info("✅ Created new user session for %s", session.get_display_name())
         return session
 
     def _is_valid_email(self, email: str) -> bool:
@@ -409,7 +1303,14 @@ class MyBot(ActivityHandler):
     #     logger.info(f"Created user session with manual email for {session.get_display_name()}")
     #     return session
 
-    def create_feedback_card(self, message_id: str, user_id: str) -> Dict:
+    def create_feedback_card(
+        self,
+        message_id: str,
+        user_id: str,
+        conversation_id: Optional[str] = None,
+        delivery: str = "separate",
+        target: str = DEFAULT_TARGET,
+    ) -> Dict:
         """Create an Adaptive Card with thumbs up/down feedback buttons"""
         return {
             "type": "AdaptiveCard",
@@ -430,6 +1331,9 @@ class MyBot(ActivityHandler):
                         "action": "feedback",
                         "messageId": message_id,
                         "userId": user_id,
+                        "conversationId": conversation_id,
+                        "target": target,
+                        "delivery": delivery,
                         "feedback": "positive"
                     }
                 },
@@ -440,12 +1344,31 @@ class MyBot(ActivityHandler):
                         "action": "feedback",
                         "messageId": message_id,
                         "userId": user_id,
+                        "conversationId": conversation_id,
+                        "target": target,
+                        "delivery": delivery,
                         "feedback": "negative"
                     }
                 }
             ]
         }
 
+    def create_sample_questions_card(self) -> Dict:
+        """Create a card with one button per sample question"""
+        return {
+            "type": "AdaptiveCard",
+            "version": "1.3",
+            "body": [{"type": "TextBlock", "text": "Try one of these:", "weight": "Bolder"}],
+            "actions": [
+                {
+                    "type": "Action.Submit",
+                    "title": question,
+                    "data": {"action": "sample_question", "question": question},
+                }
+                for question in self._get_sample_questions()
+            ],
+        }
+
     def create_thank_you_card(self) -> Dict:
         """Create a thank you card to replace feedback buttons after submission"""
         return {
@@ -476,12 +1399,28 @@ class MyBot(ActivityHandler):
             ]
         }
 
+    async def on_turn(self, turn_context: TurnContext):
+        """Handle a turn inside its trace span, keyed by the activity ID"""
+        activity = turn_context.activity
+        with tracer.start_trace(
+            "turn",
+            activity.id,
+            {
+                "activity.id": activity.id,
+                "activity.type": activity.type,
+                "activity.name": activity.name,
+                "channel.id": activity.channel_id,
+                "user.id": activity.from_property.id if activity.from_property else None,
+            },
+        ):
+            await super().on_turn(turn_context)
+
     async def on_message_activity(self, turn_context: TurnContext):
-        # Debug logging for all message activities
-        logger.info(f"Message activity type: {turn_context.activity.type}")
-        logger.info(f"Message activity name: {turn_context.activity.name}")
-        logger.info(f"Message activity value: {turn_context.activity.value}")
-        logger.info(f"Message activity text: {turn_context.activity.text}")
+        # Message text and card values are user data; they are not logged
+        logger.debug(
+            "Message activity %s (name %s, has text: %s)",
+            turn_context.activity.id, turn_context.activity.name, bool(turn_context.activity.text),
+        )
         
         # Handle cases where text might be None (e.g., adaptive card interactions)
         if not turn_context.activity.text:
@@ -492,42 +1431,45 @@ class MyBot(ActivityHandler):
                     logger.info("Detected adaptive card feedback button click in message activity")
                     # Handle as feedback submission
                     try:
-                        message_id = turn_context.activity.value.get("messageId")
-                        user_id = turn_context.activity.value.get("userId")
-                        feedback = turn_context.activity.value.get("feedback")
-                        
-                        if not all([message_id, user_id, feedback]):
+                        feedback_data = self._record_feedback(turn_context.activity.value)
+                        if feedback_data is None:
                             logger.error("Missing required feedback data in message activity")
                             return
                         
-                        # Store feedback data
-                        feedback_key = f"{user_id}_{message_id}"
-                        user_session = self.user_sessions.get(user_id)
-                        self.message_feedback[feedback_key] = {
-                            "message_id": message_id,
-                            "user_id": user_id,
-                            "feedback": feedback,
-                            "conversation_id": user_session.conversation_id if user_session else None,
-                            "timestamp": datetime.now(timezone.utc).isoformat(),
-                            "user_session": user_session.to_dict() if user_session else None
-                        }
-                        
                         # Send feedback to Databricks Genie API
                         try:
-                            await self._send_feedback_to_api(feedback_key, self.message_feedback[feedback_key])
+                            await self._send_feedback_to_api(feedback_data)
                             
-                            # Send thank you message
-                            await turn_context.send_activity("✅ Thank you for your feedback!")
+                            # Replace the feedback buttons with a thank you note
+                            await self._acknowledge_feedback(
+                                turn_context, self.create_thank_you_card(), "✅ Thank you for your feedback!"
+                            )
                             
                         except Exception as e:
-                            logger.error(f"Failed to send feedback to Genie API: {str(e)}")
-                            await turn_context.send_activity("❌ Failed to submit feedback. Please try again.")
+                            logger.error("Failed to send feedback to Genie API: %s", e)
+                            await self._acknowledge_feedback(
+                                turn_context,
+                                self.create_error_card("Failed to submit feedback. Please try again."),
+                                "❌ Failed to submit feedback. Please try again.",
+                            )
                         
                         return
                         
                     except Exception as e:
-                        logger.error(f"Error handling feedback in message activity: {str(e)}")
+                        logger.error("Error handling feedback in message activity: %s", e)
                         return
+                elif action == "sample_question" and turn_context.activity.value.get("question"):
+                    # Sample questions from the welcome card are usually answered from the pre-computed store
+                    user_session = await self.get_or_create_user_session(turn_context)
+                    await self._answer_question(turn_context, user_session, turn_context.activity.value["question"])
+                    return
+                elif action == "rerun_fresh" and turn_context.activity.value.get("question"):
+                    # Ask Genie again instead of reusing a similar question's answer
+                    user_session = await self.get_or_create_user_session(turn_context)
+                    await self._answer_question(
+                        turn_context, user_session, turn_context.activity.value["question"], reuse=False
+                    )
+                    return
             
             logger.info("Received message activity without text content, skipping")
             return
@@ -580,6 +1522,56 @@ class MyBot(ActivityHandler):
         if await self._handle_special_commands(turn_context, question, user_session):
             return
         
+        await self._answer_question(turn_context, user_session, question)
+
+    async def _answer_question(
+        self, turn_context: TurnContext, user_session: UserSession, question: str, reuse: bool = True
+    ):
+        """Answer a data question with Genie, or from a stored answer when one applies.
+
+        Pre-computed sample question answers are served first, then recent answers to
+        near-identical questions. Reuse only applies when the question would start a new Genie
+        conversation, since a follow-up depends on its conversation's context. reuse=False
+        forces a fresh Genie run. A follow-up Genie suggested and that was prefetched is
+        served from the prefetch. Stored answers all come from the default Genie target, so
+        questions routed elsewhere always go to Genie.
+        """
+        target, question = self._route_question(turn_context, user_session, question)
+        if target.name != user_session.genie_target:
+            # Genie conversations belong to one space, so switching targets starts a new one
+            if user_session.conversation_id is not None:
+                logger.info(
+                    "Routing %s from Genie target '%s' to '%s'; starting a new conversation",
+                    user_session.get_display_name(), user_session.genie_target, target.name,
+                )
+                if follow_up_prefetcher is not None:
+                    follow_up_prefetcher.cancel(user_session.user_id, "target changed")
+                user_session.reset_conversation()
+            user_session.genie_target = target.name
+        if not question:
+            await turn_context.send_activity(f"🧭 Your next questions will go to the **{target.name}** Genie space.")
+            return
+
+        if reuse and user_session.conversation_id is None and target is default_target:
+            sample = sample_answers.get(question) if sample_answers is not None else None
+            if sample is not None:
+                refreshed = "just now" if sample.age_seconds < 60 else f"{round(sample.age_seconds / 60)} min ago"
+                note = f"⚡ _Pre-computed answer, refreshed {refreshed}_"
+                await self._send_cached_answer(turn_context, user_session, question, sample.answer, note)
+                return
+
+            match = question_index.lookup(question, user_session.user_id) if question_index is not None else None
+            if match is not None:
+                logger.info(
+                    "Reusing answer to '%s' for '%s' from %s (similarity %.2f, %.0fs old)",
+                    match.question, question, user_session.get_display_name(), match.similarity, match.age_seconds,
+                )
+                asked = "just now" if match.age_seconds < 60 else f"{round(match.age_seconds / 60)} min ago"
+                # The matched question may be another user's, so only its age and similarity are shown
+                note = f"♻️ _Answered from a similar question asked {asked} ({match.similarity:.0%} match)_"
+                await self._send_cached_answer(turn_context, user_session, question, match.answer, note)
+                return
+
         # Check if conversation was reset due to timeout (only for data questions, not commands)
         if user_session.conversation_id is None and user_session.user_id in self.user_sessions:
             # This means the conversation was reset due to timeout
@@ -590,45 +1582,186 @@ class MyBot(ActivityHandler):
             #     "I'm working on your answer now!"
             # )
 
-            await turn_context.send_activity(
-                "🤖 **Starting New Conversation...**\n\n"
+            if not CONFIG.ENABLE_PROGRESS_UPDATES:
+                await turn_context.send_activity(
+                    "🤖 **Starting New Conversation...**\n\n"
+                )
+        
+        # Long or slowing conversations continue in a fresh Genie conversation, carrying a short summary
+        genie_question = question
+        rollover_note = ""
+        reason = rollover_reason(user_session)
+        if reason is not None:
+            logger.info(
+                "Rolling over Genie conversation %s for %s (%s, %s messages)",
+                user_session.conversation_id, user_session.get_display_name(), reason, user_session.conversation_message_count,
             )
+            conversation_latency_stats.record_rollover(reason)
+            genie_question = rollover_context(user_session, question)
+            user_session.reset_conversation()
+            rollover_note = "\n\n_🔄 Continued in a fresh Genie conversation to keep answers fast._"
+
+        # A follow-up that was prefetched (or is still being prefetched) is picked up instead of asked again
+        prefetch = None
+        if follow_up_prefetcher is not None:
+            prefetch = follow_up_prefetcher.take(user_session.user_id, user_session.conversation_id, question)
+            if prefetch is None:
+                follow_up_prefetcher.cancel(user_session.user_id, "new question")
+
+        # Show a typing indicator and one status message that is edited in place as Genie works
+        status_activity_id = None
+        on_progress = None
+        if CONFIG.ENABLE_PROGRESS_UPDATES and not (prefetch is not None and prefetch.task.done()):
+            status_activity_id, on_progress = await self._start_progress(turn_context, user_session)
         
-        # Process the message with user context
+        # Process the message with user context, within the question's deadline
+        if prefetch is not None:
+            logger.info("Serving prefetched follow-up '%s' for %s", question, user_session.get_display_name())
+            run, work = prefetch.run, prefetch.task
+        else:
+            run = GenieRun(target, Deadline(CONFIG.GENIE_QUESTION_TIMEOUT_SECONDS))
+            work = ask_genie(genie_question, target, user_session, user_session.conversation_id, on_progress, run)
+        generation = user_session.conversation_generation
+        # A rolled-over question carries earlier context, so its answer is not reusable for others
+        starts_conversation = user_session.conversation_id is None and not rollover_note
+        asked_at = time.monotonic()
         try:
-            answer, new_conversation_id, genie_message_id = await ask_genie(
-                question, CONFIG.DATABRICKS_SPACE_ID, user_session, user_session.conversation_id
-            )
+            try:
+                answer, new_conversation_id, genie_message_id = await self._run_tracked(
+                    user_session.user_id, run, work
+                )
+            except asyncio.CancelledError:
+                if run.cancel_reason is None:
+                    raise
+                await self._post_activity(
+                    turn_context,
+                    Activity(type=ActivityTypes.message, text=f"**👤 {user_session.name}**\n\n🛑 Question cancelled."),
+                    status_activity_id,
+                )
+                return
+
+            if user_session.conversation_generation != generation:
+                # The conversation was reset while Genie was working; don't revive it
+                logger.info("Discarding stale answer for %s after conversation reset", user_session.get_display_name())
+                return
             
             # Update user session with new conversation ID and store the specific message ID for feedback
             user_session.conversation_id = new_conversation_id
             user_session.user_context['last_question'] = question
             user_session.user_context['last_response_time'] = datetime.now(timezone.utc).isoformat()
             user_session.user_context['last_genie_message_id'] = genie_message_id
+            if feedback_journal is not None and genie_message_id:
+                feedback_journal.record_answer(genie_message_id, new_conversation_id, user_session.user_id, question)
 
             answer_json = json.loads(answer)
-            response = process_query_results(answer_json)
-            
-            # Add user context to response
-            response = f"**👤 {user_session.name}**\n\n{response}"
+            await self._remember_result(user_session, question, answer_json)
+            if (
+                question_index is not None
+                and starts_conversation
+                and target is default_target
+                and genie_message_id
+                and "error" not in answer_json
+            ):
+                question_index.add(question, answer, user_session.user_id)
+            if genie_message_id:
+                # A prefetched answer's latency is not what the user waited, so it is left out
+                latency = time.monotonic() - asked_at if prefetch is None else None
+                user_session.record_turn(question, answer_summary(answer_json), latency)
+                if latency is not None:
+                    conversation_latency_stats.record(user_session.conversation_message_count, latency)
+
+            # Send the main response together with its feedback card and follow-up suggestions
+            response, table_card = render_answer(
+                f"**👤 {user_session.name}**{rollover_note}",
+                answer_json,
+                # A prefetched run's deadline started before the user asked, so it does not apply
+                run.deadline if prefetch is None else None,
+            )
+            suggested_questions = (answer_json.get("suggested_questions") or []) if genie_message_id else []
+            await self._send_answer(
+                turn_context, user_session, response, table_card, status_activity_id, suggested_questions
+            )
 
-            # Send the main response
-            await turn_context.send_activity(response)
-            
-            # Send feedback card as a separate message
-            await self._send_feedback_card(turn_context, user_session)
+            if suggested_questions and follow_up_prefetcher is not None:
+                follow_up_prefetcher.schedule(user_session.user_id, new_conversation_id, suggested_questions)
             
         except json.JSONDecodeError:
-            await turn_context.send_activity(
-                f"**👤 {user_session.name}**\n\n❌ Failed to decode response from the server."
-            )
             # Send feedback card for error responses too
-            await self._send_feedback_card(turn_context, user_session)
+            await self._send_answer(
+                turn_context,
+                user_session,
+                f"**👤 {user_session.name}**\n\n❌ Failed to decode response from the server.",
+                replace_activity_id=status_activity_id,
+            )
         except Exception as e:
-            logger.error(f"Error processing message for {user_session.get_display_name()}: {str(e)}")
-            await turn_context.send_activity(
-                f"**👤 {user_session.name}**\n\n❌ An error occurred while processing your request.\n\n Note: This often occurs when the output is too long, please try adjusting your question to request a shorter answer."
+            logger.error("Error processing message for %s: %s", user_session.get_display_name(), e)
+            await self._post_activity(
+                turn_context,
+                Activity(
+                    type=ActivityTypes.message,
+                    text=f"**👤 {user_session.name}**\n\n❌ An error occurred while processing your request.\n\n Note: This often occurs when the output is too long, please try adjusting your question to request a shorter answer.",
+                ),
+                status_activity_id,
+            )
+
+    def _route_question(
+        self, turn_context: TurnContext, user_session: UserSession, question: str
+    ) -> tuple[GenieTarget, str]:
+        """Pick the Genie target for a question from its team, channel or command prefix"""
+        activity = turn_context.activity
+        team = teams_get_team_info(activity)
+        target_name, question = genie_router.resolve(
+            team.id if team else None, teams_get_channel_id(activity), question, user_session.genie_target
+        )
+        return genie_targets[target_name], question
+
+    @staticmethod
+    def _follow_up_suggestions(questions: Optional[List[str]]) -> Optional[SuggestedActions]:
+        """Genie's suggested follow-up questions as quick replies for the answer activity"""
+        if not (CONFIG.SHOW_FOLLOW_UP_SUGGESTIONS and questions):
+            return None
+        return SuggestedActions(
+            actions=[CardAction(type=ActionTypes.im_back, title=question, value=question) for question in questions]
+        )
+
+    async def _remember_result(self, user_session: UserSession, question: str, answer_json: Dict):
+        """Keep a tabular answer as typed columns so follow-ups like "top 10" need no new query"""
+        if CONFIG.ENABLE_LOCAL_RESULT_COMMANDS and "columns" in answer_json:
+            stored = await asyncio.get_running_loop().run_in_executor(None, result_to_frame, answer_json, question)
+            if stored is not None:
+                result_store.put(user_session.user_id, stored)
+
+    async def _send_cached_answer(
+        self, turn_context: TurnContext, user_session: UserSession, question: str, answer: str, note: str
+    ):
+        """Serve a stored answer (reused or pre-computed) with a button to re-run the question fresh"""
+        answer_json = json.loads(answer)
+        await self._remember_result(user_session, question, answer_json)
+        user_session.user_context['last_reused_question'] = question
+
+        header = f"**👤 {user_session.name}**\n\n{note}"
+        response, table_card = render_answer(header, answer_json)
+        rerun_action = {
+            "type": "Action.Submit",
+            "title": "🔄 Re-run fresh",
+            "data": {"action": "rerun_fresh", "question": question},
+        }
+        if table_card is not None:
+            card = dict(table_card, actions=[rerun_action])
+        else:
+            card = {
+                "type": "AdaptiveCard",
+                "version": "1.3",
+                "body": [{"type": "TextBlock", "text": "Want a fresh answer from Genie?", "size": "Small", "wrap": True}],
+                "actions": [rerun_action],
+            }
+        await turn_context.send_activity(
+            Activity(
+                type=ActivityTypes.message,
+                text=response,
+                attachments=[{"contentType": "application/vnd.microsoft.card.adaptive", "content": card}],
             )
+        )
 
 #     async def _handle_user_identification(self, turn_context: TurnContext, question: str):
 #         """Handle cases where user email is not available"""
@@ -733,11 +1866,43 @@ class MyBot(ActivityHandler):
         #         )
         #         return True
         
-        # Info command
-        if question.lower() in ["info", "/info"]:
-            is_emulator = turn_context.activity.channel_id == "emulator"
+        # # Logout command
+        # if question.lower() in ["logout", "/logout", "sign out", "disconnect"]:
+        #     # Clear user session
+        #     user_id = user_session.user_id
+        #     email = user_session.email
+            
+        #     if user_id in self.user_sessions:
+        #         del self.user_sessions[user_id]
+        #     if email in self.email_sessions:
+        #         del self.email_sessions[email]
             
-            info_text = f"""🤖 **Databricks Genie Bot Commands**
+        #     await turn_context.send_activity(
+        #         f"👋 **Goodbye {user_session.name}!**\n\n"
+        #         "Your session has been cleared. You'll be re-identified when you send your next message."
+        #     )
+        #     return True
+
+        # Fixed commands (help, whoami, reset, ...)
+        command_handler = self._commands.get(question.lower())
+        if command_handler is not None and await command_handler(turn_context, user_session):
+            return True
+
+        # Daily subscriptions
+        if subscription_store is not None and await self._handle_subscription_command(turn_context, question, user_session):
+            return True
+
+        # Re-slice the last result locally (sort, top N, filter, sum by) without asking Genie
+        if CONFIG.ENABLE_LOCAL_RESULT_COMMANDS and await self._handle_result_command(turn_context, question, user_session):
+            return True
+
+        return False
+
+    async def _info_command(self, turn_context: TurnContext, user_session: UserSession) -> bool:
+        """Show the commands and the state of the user's conversation"""
+        is_emulator = turn_context.activity.channel_id == "emulator"
+        
+        info_text = f"""🤖 **Databricks Genie Bot Commands**
 
 **👤 User:** {user_session.get_display_name()}
 
@@ -746,7 +1911,12 @@ class MyBot(ActivityHandler):
 
 **User Commands:**
 - `whoami` - Show your user information
-- `help` - Show detailed bot information"""
+- `help` - Show detailed bot information
+
+**Refine Your Last Result:**
+- `sort by <column> [desc]`, `top 10 [by <column>]`
+- `just <column> = <value>`, `sum <column> by <column>`
+- `original` - Undo refinements"""
 
 #             if is_emulator:
 #                 info_text += """
@@ -755,7 +1925,7 @@ class MyBot(ActivityHandler):
 # - `/setuser your.email@company.com Your Name` - Set your identity for testing
 # - Example: `/setuser john.doe@company.com John Doe`"""
 
-            info_text += f"""
+        info_text += f"""
 
 **General Usage:**
 - Ask me any question about your data
@@ -766,13 +1936,13 @@ class MyBot(ActivityHandler):
 
 **Need Help?**
 Contact the bot administrator at: {CONFIG.ADMIN_CONTACT_EMAIL}"""
-            
-            await turn_context.send_activity(info_text)
-            return True
+        
+        await turn_context.send_activity(info_text)
+        return True
 
-        # Whoami command
-        if question.lower() in ["whoami", "/whoami", "who am i", "me"]:
-            user_info = f"""👤 **Your Information**
+    async def _whoami_command(self, turn_context: TurnContext, user_session: UserSession) -> bool:
+        """Show the user's session information"""
+        user_info = f"""👤 **Your Information**
 
 **Name:** {user_session.name}
 **Email:** {user_session.email}
@@ -780,38 +1950,21 @@ Contact the bot administrator at: {CONFIG.ADMIN_CONTACT_EMAIL}"""
 **Session Created:** {user_session.created_at.strftime('%Y-%m-%d %H:%M:%S UTC')}
 **Last Activity:** {user_session.last_activity.strftime('%Y-%m-%d %H:%M:%S UTC')}
 **Conversation ID:** {user_session.conversation_id or 'None (new conversation)'}"""
-            await turn_context.send_activity(user_info)
-            return True
-
-        # # Logout command
-        # if question.lower() in ["logout", "/logout", "sign out", "disconnect"]:
-        #     # Clear user session
-        #     user_id = user_session.user_id
-        #     email = user_session.email
-            
-        #     if user_id in self.user_sessions:
-        #         del self.user_sessions[user_id]
-        #     if email in self.email_sessions:
-        #         del self.email_sessions[email]
-            
-        #     await turn_context.send_activity(
-        #         f"👋 **Goodbye {user_session.name}!**\n\n"
-        #         "Your session has been cleared. You'll be re-identified when you send your next message."
-        #     )
-        #     return True
-
-        # Hello command
-        if question.lower() in ["hi", "hello", "start", "hey"]:
-            await turn_context.send_activity(
-                f"👋 **Hello {user_session.name}!**\n\n"
-                "You can ask me questions about your data. Type `help` to see what I can do."
-            )
+        await turn_context.send_activity(user_info)
+        return True
+
+    async def _hello_command(self, turn_context: TurnContext, user_session: UserSession) -> bool:
+        """Greet the user"""
+        await turn_context.send_activity(
+            f"👋 **Hello {user_session.name}!**\n\n"
+            "You can ask me questions about your data. Type `help` to see what I can do."
+        )
 
-            return True
+        return True
 
-        # Help command
-        if question.lower() in ["help", "/help", "commands", "/commands", "information", "about", "what is this"]:
-            help_message = f"""🤖 **Databricks Genie Bot Information**
+    async def _help_command(self, turn_context: TurnContext, user_session: UserSession) -> bool:
+        """Explain what the bot does and list its commands"""
+        help_message = f"""🤖 **Databricks Genie Bot Information**
 
 **What I do:**
 I'm a Teams bot that connects to a Databricks Genie Space, allowing you to interact with your data through natural language queries directly in Teams.
@@ -833,48 +1986,168 @@ I'm a Teams bot that connects to a Databricks Genie Space, allowing you to inter
 • `reset` - Start a fresh conversation
 • `new chat` - Start a fresh conversation
 
+**Refining Results (answered instantly, without a new query):**
+• `sort by <column> [asc|desc]` - Sort your last result
+• `top N` / `bottom N [by <column>]` - Keep the first, last, largest or smallest rows
+• `just <column> = <value>` - Filter rows (also `!=`, `>`, `<`, `>=`, `<=`, `contains`)
+• `sum <column> by <column>` - Total a numeric column per group
+• `original` - Go back to the full result
+
+**Daily Subscriptions:**
+• `subscribe <question> daily at 08:30` - Get the answer pushed to you every day
+• `subscriptions` - List your subscriptions
+• `unsubscribe <number>` / `unsubscribe all` - Stop them
+
+**Reused Answers:**
+• A question that closely matches one answered recently is answered instantly from that answer
+• Click **Re-run fresh** (or type `rerun`) to ask Genie again
+
 **Need Help?**
 Contact the bot administrator at: {CONFIG.ADMIN_CONTACT_EMAIL}"""
-            
-            await turn_context.send_activity(help_message)
+        
+        await turn_context.send_activity(help_message)
+        return True
+
+    async def _reset_command(self, turn_context: TurnContext, user_session: UserSession) -> bool:
+        """Cancel anything in flight and start a new Genie conversation"""
+        cancelled = self._cancel_inflight_questions(user_session.user_id, "reset")
+        if follow_up_prefetcher is not None:
+            follow_up_prefetcher.cancel(user_session.user_id, "reset")
+        user_session.reset_conversation()
+        result_store.discard(user_session.user_id)
+        cancelled_note = "Your previous question was cancelled.\n\n" if cancelled else ""
+        await turn_context.send_activity(
+            f"🔄 **Starting a new conversation, {user_session.name}!**\n\n"
+            f"{cancelled_note}"
+            "You can now ask me anything about your data."
+        )
+        return True
+
+    async def _rerun_command(self, turn_context: TurnContext, user_session: UserSession) -> bool:
+        """Ask Genie again for the question whose answer was last reused"""
+        last_reused = user_session.user_context.get('last_reused_question')
+        if last_reused:
+            await self._answer_question(turn_context, user_session, last_reused, reuse=False)
             return True
+        return False
 
-        # New conversation triggers
-        new_conversation_triggers = [
-            "new conversation", "new chat", "start over", "reset", "clear conversation",
-            "/new", "/reset", "/clear", "/start", "begin again", "fresh start", "logout", "/logout"
-        ]
-        
-        if question.lower() in [trigger.lower() for trigger in new_conversation_triggers]:
-            user_session.conversation_id = None
-            user_session.user_context.pop('last_conversation_id', None)
+    async def _handle_subscription_command(self, turn_context: TurnContext, question: str, user_session: UserSession) -> bool:
+        """Handle subscribe, unsubscribe and subscriptions commands. Returns True if handled."""
+        loop = asyncio.get_running_loop()
+        text = question.strip()
+
+        if text.lower() in SUBSCRIPTION_LIST_COMMANDS:
+            subscriptions = subscription_store.for_user(user_session.user_id)
+            if not subscriptions:
+                await turn_context.send_activity(
+                    "📭 **You have no subscriptions.**\n\n"
+                    "Example: `subscribe total sales yesterday daily at 08:30`"
+                )
+            else:
+                lines = "\n".join(
+                    f"- **#{sub.id}** {sub.question} — daily at {sub.time_of_day} ({sub.timezone_name})"
+                    for sub in subscriptions
+                )
+                await turn_context.send_activity(
+                    f"📬 **Your subscriptions:**\n\n{lines}\n\nUse `unsubscribe <number>` or `unsubscribe all` to stop one."
+                )
+            return True
+
+        match = UNSUBSCRIBE_COMMAND.match(text)
+        if match:
+            subscription_id = None if match.group("target").lower() == "all" else int(match.group("target"))
+            removed = await loop.run_in_executor(
+                None, subscription_store.remove, user_session.user_id, subscription_id
+            )
             await turn_context.send_activity(
-                f"🔄 **Starting a new conversation, {user_session.name}!**\n\n"
-                "You can now ask me anything about your data."
+                f"🗑️ Removed {removed} subscription{'s' if removed != 1 else ''}." if removed
+                else "❌ No matching subscription. Type `subscriptions` to see yours."
             )
             return True
 
-        return False
+        match = SUBSCRIBE_COMMAND.match(text)
+        if not match:
+            return False
+        hour, minute = int(match.group("hour")), int(match.group("minute") or 0)
+        meridiem = (match.group("meridiem") or "").lower()
+        if meridiem:
+            hour = hour % 12 + (12 if meridiem == "pm" else 0)
+        if hour > 23 or minute > 59:
+            await turn_context.send_activity("❌ Please give a time like `08:30` or `9am`.")
+            return True
+        if len(subscription_store.for_user(user_session.user_id)) >= CONFIG.SUBSCRIPTION_MAX_PER_USER:
+            await turn_context.send_activity(
+                f"❌ You already have {CONFIG.SUBSCRIPTION_MAX_PER_USER} subscriptions. "
+                "Use `unsubscribe <number>` to make room."
+            )
+            return True
+
+        timezone_name = turn_context.activity.local_timezone or CONFIG.SUBSCRIPTION_DEFAULT_TIMEZONE
+        reference = TurnContext.get_conversation_reference(turn_context.activity).serialize()
+        subscription = await loop.run_in_executor(
+            None,
+            subscription_store.add,
+            user_session.user_id,
+            user_session.name,
+            match.group("question").strip(),
+            f"{hour:02d}:{minute:02d}",
+            timezone_name,
+            reference,
+            user_session.email,
+        )
+        await turn_context.send_activity(
+            f"✅ **Subscribed (#{subscription.id})**\n\n"
+            f"I'll send you the answer to \"{subscription.question}\" every day at "
+            f"{subscription.time_of_day} ({timezone_name}), up to {CONFIG.SUBSCRIPTION_WINDOW_MINUTES:g} minutes early.\n\n"
+            "Type `subscriptions` to see yours or `unsubscribe <number>` to stop."
+        )
+        return True
+
+    async def _handle_result_command(self, turn_context: TurnContext, question: str, user_session: UserSession) -> bool:
+        """Answer a re-slicing command from the user's stored result. Returns True if handled.
+
+        Anything that does not parse as a command, or names a column the result does not have,
+        is left for Genie.
+        """
+        stored = result_store.get(user_session.user_id)
+        if stored is None:
+            return False
+        started = time.perf_counter()
+        step = run_command(stored, question)
+        if step is None:
+            return False
+        result_store.update_size(user_session.user_id)
+        answer_json = frame_to_answer(stored)
+        logger.info(
+            "Answered '%s' locally for %s (%s rows) in %.1f ms",
+            question, user_session.get_display_name(), format(len(stored.view), ','), (time.perf_counter() - started) * 1000,
+        )
+
+        steps = " → ".join(stored.steps) or step
+        header = f"**👤 {user_session.name}**\n\n⚡ _From your last result ({steps})_"
+        response, table_card = render_answer(header, answer_json)
+        attachments = [{"contentType": "application/vnd.microsoft.card.adaptive", "content": table_card}] if table_card else None
+        await turn_context.send_activity(Activity(type=ActivityTypes.message, text=response, attachments=attachments))
+        return True
 
     async def on_invoke_activity(self, turn_context: TurnContext) -> InvokeResponse:
         """Handle invoke activities (like adaptive card button clicks)"""
         try:
-            logger.info(f"Received invoke activity: {turn_context.activity.name}")
-            logger.info(f"Invoke activity value: {turn_context.activity.value}")
+            logger.info("Received invoke activity %s: %s", turn_context.activity.id, turn_context.activity.name)
             
             # Check if this is an adaptive card invoke
             if turn_context.activity.name == "adaptiveCard/action":
                 invoke_value = turn_context.activity.value
-                logger.info(f"Processing adaptive card invoke with value: {invoke_value}")
+                logger.debug("Processing adaptive card invoke %s", turn_context.activity.id)
                 return await self.on_adaptive_card_invoke(turn_context, invoke_value)
             
             # Handle other invoke activities if needed
-            logger.info(f"Unhandled invoke activity type: {turn_context.activity.name}")
-            return InvokeResponse(status_code=200, body="OK")
+            logger.info("Unhandled invoke activity type: %s", turn_context.activity.name)
+            return InvokeResponse(status=200, body="OK")
             
         except Exception as e:
-            logger.error(f"Error handling invoke activity: {str(e)}")
-            return InvokeResponse(status_code=500, body="Error processing invoke activity")
+            logger.error("Error handling invoke activity: %s", e)
+            return InvokeResponse(status=500, body="Error processing invoke activity")
 
     async def on_adaptive_card_invoke(self, turn_context: TurnContext, invoke_value: Dict) -> InvokeResponse:
         """Handle Adaptive Card button clicks (feedback submission)"""
@@ -882,34 +2155,19 @@ Contact the bot administrator at: {CONFIG.ADMIN_CONTACT_EMAIL}"""
             action = invoke_value.get("action")
             
             if action == "feedback":
-                message_id = invoke_value.get("messageId")
-                user_id = invoke_value.get("userId")
-                feedback = invoke_value.get("feedback")
-                
-                if not all([message_id, user_id, feedback]):
-                    return InvokeResponse(status_code=400, body="Missing required feedback data")
-                
-                # Store feedback data
-                feedback_key = f"{user_id}_{message_id}"
-                user_session = self.user_sessions.get(user_id)
-                self.message_feedback[feedback_key] = {
-                    "message_id": message_id,
-                    "user_id": user_id,
-                    "feedback": feedback,
-                    "conversation_id": user_session.conversation_id if user_session else None,
-                    "timestamp": datetime.now(timezone.utc).isoformat(),
-                    "user_session": user_session.to_dict() if user_session else None
-                }
+                feedback_data = self._record_feedback(invoke_value)
+                if feedback_data is None:
+                    return InvokeResponse(status=400, body="Missing required feedback data")
                 
                 # Send feedback to Databricks Genie API
                 try:
-                    await self._send_feedback_to_api(feedback_key, self.message_feedback[feedback_key])
+                    await self._send_feedback_to_api(feedback_data)
                     
                     # Return updated card with thank you message
                     updated_card = self.create_thank_you_card()
                     
                     return InvokeResponse(
-                        status_code=200,
+                        status=200,
                         body={
                             "type": "AdaptiveCard",
                             "version": "1.3",
@@ -917,13 +2175,13 @@ Contact the bot administrator at: {CONFIG.ADMIN_CONTACT_EMAIL}"""
                         }
                     )
                 except Exception as e:
-                    logger.error(f"Failed to send feedback to Genie API: {str(e)}")
+                    logger.error("Failed to send feedback to Genie API: %s", e)
                     
                     # Return error card
                     error_card = self.create_error_card("Failed to submit feedback. Please try again.")
                     
                     return InvokeResponse(
-                        status_code=200,
+                        status=200,
                         body={
                             "type": "AdaptiveCard",
                             "version": "1.3",
@@ -931,16 +2189,46 @@ Contact the bot administrator at: {CONFIG.ADMIN_CONTACT_EMAIL}"""
                         }
                     )
             
-            return InvokeResponse(status_code=400, body="Unknown action")
+            return InvokeResponse(status=400, body="Unknown action")
             
         except Exception as e:
-            logger.error(f"Error handling adaptive card invoke: {str(e)}")
-            return InvokeResponse(status_code=500, body="Error processing feedback")
+            logger.error("Error handling adaptive card invoke: %s", e)
+            return InvokeResponse(status=500, body="Error processing feedback")
+
+    def _record_feedback(self, value: Dict) -> Optional[Dict]:
+        """Build the feedback record for a card submission and append it to the feedback journal.
+
+        Returns None if the submission is missing required fields.
+        """
+        message_id = value.get("messageId")
+        user_id = value.get("userId")
+        feedback = value.get("feedback")
+        if not all([message_id, user_id, feedback]):
+            return None
 
-    async def _send_feedback_to_api(self, feedback_key: str, feedback_data: Dict):
+        # Prefer the conversation the card was issued for; older cards do not carry it
+        user_session = self.user_sessions.get(user_id)
+        if value.get("conversationId"):
+            conversation_id, target = value["conversationId"], value.get("target") or DEFAULT_TARGET
+        else:
+            conversation_id = user_session.conversation_id if user_session else None
+            target = user_session.genie_target if user_session else DEFAULT_TARGET
+        feedback_data = {
+            "message_id": message_id,
+            "user_id": user_id,
+            "feedback": feedback,
+            "conversation_id": conversation_id,
+            "target": target,
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+        }
+        if feedback_journal is not None:
+            feedback_journal.record_feedback(message_id, conversation_id, user_id, feedback)
+        return feedback_data
+
+    async def _send_feedback_to_api(self, feedback_data: Dict):
         """Send feedback to Databricks Genie send message feedback API"""
         try:
-            logger.info(f"Feedback received: {feedback_data}")
+            logger.debug("Feedback received: %s", feedback_data)
             
             # Check if Genie feedback API is enabled
             if not CONFIG.ENABLE_GENIE_FEEDBACK_API:
@@ -951,16 +2239,18 @@ Contact the bot administrator at: {CONFIG.ADMIN_CONTACT_EMAIL}"""
             message_id = feedback_data.get("message_id")
             user_id = feedback_data.get("user_id")
             feedback_type = feedback_data.get("feedback")
-            user_session_data = feedback_data.get("user_session")
             
             if not all([message_id, user_id, feedback_type]):
-                logger.error(f"Missing required feedback data: {feedback_data}")
+                logger.error("Missing required feedback data: %s", feedback_data)
                 return
             
-            # Get the user session to access conversation_id
-            user_session = self.user_sessions.get(user_id)
-            if not user_session or not user_session.conversation_id:
-                logger.error(f"No active conversation found for user {user_id}")
+            # Use the conversation recorded with the feedback, falling back to the user's current one
+            conversation_id = feedback_data.get("conversation_id")
+            if not conversation_id:
+                user_session = self.user_sessions.get(user_id)
+                conversation_id = user_session.conversation_id if user_session else None
+            if not conversation_id:
+                logger.error("No active conversation found for user %s", user_id)
                 return
             
             # Convert feedback type to Genie API format
@@ -968,203 +2258,299 @@ Contact the bot administrator at: {CONFIG.ADMIN_CONTACT_EMAIL}"""
             genie_feedback_type = "POSITIVE" if feedback_type == "positive" else "NEGATIVE"
             
             # Call the Databricks Genie send message feedback API
-            logger.info(f"Sending feedback for specific message ID: {message_id} in conversation: {user_session.conversation_id}")
+            logger.info("Sending feedback for specific message ID: %s in conversation: %s", message_id, conversation_id)
             await self._send_genie_feedback(
-                space_id=CONFIG.DATABRICKS_SPACE_ID,
-                conversation_id=user_session.conversation_id,
+                target=genie_targets.get(feedback_data.get("target"), default_target),
+                conversation_id=conversation_id,
                 message_id=message_id,
                 feedback_type=genie_feedback_type
             )
             
-            logger.info(f"Feedback sent successfully to Genie API for {feedback_key}")
+            logger.info("Feedback sent successfully to Genie API for message %s from user %s", message_id, user_id)
             
         except Exception as e:
-            logger.error(f"Error sending feedback to Genie API: {str(e)}")
+            logger.error("Error sending feedback to Genie API: %s", e)
             raise
 
-    async def _send_genie_feedback(self, space_id: str, conversation_id: str, message_id: str, feedback_type: str):
-        """Send feedback to Databricks Genie API"""
+    async def _send_genie_feedback(self, target: GenieTarget, conversation_id: str, message_id: str, feedback_type: str):
+        """Send feedback to the Databricks Genie API of the target the message was asked in"""
+        space_id = target.space_id
         try:
-            loop = asyncio.get_running_loop()
-            
             # Use the Genie API to send message feedback
             # Note: The exact method name may vary based on the API version
             # This assumes the method is called send_message_feedback
-            await loop.run_in_executor(
-                None,
-                genie_api.send_message_feedback,
+            await target.run(
+                target.genie_api.send_message_feedback,
                 space_id,
                 conversation_id,
                 message_id,
                 feedback_type
             )
             
-            logger.info(f"Successfully sent {feedback_type} feedback for message {message_id} in conversation {conversation_id}")
+            logger.info("Successfully sent %s feedback for message %s in conversation %s", feedback_type, message_id, conversation_id)
             
         except AttributeError:
             # If send_message_feedback method doesn't exist, try alternative method names
-            logger.warning(f"send_message_feedback method not found, trying alternative approach")
-            await self._send_genie_feedback_alternative(space_id, conversation_id, message_id, feedback_type)
+            logger.warning("send_message_feedback method not found, trying alternative approach")
+            await self._send_genie_feedback_alternative(target, conversation_id, message_id, feedback_type)
         except Exception as e:
-            logger.error(f"Error calling Genie API for feedback: {str(e)}")
+            logger.error("Error calling Genie API for feedback: %s", e)
             raise
 
-    async def _send_genie_feedback_alternative(self, space_id: str, conversation_id: str, message_id: str, feedback_type: str):
+    async def _send_genie_feedback_alternative(self, target: GenieTarget, conversation_id: str, message_id: str, feedback_type: str):
         """Alternative method to send feedback if the direct API method is not available"""
         try:
-            # If the direct API method is not available, we can use the workspace client
-            # to make a direct HTTP request to the Genie feedback endpoint
-            import aiohttp
-            
-            # Construct the API endpoint URL
-            base_url = CONFIG.DATABRICKS_HOST.rstrip('/')
-            api_endpoint = f"{base_url}/api/2.0/genie/spaces/{space_id}/conversations/{conversation_id}/messages/{message_id}/feedback"
+            # If the direct API method is not available, make a direct HTTP request to the
+            # Genie feedback endpoint over the shared Databricks HTTP session
+            api_path = f"/api/2.0/genie/spaces/{target.space_id}/conversations/{conversation_id}/messages/{message_id}/feedback"
             
             # Prepare the request payload
             payload = {
                 "rating": feedback_type
             }
             
-            # Prepare headers
-            headers = {
-                "Authorization": f"Bearer {CONFIG.DATABRICKS_TOKEN}",
-                "Content-Type": "application/json"
-            }
-            
             # Make the HTTP request
-            logger.info(f"Sending feedback to: {api_endpoint}")
-            logger.info(f"Payload: {payload}")
+            logger.debug("Sending feedback to %s: %s", api_path, payload)
             
-            async with aiohttp.ClientSession() as session:
-                async with session.post(api_endpoint, json=payload, headers=headers) as response:
-                    response_text = await response.text()
-                    if response.status == 200:
-                        logger.info(f"Successfully sent {feedback_type} feedback via HTTP API")
-                    else:
-                        logger.error(f"Failed to send feedback via HTTP API: {response.status} - {response_text}")
-                        raise Exception(f"HTTP {response.status}: {response_text}")
+            status, response_text = await databricks_rest_request(
+                "POST", api_path, payload, host=target.host, token=target.token
+            )
+            if status == 200:
+                logger.info("Successfully sent %s feedback via HTTP API", feedback_type)
+            else:
+                logger.error("Failed to send feedback via HTTP API: %s - %s", status, response_text)
+                raise Exception(f"HTTP {status}: {response_text}")
                         
         except Exception as e:
-            logger.error(f"Error in alternative feedback method: {str(e)}")
+            logger.error("Error in alternative feedback method: %s", e)
             raise
 
-    async def _get_last_genie_message_id(self, conversation_id: str) -> Optional[str]:
-        """Get the last message ID from the Genie conversation"""
+    def _feedback_card_attachment(self, user_session: UserSession, delivery: str = "separate") -> Dict:
+        """Build the feedback card attachment for the user's latest Genie message"""
+        # Use the actual Genie message ID if available, otherwise generate a fallback
+        genie_message_id = (
+            user_session.user_context.get('last_genie_message_id')
+            or message_index.latest(user_session.conversation_id)
+        )
+        if genie_message_id:
+            message_id = genie_message_id
+            logger.info("Creating feedback card for specific Genie message ID: %s", message_id)
+        else:
+            # Fallback to generated ID if we don't have the Genie message ID
+            message_id = f"msg_{int(datetime.now().timestamp() * 1000)}"
+            logger.warning("No Genie message ID available for user %s, using fallback: %s", user_session.get_display_name(), message_id)
+
+        feedback_card = self.create_feedback_card(
+            message_id, user_session.user_id, user_session.conversation_id, delivery, user_session.genie_target
+        )
+        return {
+            "contentType": "application/vnd.microsoft.card.adaptive",
+            "content": feedback_card
+        }
+
+    async def _run_tracked(self, user_id: str, run: GenieRun, coro):
+        """Run a Genie question as a task that reset commands can cancel"""
+        task = asyncio.ensure_future(coro)
+        entry = (run, task)
+        self.inflight_questions.setdefault(user_id, []).append(entry)
+        if follow_up_prefetcher is not None:
+            # Live questions take precedence over speculative follow-ups
+            follow_up_prefetcher.preempt()
         try:
-            if not conversation_id:
-                return None
-                
-            loop = asyncio.get_running_loop()
-            # Try different method names for listing messages
-            try:
-                # Try list_conversation_messages first
-                messages = await loop.run_in_executor(
-                    None,
-                    genie_api.list_conversation_messages,
-                    CONFIG.DATABRICKS_SPACE_ID,
-                    conversation_id,
-                )
-            except AttributeError:
-                try:
-                    # Try get_conversation_messages
-                    messages = await loop.run_in_executor(
-                        None,
-                        genie_api.get_conversation_messages,
-                        CONFIG.DATABRICKS_SPACE_ID,
-                        conversation_id,
+            return await task
+        finally:
+            entries = self.inflight_questions.get(user_id, [])
+            if entry in entries:
+                entries.remove(entry)
+            if not entries:
+                self.inflight_questions.pop(user_id, None)
+
+    def _cancel_inflight_questions(self, user_id: str, reason: str) -> int:
+        """Cancel a user's in-flight Genie questions. Returns how many were cancelled."""
+        cancelled = 0
+        for run, task in self.inflight_questions.get(user_id, []):
+            if not task.done():
+                run.cancel_reason = reason
+                task.cancel()
+                cancelled += 1
+        return cancelled
+
+    async def _start_progress(self, turn_context: TurnContext, user_session: UserSession):
+        """Send a typing indicator and a status message for a Genie run.
+
+        Returns the status activity ID (None if it could not be posted) and an on_progress
+        callback that rewrites the status message in place as the Genie message changes state.
+        """
+        try:
+            await turn_context.send_activity(Activity(type=ActivityTypes.typing))
+            status_text = (
+                "🤖 **Starting New Conversation...**" if user_session.conversation_id is None
+                else "🤖 **Working on your question...**"
+            )
+            resource = await turn_context.send_activity(status_text)
+        except Exception as e:
+            logger.warning("Could not send progress status message: %s", e)
+            return None, None
+
+        status_activity_id = resource.id if resource is not None else None
+        if not status_activity_id:
+            return None, None
+
+        async def on_progress(status: str):
+            status_line = GENIE_STATUS_MESSAGES.get(status)
+            if status_line:
+                await turn_context.update_activity(
+                    Activity(
+                        id=status_activity_id,
+                        type=ActivityTypes.message,
+                        conversation=turn_context.activity.conversation,
+                        text=f"{status_text}\n\n{status_line}",
                     )
-                except AttributeError:
-                    # If neither method exists, return None and log a warning
-                    logger.warning("No suitable method found for listing Genie conversation messages")
-                    return None
-            
-            # Handle different response types
-            if messages:
-                logger.info(f"Messages response type: {type(messages)}")
-                logger.info(f"Messages response attributes: {dir(messages)}")
-                
-                # Check if it's a response object with messages property
-                if hasattr(messages, 'messages') and messages.messages:
-                    logger.info(f"Found {len(messages.messages)} messages in response.messages")
-                    # Sort messages by timestamp to get the most recent one
-                    try:
-                        sorted_messages = sorted(messages.messages, key=lambda x: getattr(x, 'created_at', 0), reverse=True)
-                        if sorted_messages:
-                            latest_message = sorted_messages[0]
-                            logger.info(f"Latest message ID: {latest_message.message_id}")
-                            return latest_message.message_id
-                    except Exception as e:
-                        logger.warning(f"Could not sort messages by timestamp: {e}, using last message")
-                        return messages.messages[-1].message_id
-                # Check if it's a list-like object
-                elif hasattr(messages, '__len__') and len(messages) > 0:
-                    logger.info(f"Found {len(messages)} messages in response (list-like)")
-                    # Sort messages by timestamp to get the most recent one
-                    try:
-                        sorted_messages = sorted(messages, key=lambda x: getattr(x, 'created_at', 0), reverse=True)
-                        if sorted_messages:
-                            latest_message = sorted_messages[0]
-                            logger.info(f"Latest message ID: {latest_message.message_id}")
-                            return latest_message.message_id
-                    except Exception as e:
-                        logger.warning(f"Could not sort messages by timestamp: {e}, using last message")
-                        return messages[-1].message_id
-                # Check if it's iterable
-                elif hasattr(messages, '__iter__'):
-                    message_list = list(messages)
-                    if message_list:
-                        logger.info(f"Found {len(message_list)} messages in response (iterable)")
-                        # Sort messages by timestamp to get the most recent one
-                        try:
-                            sorted_messages = sorted(message_list, key=lambda x: getattr(x, 'created_at', 0), reverse=True)
-                            if sorted_messages:
-                                latest_message = sorted_messages[0]
-                                logger.info(f"Latest message ID: {latest_message.message_id}")
-                                return latest_message.message_id
-                        except Exception as e:
-                            logger.warning(f"Could not sort messages by timestamp: {e}, using last message")
-                            return message_list[-1].message_id
-                else:
-                    logger.warning(f"Unable to extract messages from response of type {type(messages)}")
-            return None
-            
+                )
+
+        return status_activity_id, on_progress
+
+    async def _post_activity(self, turn_context: TurnContext, activity: Activity, replace_activity_id: Optional[str] = None):
+        """Send an activity, or replace an existing one in place when replace_activity_id is given.
+
+        Returns the ID of the activity that now holds the content.
+        """
+        if replace_activity_id:
+            try:
+                activity.id = replace_activity_id
+                activity.conversation = turn_context.activity.conversation
+                await turn_context.update_activity(activity)
+                return replace_activity_id
+            except Exception as e:
+                logger.warning("Could not update activity %s in place, sending a new one: %s", replace_activity_id, e)
+                activity.id = None
+        resource = await turn_context.send_activity(activity)
+        return resource.id if resource is not None else None
+
+    async def _send_answer(
+        self,
+        turn_context: TurnContext,
+        user_session: UserSession,
+        response: str,
+        card: Optional[Dict] = None,
+        replace_activity_id: Optional[str] = None,
+        suggested_questions: Optional[List[str]] = None,
+    ):
+        """Send an answer (text plus an optional result card) and its feedback card.
+
+        In combined delivery mode both go out as a single activity (one Bot Connector call),
+        with the feedback buttons merged into the result card when there is one; otherwise
+        the feedback card follows as a separate message. When replace_activity_id is given the
+        answer replaces that activity (the progress status message) instead of being sent anew.
+        Suggested follow-up questions ride on the last activity sent as quick replies, since
+        channels only show quick replies on the latest message.
+        """
+        card_attachments = [{"contentType": "application/vnd.microsoft.card.adaptive", "content": card}] if card else []
+        suggested_actions = self._follow_up_suggestions(suggested_questions)
+        if not (CONFIG.ENABLE_FEEDBACK_CARDS and CONFIG.RESPONSE_DELIVERY_MODE == "combined"):
+            await self._post_activity(
+                turn_context,
+                Activity(
+                    type=ActivityTypes.message,
+                    text=response,
+                    attachments=card_attachments or None,
+                    suggested_actions=None if CONFIG.ENABLE_FEEDBACK_CARDS else suggested_actions,
+                ),
+                replace_activity_id,
+            )
+            await self._send_feedback_card(turn_context, user_session, suggested_actions)
+            return
+
+        try:
+            attachment = self._feedback_card_attachment(user_session, delivery="combined")
         except Exception as e:
-            logger.error(f"Error getting last Genie message ID: {str(e)}")
-            return None
+            logger.error("Error creating feedback card: %s", e)
+            await self._post_activity(
+                turn_context,
+                Activity(
+                    type=ActivityTypes.message,
+                    text=response,
+                    attachments=card_attachments or None,
+                    suggested_actions=suggested_actions,
+                ),
+                replace_activity_id,
+            )
+            return
 
-    async def _send_feedback_card(self, turn_context: TurnContext, user_session: UserSession):
+        if card:
+            feedback_card = attachment["content"]
+            attachment = {
+                "contentType": "application/vnd.microsoft.card.adaptive",
+                "content": dict(card, body=card["body"] + feedback_card["body"], actions=feedback_card["actions"]),
+            }
+
+        activity_id = await self._post_activity(
+            turn_context,
+            Activity(type=ActivityTypes.message, text=response, attachments=[attachment], suggested_actions=suggested_actions),
+            replace_activity_id,
+        )
+        if activity_id:
+            # Remember the answer so a feedback click can rewrite the activity without losing it
+            self.combined_answers[activity_id] = (response, card)
+            while len(self.combined_answers) > CONFIG.COMBINED_ANSWER_CACHE_SIZE:
+                self.combined_answers.popitem(last=False)
+
+    async def _send_feedback_card(
+        self, turn_context: TurnContext, user_session: UserSession, suggested_actions: Optional[SuggestedActions] = None
+    ):
         """Send a feedback card after a bot response"""
         try:
             # Check if feedback cards are enabled
             if not CONFIG.ENABLE_FEEDBACK_CARDS:
                 return
-                
-            # Use the actual Genie message ID if available, otherwise generate a fallback
-            genie_message_id = user_session.user_context.get('last_genie_message_id')
-            if genie_message_id:
-                message_id = genie_message_id
-                logger.info(f"Creating feedback card for specific Genie message ID: {message_id}")
-            else:
-                # Fallback to generated ID if we don't have the Genie message ID
-                message_id = f"msg_{int(datetime.now().timestamp() * 1000)}"
-                logger.warning(f"No Genie message ID available for user {user_session.get_display_name()}, using fallback: {message_id}")
-            
-            # Create feedback card
-            feedback_card = self.create_feedback_card(message_id, user_session.user_id)
             
             # Send the card as an attachment
             activity = Activity(
                 type=ActivityTypes.message,
-                attachments=[{
-                    "contentType": "application/vnd.microsoft.card.adaptive",
-                    "content": feedback_card
-                }]
+                attachments=[self._feedback_card_attachment(user_session)],
+                suggested_actions=suggested_actions,
             )
             
             await turn_context.send_activity(activity)
             
         except Exception as e:
-            logger.error(f"Error sending feedback card: {str(e)}")
+            logger.error("Error sending feedback card: %s", e)
+
+    async def _acknowledge_feedback(self, turn_context: TurnContext, card: Dict, fallback_text: str):
+        """Replace the clicked feedback card in place, or send fallback_text as a new message.
+
+        Combined answer activities can only be rewritten while their answer is still cached;
+        otherwise updating would drop the answer, so a new message is sent instead.
+        """
+        activity = turn_context.activity
+        reply_to_id = activity.reply_to_id
+        if reply_to_id:
+            combined = isinstance(activity.value, dict) and activity.value.get("delivery") == "combined"
+            cached = self.combined_answers.get(reply_to_id) if combined else None
+            if not combined or cached is not None:
+                text, result_card = cached or (None, None)
+                if result_card:
+                    # Keep the results and replace the feedback buttons with the acknowledgement
+                    card = dict(result_card, body=result_card["body"] + card["body"])
+                try:
+                    await turn_context.update_activity(
+                        Activity(
+                            id=reply_to_id,
+                            type=ActivityTypes.message,
+                            conversation=activity.conversation,
+                            text=text,
+                            attachments=[{
+                                "contentType": "application/vnd.microsoft.card.adaptive",
+                                "content": card
+                            }],
+                        )
+                    )
+                    self.combined_answers.pop(reply_to_id, None)
+                    return
+                except Exception as e:
+                    logger.warning("Could not update feedback card in place: %s", e)
+
+        await turn_context.send_activity(fallback_text)
 
     async def on_members_added_activity(
         self, members_added: List[ChannelAccount], turn_context: TurnContext
@@ -1234,12 +2620,19 @@ Example: `/setuser john.doe@company.com John Doe`"""
 
 Ready to get started? Type `email` to begin!"""
                 
-                await turn_context.send_activity(welcome_message)
+                await turn_context.send_activity(
+                    Activity(
+                        type=ActivityTypes.message,
+                        text=welcome_message,
+                        attachments=[{
+                            "contentType": "application/vnd.microsoft.card.adaptive",
+                            "content": self.create_sample_questions_card(),
+                        }],
+                    )
+                )
 
 
 
-logging.basicConfig(level=logging.INFO)
-logger = logging.getLogger(__name__)
 logger.info("🚀 Starting Databricks Genie Bot App")
 
 CONFIG = DefaultConfig()
@@ -1250,9 +2643,173 @@ else:
     SETTINGS = BotFrameworkAdapterSettings("", "")
     ADAPTER = BotFrameworkAdapter(SETTINGS)
 
+
+
+def instrument_connector(adapter):
+    """Record Bot Connector sends and in-place updates in the connector_send stage and as spans"""
+    send_activities, update_activity = adapter.send_activities, adapter.update_activity
+
+    async def timed_send_activities(context, activities):
+        started = time.perf_counter()
+        try:
+            with tracer.start_span("connector.send_activities", {"activities": len(activities)}):
+                return await send_activities(context, activities)
+        finally:
+            stage_seconds.observe(time.perf_counter() - started, "connector_send")
+
+    async def timed_update_activity(context, activity):
+        started = time.perf_counter()
+        try:
+            with tracer.start_span("connector.update_activity", {"activity.id": activity.id}):
+                return await update_activity(context, activity)
+        finally:
+            stage_seconds.observe(time.perf_counter() - started, "connector_send")
+
+    adapter.send_activities = timed_send_activities
+    adapter.update_activity = timed_update_activity
+
+
+instrument_connector(ADAPTER)
+
 BOT = MyBot()
 is_warmed_up = False
 
+
+async def answer_sample_question(question: str) -> str:
+    """Ask Genie a sample question on behalf of the background refresher, in its own conversation"""
+    answer, _, _ = await ask_genie(question, default_target, SAMPLE_ANSWER_SESSION)
+    return answer
+
+
+SAMPLE_ANSWER_SESSION = UserSession("sample-answers", CONFIG.SAMPLE_ANSWER_IDENTITY, "Sample answers")
+sample_answers = (
+    SampleAnswerCache(
+        BOT._get_sample_questions(),
+        answer_sample_question,
+        refresh_interval=CONFIG.SAMPLE_ANSWER_REFRESH_MINUTES * 60,
+        max_age=CONFIG.SAMPLE_ANSWER_MAX_AGE_MINUTES * 60,
+        concurrency=CONFIG.SAMPLE_ANSWER_CONCURRENCY,
+        # Defer refreshes while users are waiting on Genie
+        is_busy=lambda: bool(BOT.inflight_questions),
+    )
+    if CONFIG.ENABLE_SAMPLE_ANSWERS
+    else None
+)
+
+
+SUBSCRIPTION_SESSION = UserSession("subscriptions", CONFIG.SUBSCRIPTION_IDENTITY, "Subscriptions")
+
+
+async def answer_subscribed_question(question: str, subscriber=None) -> str:
+    """Ask Genie a subscribed question once for all of its subscribers.
+
+    Shared questions are asked as SUBSCRIPTION_IDENTITY. First-person questions are asked
+    as their subscriber; subscriptions made before emails were stored use the user's
+    current session, or SUBSCRIPTION_IDENTITY if there is none. A routing prefix in the
+    question (e.g. "/finance ...") sends it to that Genie target.
+    """
+    user_session = SUBSCRIPTION_SESSION
+    if subscriber is not None:
+        email = subscriber.user_email
+        if not email:
+            live_session = BOT.user_sessions.get(subscriber.user_id)
+            email = live_session.email if live_session is not None else CONFIG.SUBSCRIPTION_IDENTITY
+        user_session = UserSession(subscriber.user_id, email, subscriber.user_name)
+    target_name, question = genie_router.resolve(None, None, question)
+    answer, _, _ = await ask_genie(question, genie_targets[target_name], user_session)
+    return answer
+
+
+async def deliver_subscription(subscription, answer: str):
+    """Send a subscribed question's answer to one subscriber as a proactive message"""
+    header = f"**📬 Daily: {subscription.question}**"
+    response, table_card = render_answer(header, json.loads(answer))
+    attachments = [{"contentType": "application/vnd.microsoft.card.adaptive", "content": table_card}] if table_card else None
+
+    async def send(turn_context: TurnContext):
+        await turn_context.send_activity(Activity(type=ActivityTypes.message, text=response, attachments=attachments))
+
+    reference = ConversationReference().deserialize(subscription.reference)
+    await ADAPTER.continue_conversation(reference, send, CONFIG.APP_ID)
+
+
+async def prefetch_follow_up(user_id: str, conversation_id: str, question: str, run: GenieRun):
+    """Ask a suggested follow-up in the user's conversation ahead of time"""
+    user_session = BOT.user_sessions.get(user_id) or UserSession(user_id, "prefetch")
+    return await ask_genie(question, run.target, user_session, conversation_id, run=run)
+
+
+def user_genie_target(user_id: str) -> GenieTarget:
+    """The Genie target of a user's current conversation"""
+    user_session = BOT.user_sessions.get(user_id)
+    return genie_targets.get(user_session.genie_target if user_session else DEFAULT_TARGET, default_target)
+
+
+follow_up_prefetcher = (
+    FollowUpPrefetcher(
+        prefetch_follow_up,
+        run_factory=lambda user_id: GenieRun(user_genie_target(user_id), Deadline(CONFIG.GENIE_QUESTION_TIMEOUT_SECONDS)),
+        live_load=lambda: sum(len(entries) for entries in BOT.inflight_questions.values()),
+        is_healthy=lambda user_id: not user_genie_target(user_id).breaker.is_open,
+        admission_threshold=CONFIG.PREFETCH_ADMISSION_THRESHOLD,
+        concurrency=CONFIG.PREFETCH_CONCURRENCY,
+        max_per_answer=CONFIG.PREFETCH_MAX_PER_ANSWER,
+        ttl=CONFIG.PREFETCH_TTL_MINUTES * 60,
+    )
+    if CONFIG.ENABLE_FOLLOW_UP_PREFETCH
+    else None
+)
+
+
+subscription_scheduler = (
+    SubscriptionScheduler(
+        subscription_store,
+        answer_subscribed_question,
+        deliver_subscription,
+        window=CONFIG.SUBSCRIPTION_WINDOW_MINUTES * 60,
+        concurrency=CONFIG.SUBSCRIPTION_CONCURRENCY,
+        max_failures=CONFIG.SUBSCRIPTION_MAX_FAILURES,
+    )
+    if subscription_store is not None
+    else None
+)
+
+def executor_queue_depth(executor: ThreadPoolExecutor) -> int:
+    return executor._work_queue.qsize()
+
+
+metrics.gauge(
+    "genie_bot_questions_in_flight", "Live questions waiting on Genie",
+    lambda: sum(len(entries) for entries in BOT.inflight_questions.values()),
+)
+metrics.gauge("genie_bot_user_sessions", "Active user sessions", lambda: len(BOT.user_sessions))
+metrics.gauge(
+    "genie_bot_conversations", "User sessions with an open Genie conversation",
+    lambda: sum(1 for session in BOT.user_sessions.values() if session.conversation_id),
+)
+metrics.gauge(
+    "genie_bot_databricks_calls_in_flight", "Databricks SDK calls running or queued, per Genie target",
+    lambda: {(name,): target.calls_in_flight for name, target in genie_targets.items()}, ("target",),
+)
+metrics.gauge(
+    "genie_bot_executor_queue_depth", "Databricks SDK calls waiting for an executor thread, per Genie target",
+    lambda: {(name,): executor_queue_depth(target.executor) for name, target in genie_targets.items()}, ("target",),
+)
+metrics.gauge(
+    "genie_bot_default_executor_queue_depth", "Blocking calls (journal, result frames) waiting for the loop's default executor",
+    lambda: executor_queue_depth(asyncio.get_running_loop()._default_executor)
+    if asyncio.get_running_loop()._default_executor is not None else 0,
+)
+metrics.gauge(
+    "genie_bot_circuit_open", "1 while a Genie target's circuit breaker is open",
+    lambda: {(name,): int(target.breaker.is_open) for name, target in genie_targets.items()}, ("target",),
+)
+metrics.gauge(
+    "genie_bot_prefetches_in_flight", "Follow-up prefetches running",
+    lambda: follow_up_prefetcher.stats()["running"] if follow_up_prefetcher is not None else 0,
+)
+metrics.gauge("genie_bot_result_store_bytes", "Memory held by stored results for local commands", lambda: result_store.nbytes)
+
 async def warm_up_bot():
     """Run lightweight initialization to prepare the bot for first request."""
     global is_warmed_up
@@ -1265,32 +2822,124 @@ async def warm_up_bot():
         is_warmed_up = True
         logger.info("✅ Bot warmed up successfully.")
     except Exception as e:
-        logger.error(f"❌ Warm-up failed: {e}")
+        logger.error("❌ Warm-up failed: %s", e)
 
 async def root(req: Request) -> Response:
     """Root endpoint for Azure probe."""
     return web.Response(text="✅ Databricks Genie Bot is running")
 
+def has_bearer_token(req: Request, token: str) -> bool:
+    """Whether the request carries "Authorization: Bearer <token>"; never true when no token is configured"""
+    return bool(token) and hmac.compare_digest(req.headers.get("Authorization", ""), f"Bearer {token}")
+
 async def health(req: Request) -> Response:
-    """Health check endpoint; also ensures bot is warmed up."""
+    """Health check endpoint; also ensures bot is warmed up.
+
+    Internal state (targets, caches, queues, event loop stall stacks) is only included for
+    requests bearing METRICS_TOKEN.
+    """
     global is_warmed_up
     if not is_warmed_up:
         logger.info("Health probe triggered - warming up bot...")
         await warm_up_bot()
-    return json_response({"status": "ok", "warmed_up": is_warmed_up})
+    if not has_bearer_token(req, CONFIG.METRICS_TOKEN):
+        return json_response({"status": "ok", "warmed_up": is_warmed_up})
+    return json_response({
+        "status": "ok",
+        "warmed_up": is_warmed_up,
+        "databricks_circuit": default_target.breaker.state,
+        "genie_targets": {name: target.stats() for name, target in genie_targets.items()},
+        "feedback_journal": feedback_journal.stats() if feedback_journal is not None else None,
+        "message_index": message_index.stats(),
+        "question_index": question_index.stats() if question_index is not None else None,
+        "sample_answers": sample_answers.stats() if sample_answers is not None else None,
+        "subscriptions": subscription_scheduler.stats() if subscription_scheduler is not None else None,
+        "follow_up_prefetch": follow_up_prefetcher.stats() if follow_up_prefetcher is not None else None,
+        "conversation_latency": conversation_latency_stats.summary(),
+        "tracing": tracer.exporter.stats() if tracer.exporter is not None else None,
+        "logging": log_setup.stats(),
+        "event_loop": loop_monitor.stats() if loop_monitor is not None else None,
+        "traffic_recording": traffic_recorder.stats() if traffic_recorder is not None else None,
+    })
+
+async def metrics_endpoint(req: Request) -> Response:
+    """Prometheus scrape endpoint (METRICS_TOKEN required when set)"""
+    if CONFIG.METRICS_TOKEN and not has_bearer_token(req, CONFIG.METRICS_TOKEN):
+        return Response(status=HTTPStatus.UNAUTHORIZED)
+    return Response(
+        text=metrics.render(),
+        headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8", "Cache-Control": "no-store"},
+    )
+
+profile_lock = asyncio.Lock()
+
+async def debug_profile(req: Request) -> Response:
+    """Sample the running process for ?seconds=N and return collapsed stacks (admin token required).
+
+    thread=loop samples only the event loop thread; memory=1 adds a tracemalloc diff and
+    returns JSON, as does format=json.
+    """
+    if not has_bearer_token(req, CONFIG.DEBUG_PROFILE_TOKEN):
+        return Response(status=HTTPStatus.UNAUTHORIZED)
+    try:
+        seconds = float(req.query.get("seconds", "10"))
+    except ValueError:
+        return Response(status=HTTPStatus.BAD_REQUEST, text="seconds must be a number")
+    seconds = min(max(seconds, 0.1), CONFIG.DEBUG_PROFILE_MAX_SECONDS)
+    with_memory = req.query.get("memory", "").lower() in ("1", "true")
+    as_json = with_memory or req.query.get("format") == "json"
+    if profile_lock.locked():
+        return Response(status=HTTPStatus.CONFLICT, text="A profile is already running")
+
+    async with profile_lock:
+        loop = asyncio.get_running_loop()
+        logger.info("Profiling for %.1fs (memory: %s)", seconds, with_memory)
+        # Snapshots walk the whole heap, so they are taken off the event loop
+        memory = await loop.run_in_executor(None, MemoryDiff, BOT) if with_memory else None
+        profiler = SamplingProfiler(
+            CONFIG.DEBUG_PROFILE_INTERVAL_MS / 1000,
+            thread_id=threading.get_ident() if req.query.get("thread") == "loop" else None,
+        )
+        profiler.start()
+        try:
+            await asyncio.sleep(seconds)
+        finally:
+            profiler.stop()
+        memory_diff = await loop.run_in_executor(None, memory.finish) if memory is not None else None
+
+    if not as_json:
+        return Response(text=profiler.collapsed(), headers={"Cache-Control": "no-store"})
+    return json_response({
+        "seconds": round(profiler.duration, 3),
+        "samples": profiler.samples,
+        "interval_ms": CONFIG.DEBUG_PROFILE_INTERVAL_MS,
+        "top_functions": profiler.top_functions(),
+        "collapsed": profiler.collapsed(),
+        "memory": memory_diff,
+    })
 
 async def messages(req: Request) -> Response:
-    """Main endpoint for incoming Bot Framework messages."""
+    """Main endpoint for incoming Bot Framework messages.
+
+    The body is decoded and deserialized once here; the Activity is handed to the adapter
+    as is, so neither the adapter nor the fallback path reads or parses the request again.
+    """
     global is_warmed_up
 
     content_type = req.headers.get("Content-Type", "").lower()
     if "application/json" not in content_type:
-        logger.error(f"Unsupported Content-Type: {content_type}")
+        logger.error("Unsupported Content-Type: %s", content_type)
         return Response(status=415)
 
-    body = await req.json()
+    try:
+        body = json_loads(await req.read())
+    except ValueError as e:
+        logger.warning("Rejected activity with an invalid JSON body: %s", e)
+        return Response(status=400)
     auth_header = req.headers.get("Authorization", "")
     activity = Activity().deserialize(body)
+    if not activity.type:
+        return Response(status=400)
 
     if not is_warmed_up:
         logger.warning("⚠️ Cold start detected — warming up before processing message...")
@@ -1302,56 +2951,135 @@ async def messages(req: Request) -> Response:
                     "Please wait a few seconds while I get ready."
                 )
 
-            await ADAPTER.process_activity(activity, auth_header, send_warming_notice)
+            await adapter_process_activity(activity, auth_header, send_warming_notice)
             logger.info("📨 Sent 'warming up' notice to Teams successfully.")
         except Exception as e:
-            logger.error(f"Failed to send 'warming up' notice: {e}", exc_info=True)
+            logger.error("Failed to send 'warming up' notice: %s", e, exc_info=True)
 
         await warm_up_bot()
 
         try:
             logger.info("🔁 Replaying user message after warm-up...")
-            await ADAPTER.process_activity(activity, auth_header, BOT.on_turn)
+            await adapter_process_activity(activity, auth_header, recorded_turn(body))
             logger.info("✅ Warm-up complete and user message processed.")
             return Response(status=201)
         except Exception as e:
-            logger.error(f"❌ Error reprocessing message after warm-up: {e}", exc_info=True)
+            logger.error("❌ Error reprocessing message after warm-up: %s", e, exc_info=True)
             return Response(status=500)
-    return await process_incoming_activity(req)
+    return await process_incoming_activity(activity, auth_header, recorded_turn(body))
 
 
-async def process_incoming_activity(req: Request) -> Response:
-    """Handle adapter dispatch for the incoming activity."""
-    auth_header = req.headers.get("Authorization", "")
+def recorded_turn(body: Dict) -> Callable[[TurnContext], Awaitable]:
+    """The bot's turn logic, recording the activity first when traffic recording is on.
 
-    try:
-        if hasattr(ADAPTER, "process"):
-            return await ADAPTER.process(req, BOT)
+    The adapter only calls it once the request is authenticated, so unauthenticated or
+    forged requests are never written to a cassette.
+    """
+    if traffic_recorder is None:
+        return BOT.on_turn
+
+    async def record_and_run(turn_context: TurnContext):
+        traffic_recorder.record_activity(body)
+        return await BOT.on_turn(turn_context)
+
+    return record_and_run
 
-        body = await req.json()
-        activity = Activity().deserialize(body)
-        response = await ADAPTER.process_activity(activity, auth_header, BOT.on_turn)
+
+async def adapter_process_activity(activity: Activity, auth_header: str, logic: Callable[[TurnContext], Awaitable]):
+    """Authenticate a deserialized activity and run logic for it on whichever adapter is configured"""
+    if isinstance(ADAPTER, CloudAdapter):
+        return await ADAPTER.process_activity(auth_header, activity, logic)
+    return await ADAPTER.process_activity(activity, auth_header, logic)
+
+
+async def process_incoming_activity(
+    activity: Activity, auth_header: str, logic: Callable[[TurnContext], Awaitable]
+) -> Response:
+    """Handle adapter dispatch for the incoming activity."""
+    started = time.perf_counter()
+    try:
+        response = await adapter_process_activity(activity, auth_header, logic)
 
         if isinstance(response, InvokeResponse):
-            return json_response(data=response.body, status=response.status)
+            # SDK models need serializing to their wire form; dict, list and str bodies are sent as they are
+            body = serializer_helper(response.body) if isinstance(response.body, Model) else response.body
+            return json_response(data=body, status=response.status)
         return Response(status=201)
+    except PermissionError:
+        return Response(status=401)
     except Exception as e:
-        logger.error(f"Error processing activity: {e}", exc_info=True)
+        logger.error("Error processing activity: %s", e, exc_info=True)
         return Response(status=500)
+    finally:
+        stage_seconds.observe(time.perf_counter() - started, "turn")
+
+
+async def compact_feedback_journal_periodically():
+    """Background job that compacts the feedback journal on a fixed interval"""
+    interval = CONFIG.FEEDBACK_JOURNAL_COMPACT_INTERVAL_HOURS * 3600
+    loop = asyncio.get_running_loop()
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await loop.run_in_executor(
+                None, feedback_journal.compact, CONFIG.FEEDBACK_JOURNAL_RETENTION_DAYS
+            )
+        except Exception as e:
+            logger.error("Feedback journal compaction failed: %s", e)
+
+
+# Long-running background tasks started in on_startup and cancelled on cleanup
+background_tasks: List[asyncio.Task] = []
 
 
 async def on_startup(app):
     logger.info("🌅 App startup detected — warming bot proactively...")
+    if loop_monitor is not None:
+        background_tasks.append(asyncio.create_task(loop_monitor.run()))
+    get_databricks_http_session()
+    if feedback_journal is not None:
+        feedback_journal.start()
+        if CONFIG.FEEDBACK_JOURNAL_COMPACT_INTERVAL_HOURS > 0:
+            background_tasks.append(asyncio.create_task(compact_feedback_journal_periodically()))
     await warm_up_bot()
+    if sample_answers is not None:
+        background_tasks.append(asyncio.create_task(sample_answers.run()))
+    if subscription_scheduler is not None:
+        await asyncio.get_running_loop().run_in_executor(None, subscription_store.load)
+        background_tasks.append(asyncio.create_task(subscription_scheduler.run()))
     #await send_warming_up_message()
+
+
+async def on_cleanup(app):
+    logger.info("🌙 App shutdown detected — closing shared HTTP clients...")
+    for task in background_tasks:
+        task.cancel()
+    await asyncio.gather(*background_tasks, return_exceptions=True)
+    background_tasks.clear()
+    if follow_up_prefetcher is not None:
+        await follow_up_prefetcher.close()
+    await asyncio.gather(*(target.close() for target in genie_targets.values()))
+    await asyncio.get_running_loop().run_in_executor(None, tracer.close)
+    if traffic_recorder is not None:
+        await asyncio.get_running_loop().run_in_executor(None, traffic_recorder.close)
+    await close_databricks_http_session()
+    if feedback_journal is not None:
+        await asyncio.get_running_loop().run_in_executor(None, feedback_journal.close)
+    if subscription_store is not None:
+        subscription_store.close()
     
 
 def init_func(argv=None):
     app = web.Application(middlewares=[aiohttp_error_middleware])
     app.router.add_get("/", root)
     app.router.add_get("/health", health)
+    if CONFIG.ENABLE_METRICS:
+        app.router.add_get("/metrics", metrics_endpoint)
+    if CONFIG.DEBUG_PROFILE_TOKEN:
+        app.router.add_get("/debug/profile", debug_profile)
     app.router.add_post("/api/messages", messages)
     app.on_startup.append(on_startup)
+    app.on_cleanup.append(on_cleanup)
     return app
 
 if __name__ == "__main__":
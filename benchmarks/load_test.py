@@ -0,0 +1,347 @@
+"""
+Load test
+
+Starts the local stand-ins (benchmarks/stand_ins.py) and the bot as a subprocess pointed
+at them, then posts synthetic Teams message activities to /api/messages at a target rate
+and reports throughput, end-to-end latency and per-stage latency.
+
+Arrivals are open loop: each activity is posted at its scheduled time whether or not
+earlier ones have been answered, and each goes to a synthetic user with no question in
+flight, so the offered load does not drop when the bot slows down. Because a turn is
+answered within the /api/messages request, the request's duration is the end-to-end
+latency of the question. Per-stage latencies (genie_submit, genie_wait, result_fetch,
+render, connector_send, turn) are read from the bot's /metrics histograms before and
+after the run, so their percentiles are interpolated within histogram buckets.
+
+The bot runs without APP_ID, so activities are accepted unsigned: validating signed
+activities needs Microsoft's OpenID metadata endpoints, which are not available offline.
+
+    python benchmarks/load_test.py --qps 20 --duration 60 --genie-latency 3 --rows 500
+    python benchmarks/load_test.py --qps 50 --duration 30 --error-rate 0.02 --rate-limit 100 --json report.json
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import re
+import socket
+import subprocess
+import sys
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+import aiohttp
+from aiohttp import web
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from stand_ins import StandIns, StandInSettings  # noqa: E402
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BUCKET_LINE = re.compile(r'^(\w+)_bucket\{(.*)\} (\S+)$')
+LABEL = re.compile(r'(\w+)="((?:[^"\\]|\\.)*)"')
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def percentile(samples: List[float], p: float) -> Optional[float]:
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(p * len(ordered)))]
+
+
+def parse_histograms(text: str, metric: str) -> Dict[Tuple[Tuple[str, str], ...], List[Tuple[float, float]]]:
+    """Cumulative (upper bound, count) buckets per label set of one histogram"""
+    series: Dict[Tuple[Tuple[str, str], ...], List[Tuple[float, float]]] = {}
+    for line in text.splitlines():
+        match = BUCKET_LINE.match(line)
+        if not match or match.group(1) != metric:
+            continue
+        labels = dict(LABEL.findall(match.group(2)))
+        bound = labels.pop("le")
+        key = tuple(sorted(labels.items()))
+        series.setdefault(key, []).append((math.inf if bound == "+Inf" else float(bound), float(match.group(3))))
+    return series
+
+
+def histogram_quantile(buckets: List[Tuple[float, float]], q: float) -> Optional[float]:
+    """Quantile from cumulative buckets, interpolating linearly within a bucket (as Prometheus does)"""
+    total = buckets[-1][1] if buckets else 0
+    if total <= 0:
+        return None
+    rank = q * total
+    lower_bound, lower_count = 0.0, 0.0
+    for bound, count in buckets:
+        if count >= rank:
+            if math.isinf(bound):
+                return lower_bound
+            if count == lower_count:
+                return bound
+            return lower_bound + (bound - lower_bound) * (rank - lower_count) / (count - lower_count)
+        lower_bound, lower_count = bound, count
+    return lower_bound
+
+
+def stage_report(before: str, after: str, metric: str, label: str) -> Dict[str, Dict]:
+    """Count and p50/p95/p99 (milliseconds) per label value, over the run only"""
+    earlier = parse_histograms(before, metric)
+    report = {}
+    for key, buckets in sorted(parse_histograms(after, metric).items()):
+        previous = dict(earlier.get(key, []))
+        delta = [(bound, count - previous.get(bound, 0.0)) for bound, count in buckets]
+        if not delta or delta[-1][1] <= 0:
+            continue
+        name = ",".join(value for _, value in key) if len(key) != 1 else dict(key)[label]
+        report[name] = {"count": int(delta[-1][1])}
+        for q in (0.50, 0.95, 0.99):
+            value = histogram_quantile(delta, q)
+            report[name][f"p{int(q * 100)}_ms"] = round(value * 1000, 1) if value is not None else None
+    return report
+
+
+class LoadGenerator:
+    """Posts message activities to the bot at a fixed rate and records their latency"""
+
+    def __init__(self, bot_url: str, service_url: str, qps: float, duration: float, users: int):
+        self.bot_url = bot_url
+        self.service_url = service_url
+        self.qps = qps
+        self.duration = duration
+        self.idle_users = [f"29:load-user-{index}" for index in range(users)]
+        self.created_users = users
+        self.latencies: List[float] = []
+        self.statuses: Dict[int, int] = {}
+        self.failures = 0
+        self.late_starts = 0
+        self._questions = 0
+
+    def activity(self, user_id: str) -> Dict:
+        self._questions += 1
+        return {
+            "type": "message",
+            "id": str(uuid.uuid4()),
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "serviceUrl": self.service_url,
+            "channelId": "msteams",
+            "from": {"id": user_id, "name": user_id.split(":")[-1], "aadObjectId": user_id.split(":")[-1]},
+            "conversation": {"id": f"a:{user_id}", "conversationType": "personal", "tenantId": "load-test"},
+            "recipient": {"id": "28:load-test-bot", "name": "Genie"},
+            # Questions differ so no answer is served from the reuse cache
+            "text": f"What was revenue for region {self._questions} last week?",
+            "channelData": {"tenant": {"id": "load-test"}},
+            "locale": "en-US",
+        }
+
+    async def _post(self, session: aiohttp.ClientSession, user_id: str):
+        started = time.perf_counter()
+        try:
+            async with session.post(self.bot_url, json=self.activity(user_id)) as response:
+                await response.read()
+                self.statuses[response.status] = self.statuses.get(response.status, 0) + 1
+                if response.status < 300:
+                    self.latencies.append(time.perf_counter() - started)
+                else:
+                    self.failures += 1
+        except Exception:
+            self.failures += 1
+        finally:
+            self.idle_users.append(user_id)
+
+    async def run(self) -> float:
+        timeout = aiohttp.ClientTimeout(total=None)
+        connector = aiohttp.TCPConnector(limit=0)
+        tasks = []
+        async with aiohttp.ClientSession(timeout=timeout, connector=connector) as session:
+            loop = asyncio.get_running_loop()
+            started = loop.time()
+            total = int(self.qps * self.duration)
+            for index in range(total):
+                scheduled = started + index / self.qps
+                delay = scheduled - loop.time()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                elif delay < -0.05:
+                    self.late_starts += 1
+                if not self.idle_users:
+                    self.idle_users.append(f"29:load-user-{self.created_users}")
+                    self.created_users += 1
+                tasks.append(asyncio.create_task(self._post(session, self.idle_users.pop())))
+            await asyncio.gather(*tasks)
+            return loop.time() - started
+
+
+async def wait_for_bot(url: str, process: subprocess.Popen, timeout: float = 60):
+    deadline = time.monotonic() + timeout
+    async with aiohttp.ClientSession() as session:
+        while time.monotonic() < deadline:
+            if process.poll() is not None:
+                raise RuntimeError(f"Bot exited with code {process.returncode} during startup")
+            try:
+                async with session.get(url) as response:
+                    if response.status == 200:
+                        return
+            except aiohttp.ClientError:
+                pass
+            await asyncio.sleep(0.25)
+    raise RuntimeError("Bot did not become healthy in time")
+
+
+async def scrape(session: aiohttp.ClientSession, url: str) -> str:
+    async with session.get(url) as response:
+        return await response.text()
+
+
+def bot_environment(args, stand_in_url: str, port: int) -> Dict[str, str]:
+    env = dict(os.environ)
+    env.update({
+        "PORT": str(port),
+        "APP_ID": "",
+        "APP_PASSWORD": "",
+        "DATABRICKS_HOST": stand_in_url,
+        "DATABRICKS_TOKEN": "dapi-load-test",
+        "DATABRICKS_SPACE_ID": "load-test-space",
+        "ENABLE_METRICS": "True",
+        "ENABLE_QUESTION_REUSE": "False",
+        "ENABLE_SAMPLE_ANSWERS": "False",
+        "ENABLE_SUBSCRIPTIONS": "False",
+        "ENABLE_FEEDBACK_JOURNAL": "False",
+        "LOG_LEVEL": "WARNING",
+        "GENIE_POLL_INITIAL_INTERVAL": str(args.poll_interval),
+    })
+    for assignment in args.bot_env:
+        key, _, value = assignment.partition("=")
+        env[key] = value
+    return env
+
+
+def print_report(report: Dict):
+    run = report["run"]
+    print(
+        f"\nOffered {run['offered_qps']:.1f} qps for {run['seconds']:.1f}s: {run['completed']} answered, "
+        f"{run['failed']} failed, {run['throughput_qps']:.2f} answers/s (statuses {run['statuses']}, "
+        f"{run['late_starts']} late starts)"
+    )
+    e2e = report["end_to_end_ms"]
+    print(f"End to end: p50 {e2e['p50']} ms, p95 {e2e['p95']} ms, p99 {e2e['p99']} ms, max {e2e['max']} ms\n")
+    for title, rows in (("Stage", report["stages"]), ("Databricks call", report["databricks_calls"])):
+        print(f"{title:<44} {'count':>7} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+        for name, row in rows.items():
+            print(f"{name:<44} {row['count']:>7} {row['p50_ms']!s:>9} {row['p95_ms']!s:>9} {row['p99_ms']!s:>9}")
+        print()
+    width = max([len("Stand-in endpoint")] + [len(endpoint) for endpoint in report["stand_ins"]])
+    print(f"{'Stand-in endpoint':<{width}} {'requests':>8} {'errors':>7} {'429s':>6} {'mean ms':>8}")
+    for endpoint, row in report["stand_ins"].items():
+        print(f"{endpoint:<{width}} {row['requests']:>8} {row['errors']:>7} {row['rate_limited']:>6} {row['mean_ms']!s:>8}")
+
+
+async def main_async(args) -> Dict:
+    settings = StandInSettings(
+        genie_latency=args.genie_latency,
+        statement_latency=args.statement_latency,
+        connector_latency=args.connector_latency,
+        latency_jitter=args.jitter,
+        error_rate=args.error_rate,
+        rate_limit=args.rate_limit,
+        result_rows=args.rows,
+        result_columns=args.columns,
+        text_answer_rate=args.text_answer_rate,
+        seed=args.seed,
+    )
+    stand_ins = StandIns(settings)
+    runner = web.AppRunner(stand_ins.app(), access_log=None)
+    await runner.setup()
+    stand_in_port = free_port()
+    await web.TCPSite(runner, "127.0.0.1", stand_in_port).start()
+    stand_in_url = f"http://127.0.0.1:{stand_in_port}"
+
+    bot_port = free_port()
+    bot_url = f"http://127.0.0.1:{bot_port}"
+    process = subprocess.Popen(
+        [sys.executable, "-m", "aiohttp.web", "-H", "127.0.0.1", "-P", str(bot_port), "app:init_func"],
+        cwd=REPO_ROOT,
+        env=bot_environment(args, stand_in_url, bot_port),
+    )
+    try:
+        await wait_for_bot(f"{bot_url}/health", process)
+        generator = LoadGenerator(f"{bot_url}/api/messages", stand_in_url, args.qps, args.duration, args.users)
+        async with aiohttp.ClientSession() as session:
+            before = await scrape(session, f"{bot_url}/metrics")
+            print(f"Driving {args.qps} qps for {args.duration}s against {bot_url} (stand-ins at {stand_in_url})...")
+            seconds = await generator.run()
+            after = await scrape(session, f"{bot_url}/metrics")
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=15)
+        except subprocess.TimeoutExpired:
+            process.kill()
+        await runner.cleanup()
+
+    latencies = generator.latencies
+
+    def ms(value: Optional[float]) -> Optional[float]:
+        return round(value * 1000, 1) if value is not None else None
+
+    return {
+        "settings": vars(args),
+        "run": {
+            "offered_qps": args.qps,
+            "seconds": seconds,
+            "completed": len(latencies),
+            "failed": generator.failures,
+            "throughput_qps": len(latencies) / seconds if seconds else 0.0,
+            "statuses": generator.statuses,
+            "late_starts": generator.late_starts,
+            "users": generator.created_users,
+        },
+        "end_to_end_ms": {
+            "p50": ms(percentile(latencies, 0.50)),
+            "p95": ms(percentile(latencies, 0.95)),
+            "p99": ms(percentile(latencies, 0.99)),
+            "max": ms(max(latencies) if latencies else None),
+        },
+        "stages": stage_report(before, after, "genie_bot_stage_seconds", "stage"),
+        "databricks_calls": stage_report(before, after, "genie_bot_databricks_call_seconds", "call"),
+        "stand_ins": stand_ins.stats(),
+        "connector_activities": stand_ins.connector_activities,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--qps", type=float, default=10, help="activities posted per second")
+    parser.add_argument("--duration", type=float, default=30, help="seconds of load")
+    parser.add_argument("--users", type=int, default=100, help="synthetic users to start with; more are added when all are busy")
+    parser.add_argument("--genie-latency", type=float, default=3.0, help="seconds until Genie completes a message")
+    parser.add_argument("--statement-latency", type=float, default=0.05, help="seconds to return a statement result")
+    parser.add_argument("--connector-latency", type=float, default=0.02, help="seconds per Bot Connector request")
+    parser.add_argument("--jitter", type=float, default=0.3, help="latency variation as a fraction (+/-)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of Databricks requests failing with 503")
+    parser.add_argument("--rate-limit", type=float, default=0.0, help="Databricks requests per second before 429s, 0 = unlimited")
+    parser.add_argument("--rows", type=int, default=100, help="rows per query result")
+    parser.add_argument("--columns", type=int, default=5, help="columns per query result")
+    parser.add_argument("--text-answer-rate", type=float, default=0.0, help="fraction of answers that are text rather than a query")
+    parser.add_argument("--poll-interval", type=float, default=0.5, help="bot's GENIE_POLL_INITIAL_INTERVAL")
+    parser.add_argument("--bot-env", action="append", default=[], metavar="KEY=VALUE", help="extra bot environment setting")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--json", metavar="PATH", help="also write the report as JSON")
+    args = parser.parse_args()
+
+    report = asyncio.run(main_async(args))
+    print_report(report)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
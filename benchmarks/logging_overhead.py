@@ -0,0 +1,114 @@
+"""
+Logging overhead per turn
+
+Measures the time the event loop thread spends in log calls for one typical question
+turn, before and after the logging overhaul:
+
+- before: f-string messages formatted at the call site, written synchronously by the
+  handler logging.basicConfig installs
+- after: lazy %-style messages through configure_logging (records queued unformatted
+  and written on a listener thread, per-statement rate limiting)
+
+Records are written to a temporary file; --write-delay-ms simulates a slow stderr (a
+terminal, or a log shipper applying back-pressure on the pipe).
+
+    python benchmarks/logging_overhead.py --turns 20000 --write-delay-ms 0.2
+"""
+
+import argparse
+import io
+import logging
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from log_setup import configure_logging  # noqa: E402
+
+
+class SlowStream(io.TextIOWrapper):
+    """File stream that sleeps on every write"""
+
+    def __init__(self, path: str, delay: float):
+        super().__init__(open(path, "wb"), encoding="utf-8", write_through=True)
+        self.delay = delay
+
+    def write(self, text: str) -> int:
+        if self.delay:
+            time.sleep(self.delay)
+        return super().write(text)
+
+
+class Session:
+    def __init__(self):
+        self.user_id = "29:1a2b3c4d5e6f"
+        self.name = "Avery Example"
+        self.conversation_id = "01f0a1b2c3d4e5f6a7b8c9d0e1f2a3b4"
+
+    def get_display_name(self) -> str:
+        return f"{self.name} ({self.user_id})"
+
+
+def turn_before(logger: logging.Logger, session: Session, turn: int):
+    """The log statements of one answered question, as they were written before"""
+    logger.debug(f"Message activity {turn} (name {None}, has text: {True})")
+    logger.debug(f"Indexed {turn % 50} messages for conversation {session.conversation_id}")
+    logger.info(f"Creating feedback card for specific Genie message ID: msg-{turn}")
+    logger.info(f"Answered 'revenue by region' locally for {session.get_display_name()} ({12345:,} rows) in {1.234:.1f} ms")
+    logger.warning(f"Progress update failed: {TimeoutError('send timed out')}")
+
+
+def turn_after(logger: logging.Logger, session: Session, turn: int):
+    """The same statements after the overhaul"""
+    logger.debug("Message activity %s (name %s, has text: %s)", turn, None, True)
+    logger.debug("Indexed %s messages for conversation %s", turn % 50, session.conversation_id)
+    logger.info("Creating feedback card for specific Genie message ID: %s", f"msg-{turn}")
+    logger.info(
+        "Answered '%s' locally for %s (%s rows) in %.1f ms",
+        "revenue by region", session.get_display_name(), format(12345, ","), 1.234,
+    )
+    logger.warning("Progress update failed: %s", TimeoutError("send timed out"))
+
+
+def measure(turn_fn, logger: logging.Logger, turns: int) -> float:
+    session = Session()
+    started = time.perf_counter()
+    for turn in range(turns):
+        turn_fn(logger, session, turn)
+    return (time.perf_counter() - started) / turns
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--turns", type=int, default=20000)
+    parser.add_argument("--write-delay-ms", type=float, default=0.0)
+    parser.add_argument("--rate-limit-per-minute", type=float, default=60)
+    args = parser.parse_args()
+    delay = args.write_delay_ms / 1000
+
+    with tempfile.TemporaryDirectory() as tmp:
+        logger = logging.getLogger("bench")
+
+        before_stream = SlowStream(os.path.join(tmp, "before.log"), delay)
+        logging.basicConfig(level=logging.INFO, stream=before_stream, force=True)
+        before = measure(turn_before, logger, args.turns)
+        print(f"{'before (sync, eager f-strings)':<32} {before * 1e6:8.2f} us/turn on the loop thread")
+
+        for rate_limit in (0, args.rate_limit_per_minute):
+            after_stream = SlowStream(os.path.join(tmp, f"after-{rate_limit:g}.log"), delay)
+            setup = configure_logging("INFO", True, rate_limit, 1.0, max_queue=args.turns * 10, stream=after_stream)
+            after = measure(turn_after, logger, args.turns)
+            drain_started = time.perf_counter()
+            setup.close()
+            drain = time.perf_counter() - drain_started
+            label = f"after (rate limit {rate_limit:g}/min)" if rate_limit else "after (no rate limit)"
+            print(
+                f"{label:<32} {after * 1e6:8.2f} us/turn on the loop thread "
+                f"({before / after:5.1f}x faster; listener drained in {drain:.2f}s, {setup.stats()})"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,291 @@
+"""
+Memory scaling benchmark
+
+Measures how the bot's memory grows with the number of users, so instance sizes and the
+eviction caps (MESSAGE_INDEX_MAX_CONVERSATIONS, RESULT_STORE_MAX_MB,
+COMBINED_ANSWER_CACHE_SIZE, QUESTION_INDEX_MAX_ENTRIES) can be set from data.
+
+Users are added in steps up to each checkpoint (1k to 200k by default). Every new user
+goes through the same in-memory paths as in production:
+
+- sessions: get_or_create_user_session for a Teams message (the Teams member lookup is
+  answered in process), then one answered turn - conversation ID, recent turns and the
+  Genie message index entry.
+- feedback: one thumbs-up click through _record_feedback, journaled to a temporary
+  feedback journal; memory is measured after the journal has committed it.
+- results: a large tabular answer (--result-rows x --result-columns) stored as a typed
+  frame in the result store, rendered into the combined-answer cache and indexed for
+  question reuse. Each answer is decoded from JSON text, as the bot receives it from
+  ask_genie, so every user's result is made of its own objects; the texts come from a
+  small pool generated before measuring starts. Converting a large result costs
+  milliseconds, so only the first --max-results users get one; that is enough to fill
+  the default result store budget and show where it stops growing.
+
+Memory is measured with tracemalloc (Python allocations still reachable after a GC) as
+the growth attributable to each phase, reported as a total per checkpoint and as bytes
+per session, feedback entry and cached result, alongside the process's resident set
+size. Once the result store is full, adding a result evicts older ones, so bytes per
+result is only reported for checkpoints where every added result was still held.
+
+    python benchmarks/memory_scaling.py
+    python benchmarks/memory_scaling.py --users 1000,10000 --max-results 500 --json memory.json
+"""
+
+import argparse
+import asyncio
+import gc
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Dict, List, Optional
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.dirname(BENCHMARKS_DIR)
+sys.path.insert(0, BENCHMARKS_DIR)
+sys.path.insert(0, REPO_ROOT)
+
+JOURNAL_DIR = tempfile.mkdtemp(prefix="memory-scaling-")
+
+# Importing the app builds its clients and background features from the environment; keep
+# it off any real workspace and local state, with the in-memory caches at their defaults
+os.environ.update({
+    "DATABRICKS_HOST": "http://127.0.0.1:9",
+    "DATABRICKS_TOKEN": "dapi-benchmark",
+    "DATABRICKS_SPACE_ID": "benchmark",
+    # Bounds the SDK's host metadata probe, which retries until this timeout
+    "DATABRICKS_SDK_RETRY_TIMEOUT_SECONDS": "1",
+    "APP_ID": "",
+    "ENABLE_FEEDBACK_JOURNAL": "True",
+    "FEEDBACK_JOURNAL_PATH": os.path.join(JOURNAL_DIR, "feedback_journal.db"),
+    "ENABLE_SUBSCRIPTIONS": "False",
+    "ENABLE_SAMPLE_ANSWERS": "False",
+    "ENABLE_LOOP_MONITOR": "False",
+    "ENABLE_QUESTION_REUSE": "True",
+    "LOG_LEVEL": "ERROR",
+    "LOG_ASYNC": "False",
+})
+
+import app  # noqa: E402
+from botbuilder.core import TurnContext  # noqa: E402
+from botbuilder.schema import Activity, ActivityTypes, ChannelAccount, ConversationAccount  # noqa: E402
+from botbuilder.schema.teams import TeamsChannelAccount  # noqa: E402
+from render_bench import make_answer  # noqa: E402
+from result_store import result_to_frame  # noqa: E402
+
+PHASES = ("sessions", "feedback", "results")
+ANSWER_POOL_SIZE = 8
+
+
+async def teams_member(turn_context: TurnContext, member_id: str) -> TeamsChannelAccount:
+    """In-process answer to the Bot Connector member lookup done for new users"""
+    name = member_id.split(":")[-1]
+    return TeamsChannelAccount(id=member_id, name=f"Scaling {name}", email=f"{name}@example.com", user_principal_name=f"{name}@example.com")
+
+
+def resident_bytes() -> Optional[int]:
+    """Resident set size of this process, where /proc is available"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def traced_bytes() -> int:
+    gc.collect()
+    return tracemalloc.get_traced_memory()[0]
+
+
+def user_id(index: int) -> str:
+    return f"29:scaling-user-{index}"
+
+
+class Simulation:
+    """Drives users through the bot's per-user paths and attributes memory growth to each"""
+
+    def __init__(self, result_rows: int, result_columns: int, max_results: int):
+        self.result_rows = result_rows
+        self.result_columns = result_columns
+        self.max_results = max_results
+        self.users = 0
+        self.results = 0
+        self.growth = {phase: 0 for phase in PHASES}
+        self.answer_texts = [
+            json.dumps(make_answer(result_rows, result_columns, "string" if seed % 2 else "numeric", 0.1, seed=seed))
+            for seed in range(ANSWER_POOL_SIZE)
+        ]
+
+    async def add_sessions(self, start: int, end: int):
+        for index in range(start, end):
+            activity = Activity(
+                type=ActivityTypes.message,
+                id=f"activity-{index}",
+                from_property=ChannelAccount(id=user_id(index), name=f"scaling-user-{index}"),
+                recipient=ChannelAccount(id="28:scaling-bot", name="Genie"),
+                conversation=ConversationAccount(id=f"a:{user_id(index)}", conversation_type="personal"),
+                channel_id="msteams",
+                service_url="http://127.0.0.1:9",
+                text=f"What was revenue for account {index} last week?",
+            )
+            session = await app.BOT.get_or_create_user_session(TurnContext(app.ADAPTER, activity))
+            # One answered turn in a new Genie conversation, as _answer_question leaves it
+            session.conversation_id = f"conversation-{index:012d}"
+            session.genie_target = app.DEFAULT_TARGET
+            session.record_turn(activity.text, f"Revenue for account {index} was 1,234.56", 3.2)
+            app.message_index.append(session.conversation_id, f"message-{index:012d}")
+
+    def click_feedback(self, start: int, end: int):
+        for index in range(start, end):
+            app.BOT._record_feedback({
+                "action": "feedback",
+                "feedback": "positive",
+                "messageId": f"message-{index:012d}",
+                "userId": user_id(index),
+                "conversationId": f"conversation-{index:012d}",
+                "target": app.DEFAULT_TARGET,
+                "delivery": "combined",
+            })
+        app.feedback_journal.flush(timeout=60)
+
+    def cache_results(self, start: int, end: int) -> int:
+        added = 0
+        for index in range(start, min(end, start + self.max_results - self.results)):
+            question = f"Revenue by region and account for account group {index}"
+            answer_text = self.answer_texts[index % ANSWER_POOL_SIZE]
+            answer = json.loads(answer_text)
+            # What _answer_question keeps: the typed frame, the rendered answer, the reusable answer JSON
+            stored = result_to_frame(answer, question)
+            if stored is not None:
+                app.result_store.put(user_id(index), stored)
+            text, card = app.render_answer(f"**{question}**", answer)
+            app.BOT.combined_answers[f"answer-activity-{index}"] = (text, card)
+            while len(app.BOT.combined_answers) > app.CONFIG.COMBINED_ANSWER_CACHE_SIZE:
+                app.BOT.combined_answers.popitem(last=False)
+            if app.question_index is not None:
+                app.question_index.add(question, answer_text)
+            added += 1
+        self.results += added
+        return added
+
+    async def grow_to(self, users: int) -> Dict:
+        start = self.users
+        added = users - start
+        before = traced_bytes()
+        started = time.perf_counter()
+        await self.add_sessions(start, users)
+        after_sessions = traced_bytes()
+        self.click_feedback(start, users)
+        after_feedback = traced_bytes()
+        results_added = self.cache_results(start, users)
+        after_results = traced_bytes()
+        self.users = users
+
+        self.growth["sessions"] += after_sessions - before
+        self.growth["feedback"] += after_feedback - after_sessions
+        self.growth["results"] += after_results - after_feedback
+        return {
+            "users": users,
+            "seconds": round(time.perf_counter() - started, 1),
+            "step": {
+                "users_added": added,
+                "results_added": results_added,
+                "bytes_per_session": round((after_sessions - before) / added) if added else None,
+                "bytes_per_feedback": round((after_feedback - after_sessions) / added) if added else None,
+                "bytes_per_result": round((after_results - after_feedback) / results_added) if results_added else None,
+            },
+            "total_bytes": dict(self.growth),
+            "traced_bytes": after_results,
+            "resident_bytes": resident_bytes(),
+            "containers": {
+                "user_sessions": len(app.BOT.user_sessions),
+                "email_sessions": len(app.BOT.email_sessions),
+                "message_index": len(app.message_index),
+                "result_store": len(app.result_store),
+                "result_store_bytes": app.result_store.nbytes,
+                "combined_answers": len(app.BOT.combined_answers),
+                "question_index": len(app.question_index) if app.question_index is not None else None,
+            },
+        }
+
+
+def mb(value: Optional[int]) -> str:
+    return f"{value / 1024 / 1024:,.1f}" if value is not None else "-"
+
+
+def per_unit(value: Optional[int]) -> str:
+    return f"{value:,}" if value is not None else "-"
+
+
+def print_report(report: Dict):
+    print(
+        f"\n{'users':>8} {'sessions MB':>12} {'B/session':>10} {'feedback MB':>12} {'B/feedback':>11} "
+        f"{'results':>8} {'results MB':>11} {'B/result':>10} {'traced MB':>10} {'RSS MB':>8}"
+    )
+    for row in report["checkpoints"]:
+        step, total = row["step"], row["total_bytes"]
+        print(
+            f"{row['users']:>8,} {mb(total['sessions']):>12} {per_unit(step['bytes_per_session']):>10} "
+            f"{mb(total['feedback']):>12} {per_unit(step['bytes_per_feedback']):>11} "
+            f"{row['containers']['result_store']:>8,} {mb(total['results']):>11} {per_unit(step['bytes_per_result']):>10} "
+            f"{mb(row['traced_bytes']):>10} {mb(row['resident_bytes']):>8}"
+        )
+    last = report["checkpoints"][-1]
+    print(f"\nContainers at {last['users']:,} users: {json.dumps(last['containers'])}")
+    print(
+        f"Caps: MESSAGE_INDEX_MAX_CONVERSATIONS={app.CONFIG.MESSAGE_INDEX_MAX_CONVERSATIONS}, "
+        f"RESULT_STORE_MAX_MB={app.CONFIG.RESULT_STORE_MAX_MB:g}, "
+        f"COMBINED_ANSWER_CACHE_SIZE={app.CONFIG.COMBINED_ANSWER_CACHE_SIZE}, "
+        f"QUESTION_INDEX_MAX_ENTRIES={app.CONFIG.QUESTION_INDEX_MAX_ENTRIES}"
+    )
+
+
+async def main_async(args) -> Dict:
+    app.TeamsInfo.get_member = teams_member
+    app.feedback_journal.start()
+    simulation = Simulation(args.result_rows, args.result_columns, args.max_results)
+    checkpoints: List[Dict] = []
+    tracemalloc.start()
+    try:
+        baseline = traced_bytes()
+        for users in sorted(int(users) for users in args.users.split(",")):
+            row = await simulation.grow_to(users)
+            checkpoints.append(row)
+            print(
+                f"{users:>8,} users: {per_unit(row['step']['bytes_per_session'])} B/session, "
+                f"{per_unit(row['step']['bytes_per_feedback'])} B/feedback, {per_unit(row['step']['bytes_per_result'])} B/result "
+                f"({row['seconds']}s)"
+            )
+    finally:
+        tracemalloc.stop()
+        app.feedback_journal.close()
+        shutil.rmtree(JOURNAL_DIR, ignore_errors=True)
+    return {
+        "settings": vars(args),
+        "python": sys.version.split()[0],
+        "baseline_traced_bytes": baseline,
+        "checkpoints": checkpoints,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", default="1000,10000,50000,100000,200000", help="comma-separated user count checkpoints")
+    parser.add_argument("--result-rows", type=int, default=1000, help="rows per cached result")
+    parser.add_argument("--result-columns", type=int, default=8, help="columns per cached result")
+    parser.add_argument("--max-results", type=int, default=1000, help="users that get a cached result")
+    parser.add_argument("--json", metavar="PATH", help="also write the report as JSON")
+    args = parser.parse_args()
+
+    report = asyncio.run(main_async(args))
+    print_report(report)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,311 @@
+"""
+Rendering microbenchmarks
+
+Times the pure-CPU work done for every answer - the JSON encode and decode around
+ask_genie (decoding with the app's json_loads, which is orjson when installed), the
+markdown table (process_query_results), the Adaptive Card table (build_result_table_card)
+and the feedback card - over synthetic Statement Execution results from 10 to 100k rows,
+with narrow and wide schemas, numeric-heavy and string-heavy columns, and several NULL
+densities.
+
+Each case reports ns per row (ns per call for the feedback card), the best of several
+runs with garbage collection paused as timeit does, and the peak memory allocated
+during one run, measured separately with tracemalloc.
+
+Absolute timings depend on the machine and on how busy it is, so a fixed calibration
+workload (string formatting, joins and dict building, like rendering) is timed right
+before and after every case, and the case is scored as its time relative to the
+calibration; the score kept is the median of --repeats such measurements. Scores are
+what is compared with the stored baseline. Cases that look slower than the tolerance
+allows are re-measured (--confirm times) and keep their best score, and the script
+exits with status 1 if any case's score or peak memory still exceeds the tolerance.
+ns/row is reported for reading only. The baseline records the JSON decoder it was
+measured with; json_decode cases are not compared when the decoder in use differs
+(e.g. orjson is not installed).
+
+    python benchmarks/render_bench.py                   # compare with benchmarks/baselines/render_bench.json
+    python benchmarks/render_bench.py --save-baseline   # record a new baseline
+    python benchmarks/render_bench.py --rows 10,1000 --ops markdown,table_card
+"""
+
+import argparse
+import gc
+import json
+import os
+import random
+import sys
+import time
+import tracemalloc
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+# Importing the app builds its clients and background features from the environment; keep
+# it off any real workspace and away from local state
+os.environ.update({
+    "DATABRICKS_HOST": "http://127.0.0.1:9",
+    "DATABRICKS_TOKEN": "dapi-benchmark",
+    "DATABRICKS_SPACE_ID": "benchmark",
+    # Bounds the SDK's host metadata probe, which retries until this timeout
+    "DATABRICKS_SDK_RETRY_TIMEOUT_SECONDS": "1",
+    "APP_ID": "",
+    "ENABLE_FEEDBACK_JOURNAL": "False",
+    "ENABLE_SUBSCRIPTIONS": "False",
+    "ENABLE_SAMPLE_ANSWERS": "False",
+    "ENABLE_LOOP_MONITOR": "False",
+    "LOG_LEVEL": "ERROR",
+    "LOG_ASYNC": "False",
+})
+
+import app  # noqa: E402
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines", "render_bench.json")
+WIDTHS = {"narrow": 4, "wide": 32}
+# Column types repeat in this order across the schema
+COLUMN_TYPES = {"numeric": ("DOUBLE", "LONG", "DECIMAL", "STRING"), "string": ("STRING", "STRING", "DATE", "DOUBLE")}
+
+
+def make_answer(rows: int, width: int, kind: str, null_density: float, seed: int = 7) -> Dict:
+    """An answer dict shaped like ask_genie's, before JSON encoding.
+
+    kind "numeric" makes three in four columns numeric, "string" three in four strings.
+    Values are strings, as Statement Execution returns them in JSON_ARRAY format.
+    """
+    rng = random.Random(seed)
+    type_cycle = COLUMN_TYPES[kind]
+    columns = [
+        {"name": f"column_{index}", "type_name": type_cycle[index % 4], "type_text": type_cycle[index % 4], "position": index}
+        for index in range(width)
+    ]
+
+    def value(type_name: str):
+        if rng.random() < null_density:
+            return None
+        if type_name in ("DOUBLE", "DECIMAL"):
+            return f"{rng.uniform(-1e6, 1e7):.4f}"
+        if type_name == "LONG":
+            return str(rng.randint(-10_000, 50_000_000))
+        if type_name == "DATE":
+            return f"2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}"
+        return rng.choice(("North America", "EMEA", "APAC", "LATAM")) + f" / account {rng.randint(1, 99999)}"
+
+    data = [[value(column["type_name"]) for column in columns] for _ in range(rows)]
+    return {
+        "columns": {"column_count": width, "columns": columns},
+        "data": {"data_array": data, "row_count": rows},
+        "query_description": "Revenue by region and account for the last week",
+        "suggested_questions": ["What about last month?", "Break it down by product"],
+    }
+
+
+def operations(answer: Dict, encoded: str) -> Dict[str, Callable[[], object]]:
+    return {
+        "json_encode": lambda: json.dumps(answer),
+        "json_decode": lambda: app.json_loads(encoded),
+        "markdown": lambda: app.process_query_results(answer),
+        "table_card": lambda: app.build_result_table_card(answer, app.CONFIG.RESULT_CARD_MAX_BYTES),
+    }
+
+
+def feedback_card() -> str:
+    return json.dumps(app.BOT.create_feedback_card("01f0a1b2c3d4e5f6", "29:1a2b3c4d5e6f", "01f0f6e5d4c3b2a1", "combined"))
+
+
+def measure(func: Callable[[], object], min_time: float, max_runs: int, trace: bool = True) -> Tuple[float, int]:
+    """Best wall time of repeated runs, and peak bytes allocated by one run (0 unless trace)"""
+    best = float("inf")
+    spent = 0.0
+    runs = 0
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        while runs < max_runs and (runs < 3 or spent < min_time):
+            started = time.perf_counter()
+            func()
+            elapsed = time.perf_counter() - started
+            best = min(best, elapsed)
+            spent += elapsed
+            runs += 1
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+    if not trace:
+        return best, 0
+    tracemalloc.start()
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return best, peak
+
+
+def calibration_workload():
+    """Fixed interpreter-bound work, shaped like rendering, that timings are scored against"""
+    values = [f"{index * 1.5:,.2f}" for index in range(2000)]
+    rows = ["| " + " | ".join(values[start:start + 8]) + " |" for start in range(0, 2000, 8)]
+    return [{"type": "TextBlock", "text": row, "wrap": True} for row in rows]
+
+
+def calibrate() -> float:
+    """Seconds per calibration run on this machine, right now"""
+    seconds, _ = measure(calibration_workload, 0.05, 500, trace=False)
+    return seconds
+
+
+def measure_case(func: Callable[[], object], min_time: float, max_runs: int, per: int, repeats: int) -> Dict:
+    """Median time and calibrated score of a case over repeats, each timed between two calibrations.
+
+    The machine's speed can change during a run, so every repeat is calibrated on its own.
+    """
+    timings = []
+    peak = 0
+    for repeat in range(max(1, repeats)):
+        before = calibrate()
+        seconds, repeat_peak = measure(func, min_time, max_runs, trace=repeat == 0)
+        peak = peak or repeat_peak
+        timings.append((seconds / ((before + calibrate()) / 2), seconds))
+    score, seconds = sorted(timings)[len(timings) // 2]
+    return {"ns_per_row": round(seconds / per * 1e9, 1), "score": round(score / per, 8), "peak_bytes": peak}
+
+
+def run_suite(
+    rows_list: List[int], ops: List[str], nulls: List[float], min_time: float, repeats: int, only: Optional[Set[str]] = None
+) -> Dict[str, Dict]:
+    """Measure every case in the matrix, or just the cases named in only"""
+    results: Dict[str, Dict] = {}
+    if "feedback_card" in ops and (only is None or "feedback_card" in only):
+        # Constant work per answer; repeated so one measurement is long enough to time
+        calls = 1000
+        results["feedback_card"] = measure_case(lambda: [feedback_card() for _ in range(calls)], min_time, 50, calls, repeats)
+        results["feedback_card"]["peak_bytes"] //= calls
+        print(f"{'feedback_card':<44} {results['feedback_card']['ns_per_row']:>12,.1f} ns/call")
+    for rows in rows_list:
+        for width_name, width in WIDTHS.items():
+            for kind in ("numeric", "string"):
+                for null_density in nulls:
+                    suffix = f"/{rows}x{width_name}/{kind}/nulls={null_density:g}"
+                    if only is not None and not any(f"{op}{suffix}" in only for op in ops):
+                        continue
+                    answer = make_answer(rows, width, kind, null_density)
+                    encoded = json.dumps(answer)
+                    for op, func in operations(answer, encoded).items():
+                        case = f"{op}{suffix}"
+                        if op not in ops or (only is not None and case not in only):
+                            continue
+                        # Large results are slow enough that a couple of runs are representative
+                        results[case] = measure_case(func, min_time, 50 if rows <= 10_000 else 3, rows, repeats)
+                        print(
+                            f"{case:<44} {results[case]['ns_per_row']:>12,.1f} ns/row "
+                            f"{results[case]['peak_bytes'] / 1024:>12,.1f} KiB peak"
+                        )
+    return results
+
+
+def compare(
+    results: Dict[str, Dict], baseline: Dict[str, Dict], time_tolerance: float, memory_tolerance: float
+) -> List[Tuple[str, str]]:
+    """(case, description) of cases that regressed beyond the tolerances (fractions) relative to the baseline.
+
+    Time is compared by calibrated score, so a faster or slower machine does not count.
+    """
+    regressions = []
+    for case, current in results.items():
+        before = baseline.get(case)
+        if before is None or "score" not in before:
+            continue
+        if current["score"] > before["score"] * (1 + time_tolerance):
+            regressions.append((case,
+                f"{case}: score {current['score']:.3g} vs baseline {before['score']:.3g} "
+                f"(+{current['score'] / before['score'] - 1:.0%}; {current['ns_per_row']:,.1f} ns here)"
+            ))
+        if current["peak_bytes"] > before["peak_bytes"] * (1 + memory_tolerance) + 1024:
+            regressions.append((case,
+                f"{case}: peak {current['peak_bytes']:,} bytes vs baseline {before['peak_bytes']:,} "
+                f"(+{current['peak_bytes'] / max(before['peak_bytes'], 1) - 1:.0%})"
+            ))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", default="10,100,1000,10000,100000", help="comma-separated row counts")
+    parser.add_argument("--ops", default="json_encode,json_decode,markdown,table_card,feedback_card")
+    parser.add_argument("--nulls", default="0,0.1,0.5", help="comma-separated NULL densities")
+    parser.add_argument("--min-time", type=float, default=0.2, help="seconds to spend timing each case per repeat")
+    parser.add_argument("--repeats", type=int, default=3, help="calibrated measurements per case; the median is kept")
+    parser.add_argument("--confirm", type=int, default=2, help="times a case that looks slower is re-measured before it counts")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true", help="write the results as the new baseline")
+    # Calibrated scores still vary by up to ~40% on a shared single-core VM; a 2x slowdown stands out
+    parser.add_argument("--time-tolerance", type=float, default=0.5, help="allowed score growth as a fraction")
+    parser.add_argument("--memory-tolerance", type=float, default=0.10, help="allowed peak memory growth as a fraction")
+    args = parser.parse_args()
+
+    print(f"JSON decoder: {app.json_loads.__module__}\n")
+    rows_list = [int(rows) for rows in args.rows.split(",")]
+    ops = args.ops.split(",")
+    nulls = [float(density) for density in args.nulls.split(",")]
+    results = run_suite(rows_list, ops, nulls, args.min_time, args.repeats)
+
+    decoder = app.json_loads.__module__
+    if args.save_baseline:
+        baseline = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline, encoding="utf-8") as f:
+                stored = json.load(f)
+            baseline = stored["results"]
+            if stored.get("decoder", decoder) != decoder:
+                # Decode timings from another decoder would be compared with this one's
+                baseline = {case: entry for case, entry in baseline.items() if not case.startswith("json_decode/")}
+        baseline.update(results)
+        os.makedirs(os.path.dirname(os.path.abspath(args.baseline)), exist_ok=True)
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(
+                {"python": sys.version.split()[0], "decoder": decoder, "results": baseline},
+                f,
+                indent=1,
+                sort_keys=True,
+            )
+            f.write("\n")
+        print(f"\nSaved {len(results)} results to {args.baseline}")
+        return
+
+    if not os.path.exists(args.baseline):
+        print(f"\nNo baseline at {args.baseline}; run with --save-baseline to record one")
+        return
+    with open(args.baseline, encoding="utf-8") as f:
+        stored = json.load(f)
+    baseline = stored["results"]
+    if stored.get("decoder", decoder) != decoder:
+        print(
+            f"\n{args.baseline} was recorded with the {stored['decoder']} decoder but {decoder} is in use; "
+            "skipping json_decode cases (run with --save-baseline to record them)"
+        )
+        baseline = {case: entry for case, entry in baseline.items() if not case.startswith("json_decode/")}
+    if not any("score" in entry for entry in baseline.values()):
+        print(f"\n{args.baseline} has no calibrated scores; run with --save-baseline to record one")
+        return
+    regressions = compare(results, baseline, args.time_tolerance, args.memory_tolerance)
+    for attempt in range(args.confirm):
+        if not regressions:
+            break
+        # A noisy neighbour can slow any single measurement; a real regression stays slow when re-measured
+        suspects = {case for case, _ in regressions}
+        print(f"\nRe-measuring {len(suspects)} cases that look slower ({attempt + 1}/{args.confirm})")
+        retried = run_suite(rows_list, ops, nulls, args.min_time, args.repeats, only=suspects)
+        for case, result in retried.items():
+            if result["score"] < results[case]["score"]:
+                results[case] = result
+        regressions = compare(results, baseline, args.time_tolerance, args.memory_tolerance)
+    if regressions:
+        print(f"\n{len(regressions)} regressions against {args.baseline}:")
+        for _, regression in regressions:
+            print(f"  {regression}")
+        sys.exit(1)
+    print(f"\nNo regressions against {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
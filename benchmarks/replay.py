@@ -0,0 +1,353 @@
+"""
+Replay recorded traffic
+
+Plays a traffic cassette (recorded with ENABLE_TRAFFIC_RECORDING, see traffic_recorder.py)
+back through the bot, so real question mixes and result shapes can be profiled offline and
+repeatably. The bot runs as a subprocess pointed at the load test stand-ins
+(benchmarks/stand_ins.py), whose Genie and Statement Execution endpoints answer from the
+cassette instead of synthesizing responses:
+
+- start_conversation and create_message are matched on the question text alone (the
+  user context prefix is ignored), so a follow-up that starts a new conversation in the
+  replay, or the reverse, is still answered; repeated questions get the recorded
+  responses in order.
+- get_message returns the response recorded at the same time after the question was
+  submitted, scaled by --speed, so Genie appears exactly as slow (or as many times faster)
+  as it was when recorded, however often the bot polls.
+- Messages, attachment query results and statements are matched on the recorded IDs the
+  bot got back (not the conversation ID, which may differ as above); every response is
+  delayed by the recorded call latency divided by --speed, and recorded failures are
+  answered with the matching HTTP error.
+
+Requests the cassette has no answer for get a 404 and are counted as misses. Activities
+are posted to /api/messages at their recorded times divided by --speed, with idle gaps
+longer than --max-gap shortened; the Bot Connector calls they cause go to the stand-ins.
+--profile samples the bot with /debug/profile during the replay and writes collapsed
+stacks for flamegraph.pl or speedscope.
+
+    python benchmarks/replay.py traffic.jsonl.gz
+    python benchmarks/replay.py traffic.jsonl.gz --speed 10 --profile replay.folded --json replay.json
+"""
+
+import argparse
+import asyncio
+import copy
+import json
+import os
+import re
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+import aiohttp
+from aiohttp import web
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.dirname(BENCHMARKS_DIR)
+sys.path.insert(0, BENCHMARKS_DIR)
+sys.path.insert(0, REPO_ROOT)
+
+from load_test import bot_environment, free_port, percentile, scrape, stage_report, wait_for_bot  # noqa: E402
+from stand_ins import StandIns, StandInSettings  # noqa: E402
+from traffic_recorder import read_cassette  # noqa: E402
+
+# ask_genie prefixes questions with "[<email>] "
+QUESTION_CONTEXT = re.compile(r"^\[[^\]]*\]\s*")
+# Arguments (by position) that identify a recorded call; space and conversation IDs are
+# left out so a cassette replays against any space, whichever conversation a question lands in
+CALL_KEY_ARGS = {
+    "start_conversation": (1,),
+    "create_message": (2,),
+    "get_message": (2,),
+    "get_message_attachment_query_result": (2, 3),
+    "get_statement": (0,),
+}
+# Both ways of submitting a question share recorded responses
+SUBMIT_CALLS = ("start_conversation", "create_message")
+ERROR_STATUS = {"throttled": 429, "transient": 503, "auth": 403, "acl": 403, "other": 400}
+ERROR_CODES = {429: "REQUEST_LIMIT_EXCEEDED", 503: "TEMPORARILY_UNAVAILABLE", 403: "PERMISSION_DENIED", 400: "BAD_REQUEST"}
+
+
+def call_key(call: str, args: List) -> Tuple:
+    values = [args[index] if index < len(args) else None for index in CALL_KEY_ARGS.get(call, range(len(args)))]
+    return ("submit" if call in SUBMIT_CALLS else call,) + tuple(QUESTION_CONTEXT.sub("", value) if isinstance(value, str) else value for value in values)
+
+
+class Cassette:
+    """Activities and call responses of a cassette, indexed for replay"""
+
+    def __init__(self, path: str, limit: Optional[int] = None):
+        self.activities: List[Tuple[float, Dict]] = []
+        self.calls: Dict[Tuple, List[Dict]] = {}
+        for entry in read_cassette(path):
+            if entry["kind"] == "activity":
+                if limit is None or len(self.activities) < limit:
+                    self.activities.append((entry["ts"], entry["activity"]))
+            elif entry["kind"] == "call":
+                self.calls.setdefault(call_key(entry["call"], entry["args"]), []).append(entry)
+        for entries in self.calls.values():
+            entries.sort(key=lambda entry: entry["ts"])
+
+    def schedule(self, speed: float, max_gap: float) -> List[Tuple[float, Dict]]:
+        """(seconds from start, activity) in replay time"""
+        scheduled = []
+        offset = 0.0
+        previous = self.activities[0][0] if self.activities else 0.0
+        for ts, activity in self.activities:
+            offset += min(max(ts - previous, 0.0), max_gap) / speed
+            previous = ts
+            scheduled.append((offset, activity))
+        return scheduled
+
+
+class ReplayStandIns(StandIns):
+    """Stand-ins whose Databricks endpoints answer from a cassette"""
+
+    def __init__(self, settings: StandInSettings, cassette: Cassette, speed: float):
+        super().__init__(settings)
+        self.cassette = cassette
+        self.speed = speed
+        self._served: Dict[Tuple, int] = {}
+        # message ID -> (recorded submit time, replayed submit time)
+        self._submitted: Dict[str, Tuple[float, float]] = {}
+        self.misses: Dict[str, int] = {}
+
+    async def _answer(self, call: str, *args) -> web.Response:
+        key = call_key(call, list(args))
+        entries = self.cassette.calls.get(key)
+        if not entries:
+            self.misses[call] = self.misses.get(call, 0) + 1
+            return web.json_response({"error_code": "NOT_FOUND", "message": f"No recorded response for {call}"}, status=404)
+        submitted = self._submitted.get(args[2]) if call == "get_message" else None
+        if submitted is not None:
+            # The message as it was at the same (scaled) time after it was submitted
+            recorded_ts, replayed_at = submitted
+            now_recorded = recorded_ts + (time.monotonic() - replayed_at) * self.speed
+            entry = entries[0]
+            for candidate in entries:
+                if candidate["ts"] > now_recorded:
+                    break
+                entry = candidate
+        else:
+            served = self._served.get(key, 0)
+            self._served[key] = served + 1
+            entry = entries[min(served, len(entries) - 1)]
+        await asyncio.sleep(entry["seconds"] / self.speed)
+        if "error_class" in entry:
+            status = ERROR_STATUS.get(entry["error_class"], 400)
+            return web.json_response({"error_code": ERROR_CODES[status], "message": entry["error"]}, status=status)
+        response = entry["response"] or {}
+        if call in SUBMIT_CALLS:
+            self._submitted[response.get("message_id") or response.get("id")] = (entry["ts"], time.monotonic())
+        return web.json_response(response)
+
+    async def start_conversation(self, request: web.Request) -> web.Response:
+        content = (await request.json()).get("content", "")
+        return await self._answer("start_conversation", request.match_info["space_id"], content)
+
+    async def create_message(self, request: web.Request) -> web.Response:
+        content = (await request.json()).get("content", "")
+        info = request.match_info
+        return await self._answer("create_message", info["space_id"], info["conversation_id"], content)
+
+    async def get_message(self, request: web.Request) -> web.Response:
+        info = request.match_info
+        return await self._answer("get_message", info["space_id"], info["conversation_id"], info["message_id"])
+
+    async def query_result(self, request: web.Request) -> web.Response:
+        info = request.match_info
+        return await self._answer(
+            "get_message_attachment_query_result",
+            info["space_id"], info["conversation_id"], info["message_id"], info["attachment_id"],
+        )
+
+    async def get_statement(self, request: web.Request) -> web.Response:
+        return await self._answer("get_statement", request.match_info["statement_id"])
+
+
+class Replayer:
+    """Posts a cassette's activities to the bot on their replay schedule and records their latency"""
+
+    def __init__(self, bot_url: str, service_url: str, schedule: List[Tuple[float, Dict]]):
+        self.bot_url = bot_url
+        self.service_url = service_url
+        self.schedule = schedule
+        self.latencies: Dict[str, List[float]] = {}
+        self.statuses: Dict[int, int] = {}
+        self.failures = 0
+        self.late_starts = 0
+
+    def activity(self, recorded: Dict) -> Dict:
+        activity = copy.deepcopy(recorded)
+        activity["serviceUrl"] = self.service_url
+        activity["timestamp"] = datetime.now(timezone.utc).isoformat()
+        return activity
+
+    async def _post(self, session: aiohttp.ClientSession, recorded: Dict):
+        started = time.perf_counter()
+        try:
+            async with session.post(self.bot_url, json=self.activity(recorded)) as response:
+                await response.read()
+                self.statuses[response.status] = self.statuses.get(response.status, 0) + 1
+                if response.status < 300:
+                    self.latencies.setdefault(recorded.get("type", "unknown"), []).append(time.perf_counter() - started)
+                else:
+                    self.failures += 1
+        except Exception:
+            self.failures += 1
+
+    async def run(self) -> float:
+        timeout = aiohttp.ClientTimeout(total=None)
+        connector = aiohttp.TCPConnector(limit=0)
+        tasks = []
+        async with aiohttp.ClientSession(timeout=timeout, connector=connector) as session:
+            loop = asyncio.get_running_loop()
+            started = loop.time()
+            for offset, recorded in self.schedule:
+                delay = started + offset - loop.time()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                elif delay < -0.05:
+                    self.late_starts += 1
+                tasks.append(asyncio.create_task(self._post(session, recorded)))
+            await asyncio.gather(*tasks)
+            return loop.time() - started
+
+
+async def fetch_profile(bot_url: str, token: str, seconds: float, path: str):
+    async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=None)) as session:
+        async with session.get(
+            f"{bot_url}/debug/profile",
+            params={"seconds": str(seconds)},
+            headers={"Authorization": f"Bearer {token}"},
+        ) as response:
+            response.raise_for_status()
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(await response.text())
+
+
+def print_report(report: Dict):
+    run = report["run"]
+    print(
+        f"\nReplayed {run['activities']} activities at {run['speed']}x in {run['seconds']:.1f}s: "
+        f"{run['failed']} failed (statuses {run['statuses']}, {run['late_starts']} late starts)"
+    )
+    print(f"Responses missing from the cassette: {report['misses'] or 'none'}\n")
+    print(f"{'Activity type':<44} {'count':>7} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for name, row in report["end_to_end_ms"].items():
+        print(f"{name:<44} {row['count']:>7} {row['p50']!s:>9} {row['p95']!s:>9} {row['p99']!s:>9}")
+    print()
+    for title, rows in (("Stage", report["stages"]), ("Databricks call", report["databricks_calls"])):
+        print(f"{title:<44} {'count':>7} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+        for name, row in rows.items():
+            print(f"{name:<44} {row['count']:>7} {row['p50_ms']!s:>9} {row['p95_ms']!s:>9} {row['p99_ms']!s:>9}")
+        print()
+    if report["profile"]:
+        print(f"Collapsed stacks written to {report['profile']}")
+
+
+async def main_async(args) -> Dict:
+    cassette = Cassette(args.cassette, args.limit)
+    if not cassette.activities:
+        raise SystemExit(f"No activities in {args.cassette}")
+    schedule = cassette.schedule(args.speed, args.max_gap)
+
+    stand_ins = ReplayStandIns(StandInSettings(connector_latency=args.connector_latency, seed=args.seed), cassette, args.speed)
+    runner = web.AppRunner(stand_ins.app(), access_log=None)
+    await runner.setup()
+    stand_in_port = free_port()
+    await web.TCPSite(runner, "127.0.0.1", stand_in_port).start()
+    stand_in_url = f"http://127.0.0.1:{stand_in_port}"
+
+    bot_port = free_port()
+    bot_url = f"http://127.0.0.1:{bot_port}"
+    env = bot_environment(args, stand_in_url, bot_port)
+    profile_token = "replay-profile"
+    if args.profile:
+        env.update({"DEBUG_PROFILE_TOKEN": profile_token, "DEBUG_PROFILE_MAX_SECONDS": "86400"})
+    process = subprocess.Popen(
+        [sys.executable, "-m", "aiohttp.web", "-H", "127.0.0.1", "-P", str(bot_port), "app:init_func"],
+        cwd=REPO_ROOT,
+        env=env,
+    )
+    try:
+        await wait_for_bot(f"{bot_url}/health", process)
+        replayer = Replayer(f"{bot_url}/api/messages", stand_in_url, schedule)
+        async with aiohttp.ClientSession() as session:
+            before = await scrape(session, f"{bot_url}/metrics")
+            print(
+                f"Replaying {len(schedule)} activities over {schedule[-1][0]:.1f}s against {bot_url} "
+                f"(stand-ins at {stand_in_url})..."
+            )
+            profile = None
+            if args.profile:
+                profile_seconds = args.profile_seconds or max(1.0, schedule[-1][0])
+                profile = asyncio.create_task(fetch_profile(bot_url, profile_token, profile_seconds, args.profile))
+            seconds = await replayer.run()
+            if profile is not None:
+                await profile
+            after = await scrape(session, f"{bot_url}/metrics")
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=15)
+        except subprocess.TimeoutExpired:
+            process.kill()
+        await runner.cleanup()
+
+    def ms(value: Optional[float]) -> Optional[float]:
+        return round(value * 1000, 1) if value is not None else None
+
+    return {
+        "settings": vars(args),
+        "run": {
+            "activities": len(schedule),
+            "speed": args.speed,
+            "seconds": seconds,
+            "failed": replayer.failures,
+            "statuses": replayer.statuses,
+            "late_starts": replayer.late_starts,
+        },
+        "end_to_end_ms": {
+            activity_type: {
+                "count": len(latencies),
+                "p50": ms(percentile(latencies, 0.50)),
+                "p95": ms(percentile(latencies, 0.95)),
+                "p99": ms(percentile(latencies, 0.99)),
+            }
+            for activity_type, latencies in sorted(replayer.latencies.items())
+        },
+        "stages": stage_report(before, after, "genie_bot_stage_seconds", "stage"),
+        "databricks_calls": stage_report(before, after, "genie_bot_databricks_call_seconds", "call"),
+        "misses": stand_ins.misses,
+        "stand_ins": stand_ins.stats(),
+        "profile": args.profile,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("cassette", help="cassette written by the traffic recorder (.jsonl.gz)")
+    parser.add_argument("--speed", type=float, default=1.0, help="replay speed; 10 replays ten times faster, Genie included")
+    parser.add_argument("--max-gap", type=float, default=5.0, help="longest idle gap between activities kept, in recorded seconds")
+    parser.add_argument("--limit", type=int, default=None, help="replay only the first N activities")
+    parser.add_argument("--connector-latency", type=float, default=0.02, help="seconds per Bot Connector request")
+    parser.add_argument("--poll-interval", type=float, default=0.5, help="bot's GENIE_POLL_INITIAL_INTERVAL")
+    parser.add_argument("--bot-env", action="append", default=[], metavar="KEY=VALUE", help="extra bot environment setting")
+    parser.add_argument("--profile", metavar="PATH", help="write collapsed stacks sampled during the replay")
+    parser.add_argument("--profile-seconds", type=float, default=None, help="profile length (default: the replay schedule)")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--json", metavar="PATH", help="also write the report as JSON")
+    args = parser.parse_args()
+
+    report = asyncio.run(main_async(args))
+    print_report(report)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,317 @@
+"""
+Local stand-ins for the services the bot calls
+
+An aiohttp application serving the parts of the Databricks Genie conversation API, the
+Statement Execution API and the Bot Framework Connector API that the bot uses, so the
+bot can be load tested without a workspace or Teams. The real Databricks SDK and Bot
+Framework clients talk to it over HTTP, so connection pooling, serialization and retries
+are exercised as in production.
+
+Genie messages move through ASKING_AI and EXECUTING_QUERY to COMPLETED based on the time
+since they were created; latency, error rate, rate limits and result size are set with
+StandInSettings. Every request is counted, and server-side latency is recorded per
+endpoint.
+"""
+
+import asyncio
+import itertools
+import json
+import random
+import time
+from typing import Dict, List, Optional, Tuple
+
+from aiohttp import web
+
+
+class StandInSettings:
+    """Behaviour of the stand-ins.
+
+    genie_latency is the time from submitting a question until Genie reports it COMPLETED,
+    varied by +/- latency_jitter (a fraction). error_rate is the fraction of Databricks
+    requests answered with 503 TEMPORARILY_UNAVAILABLE; rate_limit caps Databricks
+    requests per second (0 = unlimited), answering the rest with 429.
+    """
+
+    def __init__(
+        self,
+        genie_latency: float = 3.0,
+        statement_latency: float = 0.05,
+        connector_latency: float = 0.02,
+        latency_jitter: float = 0.3,
+        error_rate: float = 0.0,
+        rate_limit: float = 0.0,
+        result_rows: int = 100,
+        result_columns: int = 5,
+        text_answer_rate: float = 0.0,
+        seed: Optional[int] = None,
+    ):
+        self.genie_latency = genie_latency
+        self.statement_latency = statement_latency
+        self.connector_latency = connector_latency
+        self.latency_jitter = latency_jitter
+        self.error_rate = error_rate
+        self.rate_limit = rate_limit
+        self.result_rows = result_rows
+        self.result_columns = result_columns
+        self.text_answer_rate = text_answer_rate
+        self.random = random.Random(seed)
+
+    def jitter(self, seconds: float) -> float:
+        return max(0.0, seconds * (1 + self.random.uniform(-self.latency_jitter, self.latency_jitter)))
+
+
+def result_payload(statement_id: str, rows: int, columns: int) -> Dict:
+    """Statement Execution response with alternating string and numeric columns (10% NULLs)"""
+    schema = []
+    for position in range(columns):
+        kind = ("STRING", "DOUBLE", "LONG")[position % 3]
+        schema.append({"name": f"{kind.lower()}_{position}", "type_name": kind, "type_text": kind, "position": position})
+    data = []
+    for row in range(rows):
+        values = []
+        for position in range(columns):
+            if (row + position) % 10 == 9:
+                values.append(None)
+            elif position % 3 == 0:
+                values.append(f"Region {row % 17}")
+            elif position % 3 == 1:
+                values.append(str(round(row * 10.25 + position, 2)))
+            else:
+                values.append(str(row * 7 + position))
+        data.append(values)
+    return {
+        "statement_id": statement_id,
+        "status": {"state": "SUCCEEDED"},
+        "manifest": {
+            "format": "JSON_ARRAY",
+            "schema": {"column_count": columns, "columns": schema},
+            "total_row_count": rows,
+        },
+        "result": {"chunk_index": 0, "row_offset": 0, "row_count": rows, "data_array": data},
+    }
+
+
+class _Message:
+    __slots__ = ("conversation_id", "message_id", "content", "created", "latency", "text_answer")
+
+    def __init__(self, conversation_id: str, message_id: str, content: str, latency: float, text_answer: bool):
+        self.conversation_id = conversation_id
+        self.message_id = message_id
+        self.content = content
+        self.created = time.monotonic()
+        self.latency = latency
+        self.text_answer = text_answer
+
+
+class StandIns:
+    """Routes, state and request statistics of the stand-in services"""
+
+    def __init__(self, settings: StandInSettings):
+        self.settings = settings
+        self._ids = itertools.count(1)
+        self._messages: Dict[Tuple[str, str], _Message] = {}
+        self._conversations: Dict[str, List[str]] = {}
+        self._tokens = float(max(1.0, settings.rate_limit))
+        self._refilled = time.monotonic()
+        self._result_body: Optional[bytes] = None
+        # endpoint -> [requests, errors, rate limited, total seconds]
+        self.requests: Dict[str, list] = {}
+        self.connector_activities = 0
+
+    def app(self) -> web.Application:
+        app = web.Application(middlewares=[self._record])
+        genie = "/api/2.0/genie/spaces/{space_id}"
+        app.router.add_post(genie + "/start-conversation", self.start_conversation)
+        app.router.add_post(genie + "/conversations/{conversation_id}/messages", self.create_message)
+        app.router.add_get(genie + "/conversations/{conversation_id}/messages", self.list_messages)
+        app.router.add_get(genie + "/conversations/{conversation_id}/messages/{message_id}", self.get_message)
+        app.router.add_get(
+            genie + "/conversations/{conversation_id}/messages/{message_id}/attachments/{attachment_id}/query-result",
+            self.query_result,
+        )
+        app.router.add_post(genie + "/conversations/{conversation_id}/messages/{message_id}/feedback", self.feedback)
+        app.router.add_get("/api/2.0/sql/statements/{statement_id}", self.get_statement)
+        app.router.add_post("/api/2.0/sql/statements/{statement_id}/cancel", self.cancel_statement)
+        app.router.add_get("/api/2.0/preview/scim/v2/Me", self.me)
+        app.router.add_get("/.well-known/databricks-config", self.databricks_config)
+        app.router.add_post("/v3/conversations/{conversation_id}/activities", self.send_activity)
+        app.router.add_post("/v3/conversations/{conversation_id}/activities/{activity_id}", self.send_activity)
+        app.router.add_put("/v3/conversations/{conversation_id}/activities/{activity_id}", self.send_activity)
+        app.router.add_get("/v3/conversations/{conversation_id}/members/{member_id}", self.member)
+        app.router.add_get("/v3/conversations/{conversation_id}/members", self.members)
+        return app
+
+    @web.middleware
+    async def _record(self, request: web.Request, handler):
+        route = request.match_info.route.resource.canonical if request.match_info.route.resource else request.path
+        endpoint = f"{request.method} {route}"
+        stats = self.requests.setdefault(endpoint, [0, 0, 0, 0.0])
+        stats[0] += 1
+        started = time.perf_counter()
+        try:
+            if route.startswith("/api/2.0/"):
+                refused = self._refuse()
+                if refused is not None:
+                    stats[2 if refused.status == 429 else 1] += 1
+                    return refused
+            return await handler(request)
+        finally:
+            stats[3] += time.perf_counter() - started
+
+    def _refuse(self) -> Optional[web.Response]:
+        settings = self.settings
+        if settings.rate_limit > 0:
+            now = time.monotonic()
+            self._tokens = min(max(1.0, settings.rate_limit), self._tokens + (now - self._refilled) * settings.rate_limit)
+            self._refilled = now
+            if self._tokens < 1:
+                return web.json_response(
+                    {"error_code": "REQUEST_LIMIT_EXCEEDED", "message": "Stand-in rate limit exceeded"},
+                    status=429,
+                    headers={"Retry-After": "1"},
+                )
+            self._tokens -= 1
+        if settings.error_rate > 0 and settings.random.random() < settings.error_rate:
+            return web.json_response(
+                {"error_code": "TEMPORARILY_UNAVAILABLE", "message": "Stand-in injected error"}, status=503
+            )
+        return None
+
+    def _new_message(self, conversation_id: str, content: str) -> _Message:
+        settings = self.settings
+        message = _Message(
+            conversation_id,
+            f"msg-{next(self._ids)}",
+            content,
+            settings.jitter(settings.genie_latency),
+            settings.random.random() < settings.text_answer_rate,
+        )
+        self._messages[(conversation_id, message.message_id)] = message
+        self._conversations.setdefault(conversation_id, []).append(message.message_id)
+        return message
+
+    def _message_json(self, space_id: str, message: _Message) -> Dict:
+        elapsed = time.monotonic() - message.created
+        statement_id = f"stmt-{message.message_id}"
+        body = {
+            "id": message.message_id,
+            "message_id": message.message_id,
+            "space_id": space_id,
+            "conversation_id": message.conversation_id,
+            "content": message.content,
+            "created_timestamp": int(time.time() * 1000),
+        }
+        if elapsed < message.latency * 0.3:
+            body["status"] = "ASKING_AI"
+        elif elapsed < message.latency:
+            body["status"] = "EXECUTING_QUERY"
+            if not message.text_answer:
+                body["attachments"] = [{"attachment_id": "att-query", "query": {"query": "SELECT 1", "statement_id": statement_id}}]
+        else:
+            body["status"] = "COMPLETED"
+            suggestions = {"attachment_id": "att-suggested", "suggested_questions": {"questions": ["What about last month?", "Break it down by region"]}}
+            if message.text_answer:
+                body["attachments"] = [{"attachment_id": "att-text", "text": {"content": "Stand-in text answer"}}, suggestions]
+            else:
+                body["attachments"] = [
+                    {
+                        "attachment_id": "att-query",
+                        "query": {"query": "SELECT 1", "description": "Stand-in query", "statement_id": statement_id},
+                    },
+                    suggestions,
+                ]
+                body["query_result"] = {"statement_id": statement_id, "row_count": self.settings.result_rows}
+        return body
+
+    async def start_conversation(self, request: web.Request) -> web.Response:
+        content = (await request.json()).get("content", "")
+        conversation_id = f"conv-{next(self._ids)}"
+        message = self._new_message(conversation_id, content)
+        space_id = request.match_info["space_id"]
+        return web.json_response({
+            "conversation_id": conversation_id,
+            "message_id": message.message_id,
+            "conversation": {"id": conversation_id, "space_id": space_id, "title": content[:40]},
+            "message": self._message_json(space_id, message),
+        })
+
+    async def create_message(self, request: web.Request) -> web.Response:
+        content = (await request.json()).get("content", "")
+        conversation_id = request.match_info["conversation_id"]
+        message = self._new_message(conversation_id, content)
+        return web.json_response(self._message_json(request.match_info["space_id"], message))
+
+    async def get_message(self, request: web.Request) -> web.Response:
+        message = self._messages.get((request.match_info["conversation_id"], request.match_info["message_id"]))
+        if message is None:
+            return web.json_response({"error_code": "NOT_FOUND", "message": "No such message"}, status=404)
+        return web.json_response(self._message_json(request.match_info["space_id"], message))
+
+    async def list_messages(self, request: web.Request) -> web.Response:
+        space_id = request.match_info["space_id"]
+        conversation_id = request.match_info["conversation_id"]
+        messages = [
+            self._message_json(space_id, self._messages[(conversation_id, message_id)])
+            for message_id in self._conversations.get(conversation_id, [])
+        ]
+        return web.json_response({"messages": messages})
+
+    async def query_result(self, request: web.Request) -> web.Response:
+        statement_id = f"stmt-{request.match_info['message_id']}"
+        return web.json_response({"statement_response": {"statement_id": statement_id, "status": {"state": "SUCCEEDED"}}})
+
+    async def get_statement(self, request: web.Request) -> web.Response:
+        await asyncio.sleep(self.settings.jitter(self.settings.statement_latency))
+        if self._result_body is None:
+            # Every statement returns the same result, serialized once
+            payload = result_payload("STATEMENT_ID", self.settings.result_rows, self.settings.result_columns)
+            self._result_body = json.dumps(payload).encode("utf-8")
+        body = self._result_body.replace(b"STATEMENT_ID", request.match_info["statement_id"].encode("utf-8"), 1)
+        return web.Response(body=body, content_type="application/json")
+
+    async def cancel_statement(self, request: web.Request) -> web.Response:
+        return web.json_response({})
+
+    async def feedback(self, request: web.Request) -> web.Response:
+        return web.json_response({})
+
+    async def me(self, request: web.Request) -> web.Response:
+        return web.json_response({"id": "1", "userName": "load-test@example.com"})
+
+    async def databricks_config(self, request: web.Request) -> web.Response:
+        return web.json_response({})
+
+    async def send_activity(self, request: web.Request) -> web.Response:
+        await request.read()
+        await asyncio.sleep(self.settings.jitter(self.settings.connector_latency))
+        self.connector_activities += 1
+        return web.json_response({"id": request.match_info.get("activity_id") or f"act-{next(self._ids)}"})
+
+    async def member(self, request: web.Request) -> web.Response:
+        member_id = request.match_info["member_id"]
+        return web.json_response(_member(member_id))
+
+    async def members(self, request: web.Request) -> web.Response:
+        return web.json_response([])
+
+    def stats(self) -> Dict[str, Dict]:
+        return {
+            endpoint: {
+                "requests": count,
+                "errors": errors,
+                "rate_limited": limited,
+                "mean_ms": round(seconds / count * 1000, 2) if count else None,
+            }
+            for endpoint, (count, errors, limited, seconds) in sorted(self.requests.items())
+        }
+
+
+def _member(member_id: str) -> Dict:
+    name = member_id.split(":")[-1]
+    return {
+        "id": member_id,
+        "name": f"Load Test {name}",
+        "email": f"{name}@example.com",
+        "userPrincipalName": f"{name}@example.com",
+        "aadObjectId": name,
+    }
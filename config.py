@@ -44,4 +44,134 @@ class DefaultConfig:
     
     # Feedback settings
     ENABLE_FEEDBACK_CARDS = os.getenv("ENABLE_FEEDBACK_CARDS", "True").lower() == "true"
-    ENABLE_GENIE_FEEDBACK_API = os.getenv("ENABLE_GENIE_FEEDBACK_API", "True").lower() == "true"
\ No newline at end of file
+    ENABLE_GENIE_FEEDBACK_API = os.getenv("ENABLE_GENIE_FEEDBACK_API", "True").lower() == "true"
+    # "separate" sends the answer and feedback card as two activities; "combined" sends them as one
+    RESPONSE_DELIVERY_MODE = os.getenv("RESPONSE_DELIVERY_MODE", "separate").lower()
+    COMBINED_ANSWER_CACHE_SIZE = int(os.getenv("COMBINED_ANSWER_CACHE_SIZE", "200"))  # answers kept for in-place updates
+    
+    # Shared HTTP client settings for direct Databricks REST calls
+    DATABRICKS_HTTP_POOL_SIZE = int(os.getenv("DATABRICKS_HTTP_POOL_SIZE", "100"))
+    DATABRICKS_HTTP_POOL_SIZE_PER_HOST = int(os.getenv("DATABRICKS_HTTP_POOL_SIZE_PER_HOST", "20"))
+    DATABRICKS_HTTP_DNS_CACHE_TTL = int(os.getenv("DATABRICKS_HTTP_DNS_CACHE_TTL", "300"))  # seconds
+    DATABRICKS_HTTP_KEEPALIVE_TIMEOUT = float(os.getenv("DATABRICKS_HTTP_KEEPALIVE_TIMEOUT", "60"))  # seconds
+    DATABRICKS_HTTP_CONNECT_TIMEOUT = float(os.getenv("DATABRICKS_HTTP_CONNECT_TIMEOUT", "10"))  # seconds
+    DATABRICKS_HTTP_READ_TIMEOUT = float(os.getenv("DATABRICKS_HTTP_READ_TIMEOUT", "30"))  # seconds
+    DATABRICKS_HTTP_TOTAL_TIMEOUT = float(os.getenv("DATABRICKS_HTTP_TOTAL_TIMEOUT", "60"))  # seconds
+    
+    # Local Genie message index - bounded per-conversation cache of message IDs
+    MESSAGE_INDEX_MAX_CONVERSATIONS = int(os.getenv("MESSAGE_INDEX_MAX_CONVERSATIONS", "10000"))
+    MESSAGE_INDEX_MAX_MESSAGES = int(os.getenv("MESSAGE_INDEX_MAX_MESSAGES", "50"))  # per conversation
+    
+    # Feedback journal - durable append-only record of answers and feedback for offline analysis
+    ENABLE_FEEDBACK_JOURNAL = os.getenv("ENABLE_FEEDBACK_JOURNAL", "True").lower() == "true"
+    FEEDBACK_JOURNAL_PATH = os.getenv("FEEDBACK_JOURNAL_PATH", "feedback_journal.db")
+    FEEDBACK_JOURNAL_BATCH_SIZE = int(os.getenv("FEEDBACK_JOURNAL_BATCH_SIZE", "100"))
+    FEEDBACK_JOURNAL_FLUSH_INTERVAL = float(os.getenv("FEEDBACK_JOURNAL_FLUSH_INTERVAL", "1.0"))  # seconds
+    FEEDBACK_JOURNAL_MAX_QUEUE = int(os.getenv("FEEDBACK_JOURNAL_MAX_QUEUE", "10000"))  # records waiting to be written before new ones are dropped
+    FEEDBACK_JOURNAL_COMPACT_INTERVAL_HOURS = float(os.getenv("FEEDBACK_JOURNAL_COMPACT_INTERVAL_HOURS", "24"))
+    FEEDBACK_JOURNAL_RETENTION_DAYS = int(os.getenv("FEEDBACK_JOURNAL_RETENTION_DAYS", "30"))  # answers without feedback
+    
+    # Result rendering - "markdown" tables or compact "adaptive_card" tables
+    RESULT_RENDER_MODE = os.getenv("RESULT_RENDER_MODE", "markdown").lower()
+    RESULT_CARD_MAX_BYTES = int(os.getenv("RESULT_CARD_MAX_BYTES", "24000"))  # stay under the Teams ~28 KB message limit
+    RESULT_DEADLINE_FALLBACK_ROWS = int(os.getenv("RESULT_DEADLINE_FALLBACK_ROWS", "50"))  # rows rendered once the question's deadline has expired
+    
+    # Progress updates - typing indicator plus one status message edited in place during a Genie run
+    ENABLE_PROGRESS_UPDATES = os.getenv("ENABLE_PROGRESS_UPDATES", "True").lower() == "true"
+    GENIE_POLL_INITIAL_INTERVAL = float(os.getenv("GENIE_POLL_INITIAL_INTERVAL", "1.0"))  # seconds
+    GENIE_POLL_MAX_INTERVAL = float(os.getenv("GENIE_POLL_MAX_INTERVAL", "5.0"))  # seconds
+    
+    # End-to-end time budget for one question (Genie wait, result fetch and render); the query is cancelled on expiry
+    GENIE_QUESTION_TIMEOUT_SECONDS = float(os.getenv("GENIE_QUESTION_TIMEOUT_SECONDS", "300"))
+    
+    # Retries and circuit breaker for Databricks calls
+    DATABRICKS_SDK_RETRY_TIMEOUT_SECONDS = int(os.getenv("DATABRICKS_SDK_RETRY_TIMEOUT_SECONDS", "20"))
+    DATABRICKS_RETRY_MAX_ATTEMPTS = int(os.getenv("DATABRICKS_RETRY_MAX_ATTEMPTS", "3"))
+    DATABRICKS_RETRY_BASE_DELAY = float(os.getenv("DATABRICKS_RETRY_BASE_DELAY", "0.5"))  # seconds
+    DATABRICKS_RETRY_MAX_DELAY = float(os.getenv("DATABRICKS_RETRY_MAX_DELAY", "8"))  # seconds
+    DATABRICKS_BREAKER_FAILURE_THRESHOLD = int(os.getenv("DATABRICKS_BREAKER_FAILURE_THRESHOLD", "5"))
+    DATABRICKS_BREAKER_PROBE_INTERVAL = float(os.getenv("DATABRICKS_BREAKER_PROBE_INTERVAL", "30"))  # seconds
+    
+    # Prometheus text metrics at /metrics (per-stage latency histograms, error counters, gauges)
+    ENABLE_METRICS = os.getenv("ENABLE_METRICS", "False").lower() == "true"
+    METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")  # required as "Authorization: Bearer <token>" for /metrics and the detailed /health
+    
+    # Per-turn tracing, exported as JSON lines or OTLP/HTTP to a local collector
+    TRACE_EXPORTER = os.getenv("TRACE_EXPORTER", "none").lower()  # "none", "jsonl" or "otlp"
+    TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "0.1"))  # fraction of turns traced, decided per turn
+    TRACE_EXPORT_PATH = os.getenv("TRACE_EXPORT_PATH", "traces.jsonl")
+    TRACE_OTLP_ENDPOINT = os.getenv("TRACE_OTLP_ENDPOINT", "http://localhost:4318/v1/traces")
+    TRACE_SERVICE_NAME = os.getenv("TRACE_SERVICE_NAME", "genie-bot")
+
+    # Logging - records are formatted and written on a background thread; noisy statements are sampled and capped
+    LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+    LOG_ASYNC = os.getenv("LOG_ASYNC", "True").lower() == "true"
+    LOG_RATE_LIMIT_PER_MINUTE = float(os.getenv("LOG_RATE_LIMIT_PER_MINUTE", "60"))  # per log statement, 0 = unlimited
+    LOG_SAMPLE_RATE = float(os.getenv("LOG_SAMPLE_RATE", "1.0"))  # fraction of DEBUG/INFO records kept
+    LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))  # records waiting to be written before new ones are dropped
+
+    # Event loop lag monitor - heartbeat lag percentiles, and the loop thread's stack whenever it stalls
+    ENABLE_LOOP_MONITOR = os.getenv("ENABLE_LOOP_MONITOR", "True").lower() == "true"
+    LOOP_MONITOR_INTERVAL_MS = float(os.getenv("LOOP_MONITOR_INTERVAL_MS", "250"))  # heartbeat period
+    LOOP_LAG_THRESHOLD_MS = float(os.getenv("LOOP_LAG_THRESHOLD_MS", "100"))  # lag that counts as a stall and captures a stack
+
+    # On-demand sampling profiler at /debug/profile, only served when a token is set (send it as "Authorization: Bearer <token>")
+    DEBUG_PROFILE_TOKEN = os.getenv("DEBUG_PROFILE_TOKEN", "")
+    DEBUG_PROFILE_MAX_SECONDS = float(os.getenv("DEBUG_PROFILE_MAX_SECONDS", "60"))
+    DEBUG_PROFILE_INTERVAL_MS = float(os.getenv("DEBUG_PROFILE_INTERVAL_MS", "5"))  # time between stack samples
+
+    # Opt-in recording of incoming activities and Databricks responses (emails scrubbed) for benchmarks/replay.py
+    ENABLE_TRAFFIC_RECORDING = os.getenv("ENABLE_TRAFFIC_RECORDING", "False").lower() == "true"
+    TRAFFIC_RECORDING_PATH = os.getenv("TRAFFIC_RECORDING_PATH", "traffic.jsonl.gz")
+    TRAFFIC_RECORDING_MAX_MB = float(os.getenv("TRAFFIC_RECORDING_MAX_MB", "100"))  # compressed size at which recording stops
+    
+    # Routing to Genie targets (spaces, possibly in other workspaces), each with its own clients and limits
+    GENIE_TARGETS = os.getenv("GENIE_TARGETS", "")  # JSON object: name -> {space_id, host, token_env, ...}
+    GENIE_ROUTES = os.getenv("GENIE_ROUTES", "")  # JSON list: {team_id|channel_id|prefix, target}
+    GENIE_TARGET_MAX_WORKERS = int(os.getenv("GENIE_TARGET_MAX_WORKERS", "16"))  # executor threads and pooled connections per target
+    GENIE_TARGET_RATE_LIMIT_PER_SECOND = float(os.getenv("GENIE_TARGET_RATE_LIMIT_PER_SECOND", "0"))  # Databricks calls per target, 0 = unlimited
+    GENIE_TARGET_RATE_LIMIT_BURST = int(os.getenv("GENIE_TARGET_RATE_LIMIT_BURST", "10"))
+    
+    # Local re-slicing of each user's last tabular result (sort, top N, filter, sum by)
+    ENABLE_LOCAL_RESULT_COMMANDS = os.getenv("ENABLE_LOCAL_RESULT_COMMANDS", "True").lower() == "true"
+    RESULT_STORE_MAX_MB = float(os.getenv("RESULT_STORE_MAX_MB", "256"))  # across all users, least recently used evicted first
+    
+    # Reuse of recent answers for near-identical questions that would start a new conversation
+    ENABLE_QUESTION_REUSE = os.getenv("ENABLE_QUESTION_REUSE", "True").lower() == "true"
+    QUESTION_REUSE_THRESHOLD = float(os.getenv("QUESTION_REUSE_THRESHOLD", "0.9"))  # word-set similarity, 0-1
+    QUESTION_REUSE_TTL_MINUTES = float(os.getenv("QUESTION_REUSE_TTL_MINUTES", "30"))
+    QUESTION_INDEX_MAX_ENTRIES = int(os.getenv("QUESTION_INDEX_MAX_ENTRIES", "5000"))
+    QUESTION_INDEX_MAX_MB = float(os.getenv("QUESTION_INDEX_MAX_MB", "64"))  # indexed answers, oldest evicted first; larger than a tenth are skipped
+    
+    # Pre-computed answers for SAMPLE_QUESTIONS, refreshed in the background at startup and on a schedule
+    ENABLE_SAMPLE_ANSWERS = os.getenv("ENABLE_SAMPLE_ANSWERS", "True").lower() == "true"
+    SAMPLE_ANSWER_REFRESH_MINUTES = float(os.getenv("SAMPLE_ANSWER_REFRESH_MINUTES", "60"))
+    SAMPLE_ANSWER_MAX_AGE_MINUTES = float(os.getenv("SAMPLE_ANSWER_MAX_AGE_MINUTES", "180"))  # stop serving if refreshes keep failing
+    SAMPLE_ANSWER_CONCURRENCY = int(os.getenv("SAMPLE_ANSWER_CONCURRENCY", "1"))
+    SAMPLE_ANSWER_IDENTITY = os.getenv("SAMPLE_ANSWER_IDENTITY", "sample-answers")  # logged with refresh questions in Genie
+    
+    # Daily question subscriptions, run by an in-process scheduler and delivered as proactive messages
+    ENABLE_SUBSCRIPTIONS = os.getenv("ENABLE_SUBSCRIPTIONS", "True").lower() == "true"
+    SUBSCRIPTIONS_PATH = os.getenv("SUBSCRIPTIONS_PATH", "subscriptions.db")
+    SUBSCRIPTION_WINDOW_MINUTES = float(os.getenv("SUBSCRIPTION_WINDOW_MINUTES", "15"))  # runs are spread over the window before the due time
+    SUBSCRIPTION_CONCURRENCY = int(os.getenv("SUBSCRIPTION_CONCURRENCY", "2"))
+    SUBSCRIPTION_MAX_PER_USER = int(os.getenv("SUBSCRIPTION_MAX_PER_USER", "10"))
+    SUBSCRIPTION_DEFAULT_TIMEZONE = os.getenv("SUBSCRIPTION_DEFAULT_TIMEZONE", "UTC")  # when the client sends no time zone
+    SUBSCRIPTION_IDENTITY = os.getenv("SUBSCRIPTION_IDENTITY", "subscriptions")  # asks shared subscribed questions, and first-person ones saved without an email
+    SUBSCRIPTION_MAX_FAILURES = int(os.getenv("SUBSCRIPTION_MAX_FAILURES", "5"))  # failed deliveries in a row before removal; 0 keeps retrying
+    
+    # Genie's suggested follow-up questions, shown as quick replies and optionally prefetched
+    SHOW_FOLLOW_UP_SUGGESTIONS = os.getenv("SHOW_FOLLOW_UP_SUGGESTIONS", "True").lower() == "true"
+    ENABLE_FOLLOW_UP_PREFETCH = os.getenv("ENABLE_FOLLOW_UP_PREFETCH", "False").lower() == "true"
+    PREFETCH_ADMISSION_THRESHOLD = int(os.getenv("PREFETCH_ADMISSION_THRESHOLD", "4"))  # live questions in flight
+    PREFETCH_CONCURRENCY = int(os.getenv("PREFETCH_CONCURRENCY", "2"))
+    PREFETCH_MAX_PER_ANSWER = int(os.getenv("PREFETCH_MAX_PER_ANSWER", "1"))
+    PREFETCH_TTL_MINUTES = float(os.getenv("PREFETCH_TTL_MINUTES", "10"))
+    
+    # Roll long or slowing Genie conversations over to a fresh one (0 disables a limit)
+    CONVERSATION_MAX_MESSAGES = int(os.getenv("CONVERSATION_MAX_MESSAGES", "20"))
+    CONVERSATION_MAX_AGE_MINUTES = float(os.getenv("CONVERSATION_MAX_AGE_MINUTES", "120"))
+    CONVERSATION_LATENCY_REGRESSION_FACTOR = float(os.getenv("CONVERSATION_LATENCY_REGRESSION_FACTOR", "2.0"))
+    CONVERSATION_LATENCY_WINDOW = int(os.getenv("CONVERSATION_LATENCY_WINDOW", "3"))  # messages compared at each end
+    CONVERSATION_LATENCY_FLOOR_SECONDS = float(os.getenv("CONVERSATION_LATENCY_FLOOR_SECONDS", "10"))  # never roll over faster answers
+    CONVERSATION_SUMMARY_MAX_CHARS = int(os.getenv("CONVERSATION_SUMMARY_MAX_CHARS", "500"))
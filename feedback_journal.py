@@ -0,0 +1,322 @@
+"""
+Feedback Journal
+
+Durable, append-only record of answered questions and thumbs up/down feedback.
+
+Writes are queued from the bot and committed by a background writer thread in
+batches (group commit) to a SQLite database in WAL mode, so the invoke path never
+waits on disk I/O and feedback does not accumulate in process memory. If the writer
+falls behind, records are dropped and counted rather than queued without bound. The
+journal can be compacted periodically and exported in bulk for offline analysis.
+
+Offline usage:
+python3 feedback_journal.py export --path feedback_journal.db --out feedback.csv
+python3 feedback_journal.py rates --path feedback_journal.db
+python3 feedback_journal.py compact --path feedback_journal.db
+"""
+
+import argparse
+import csv
+import json
+import logging
+import os
+import queue
+import sqlite3
+import sys
+import threading
+import time
+from datetime import datetime, timezone, timedelta
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS answers (
+    id INTEGER PRIMARY KEY,
+    recorded_at TEXT NOT NULL,
+    message_id TEXT NOT NULL,
+    conversation_id TEXT,
+    user_id TEXT,
+    question TEXT
+);
+CREATE TABLE IF NOT EXISTS feedback (
+    id INTEGER PRIMARY KEY,
+    recorded_at TEXT NOT NULL,
+    message_id TEXT NOT NULL,
+    conversation_id TEXT,
+    user_id TEXT NOT NULL,
+    rating TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS answers_message_id ON answers (message_id);
+CREATE INDEX IF NOT EXISTS feedback_message_user ON feedback (message_id, user_id);
+"""
+
+# Latest feedback per (message, user) joined to the question that produced the message
+EXPORT_QUERY = """
+SELECT f.recorded_at, f.message_id, f.conversation_id, f.user_id, f.rating, a.question
+FROM feedback f
+LEFT JOIN (
+    SELECT message_id, question FROM answers
+    WHERE id IN (SELECT MAX(id) FROM answers GROUP BY message_id)
+) a ON a.message_id = f.message_id
+WHERE f.id IN (SELECT MAX(id) FROM feedback GROUP BY message_id, user_id)
+ORDER BY f.id
+"""
+
+EXPORT_COLUMNS = ["recorded_at", "message_id", "conversation_id", "user_id", "rating", "question"]
+
+_STOP = object()
+
+
+def _connect(path: str) -> sqlite3.Connection:
+    """Open a journal connection with WAL enabled and the schema in place"""
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    conn = sqlite3.connect(path, timeout=30, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.executescript(SCHEMA)
+    return conn
+
+
+class FeedbackJournal:
+    """Append-only SQLite journal with a group-commit writer thread"""
+
+    def __init__(self, path: str, batch_size: int = 100, flush_interval: float = 1.0, max_queue: int = 10000):
+        self.path = path
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = max(0.01, flush_interval)
+        self._queue: "queue.Queue" = queue.Queue(maxsize=max_queue)
+        self._writer: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self.records_written = 0
+        self.batches_committed = 0
+        self.dropped = 0
+
+    def start(self):
+        """Start the background writer thread if it is not already running"""
+        with self._lock:
+            if self._writer is None or not self._writer.is_alive():
+                self._writer = threading.Thread(target=self._run_writer, name="feedback-journal", daemon=True)
+                self._writer.start()
+
+    def record_answer(self, message_id: str, conversation_id: Optional[str], user_id: Optional[str], question: str):
+        """Queue an answered question so feedback can later be attributed to it"""
+        if not message_id:
+            return
+        self._enqueue(("answers", (self._now(), message_id, conversation_id, user_id, question)))
+
+    def record_feedback(self, message_id: str, conversation_id: Optional[str], user_id: str, rating: str):
+        """Queue a feedback click; later clicks for the same message and user supersede earlier ones"""
+        self._enqueue(("feedback", (self._now(), message_id, conversation_id, user_id, rating)))
+
+    def flush(self, timeout: Optional[float] = None):
+        """Block until every queued record has been committed, or the writer thread has stopped"""
+        writer = self._writer
+        if writer is None or not writer.is_alive():
+            return
+        deadline = None if timeout is None else time.monotonic() + timeout
+        done = threading.Event()
+        try:
+            self._queue.put(done, timeout=timeout)
+        except queue.Full:
+            return
+        # Wait in slices so a writer that dies with records queued cannot block the caller forever
+        while not done.wait(0.5 if deadline is None else max(0.0, min(0.5, deadline - time.monotonic()))):
+            if not writer.is_alive() or (deadline is not None and time.monotonic() >= deadline):
+                return
+
+    def close(self, timeout: Optional[float] = 10):
+        """Commit outstanding records and stop the writer thread"""
+        with self._lock:
+            writer = self._writer
+            self._writer = None
+        if writer is not None and writer.is_alive():
+            try:
+                self._queue.put(_STOP, timeout=timeout)
+            except queue.Full:
+                logger.warning("Feedback journal queue still full at shutdown; %s records not written", self._queue.qsize())
+                return
+            writer.join(timeout)
+
+    def stats(self) -> Dict:
+        return {
+            "written": self.records_written,
+            "batches": self.batches_committed,
+            "dropped": self.dropped,
+            "queued": self._queue.qsize(),
+        }
+
+    def compact(self, answer_retention_days: int = 30) -> int:
+        """Drop superseded feedback rows and old answers that never received feedback.
+
+        Returns the number of rows removed.
+        """
+        cutoff = (datetime.now(timezone.utc) - timedelta(days=answer_retention_days)).isoformat()
+        conn = _connect(self.path)
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            removed = conn.execute(
+                "DELETE FROM feedback WHERE id NOT IN (SELECT MAX(id) FROM feedback GROUP BY message_id, user_id)"
+            ).rowcount
+            removed += conn.execute(
+                "DELETE FROM answers WHERE id NOT IN (SELECT MAX(id) FROM answers GROUP BY message_id)"
+            ).rowcount
+            removed += conn.execute(
+                "DELETE FROM answers WHERE recorded_at < ? AND message_id NOT IN (SELECT message_id FROM feedback)",
+                (cutoff,),
+            ).rowcount
+            conn.execute("COMMIT")
+            conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            if removed:
+                conn.execute("VACUUM")
+            logger.info("Compacted feedback journal %s: removed %s rows", self.path, removed)
+            return removed
+        except Exception:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    def export(self, out_path: str, fmt: str = "csv") -> int:
+        """Export the latest feedback per message and user, with its question, to CSV or JSON lines.
+
+        Rows are streamed from SQLite so memory stays flat regardless of journal size.
+        Returns the number of rows written.
+        """
+        conn = _connect(self.path)
+        count = 0
+        try:
+            with open(out_path, "w", newline="", encoding="utf-8") as out:
+                cursor = conn.execute(EXPORT_QUERY)
+                if fmt == "jsonl":
+                    for row in cursor:
+                        out.write(json.dumps(dict(zip(EXPORT_COLUMNS, row))) + "\n")
+                        count += 1
+                else:
+                    writer = csv.writer(out)
+                    writer.writerow(EXPORT_COLUMNS)
+                    for row in cursor:
+                        writer.writerow(row)
+                        count += 1
+        finally:
+            conn.close()
+        return count
+
+    def feedback_rates(self) -> List[Dict]:
+        """Aggregate thumbs up/down counts and positive rate per question"""
+        conn = _connect(self.path)
+        try:
+            rows = conn.execute(
+                "SELECT COALESCE(question, '(unknown)'), "
+                "SUM(rating = 'positive'), SUM(rating = 'negative') "
+                f"FROM ({EXPORT_QUERY}) GROUP BY 1 ORDER BY COUNT(*) DESC"
+            ).fetchall()
+        finally:
+            conn.close()
+        return [
+            {
+                "question": question,
+                "positive": positive,
+                "negative": negative,
+                "positive_rate": round(positive / (positive + negative), 4) if positive + negative else None,
+            }
+            for question, positive, negative in rows
+        ]
+
+    def _enqueue(self, record):
+        if self._writer is None:
+            self.start()
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    @staticmethod
+    def _now() -> str:
+        return datetime.now(timezone.utc).isoformat()
+
+    def _run_writer(self):
+        conn = _connect(self.path)
+        try:
+            stop = False
+            while not stop:
+                try:
+                    item = self._queue.get(timeout=self.flush_interval)
+                except queue.Empty:
+                    continue
+
+                # Group commit: drain whatever else is already queued, up to batch_size
+                batch = {"answers": [], "feedback": []}
+                waiters = []
+                pending = 0
+                while True:
+                    if item is _STOP:
+                        stop = True
+                    elif isinstance(item, threading.Event):
+                        waiters.append(item)
+                    else:
+                        batch[item[0]].append(item[1])
+                        pending += 1
+                    if stop or pending >= self.batch_size:
+                        break
+                    try:
+                        item = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+
+                if pending:
+                    self._commit(conn, batch)
+                for waiter in waiters:
+                    waiter.set()
+        finally:
+            conn.close()
+
+    def _commit(self, conn: sqlite3.Connection, batch: Dict[str, list]):
+        try:
+            conn.execute("BEGIN")
+            if batch["answers"]:
+                conn.executemany(
+                    "INSERT INTO answers (recorded_at, message_id, conversation_id, user_id, question) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    batch["answers"],
+                )
+            if batch["feedback"]:
+                conn.executemany(
+                    "INSERT INTO feedback (recorded_at, message_id, conversation_id, user_id, rating) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    batch["feedback"],
+                )
+            conn.execute("COMMIT")
+            self.records_written += len(batch["answers"]) + len(batch["feedback"])
+            self.batches_committed += 1
+        except Exception as e:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            logger.error("Failed to write feedback journal batch: %s", e)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export, summarize or compact the feedback journal")
+    parser.add_argument("command", choices=["export", "rates", "compact"])
+    parser.add_argument("--path", default=os.getenv("FEEDBACK_JOURNAL_PATH", "feedback_journal.db"))
+    parser.add_argument("--out", default="feedback_export.csv", help="Output file for export")
+    parser.add_argument("--format", choices=["csv", "jsonl"], default="csv", help="Export format")
+    parser.add_argument("--retention-days", type=int, default=30, help="Answer retention for compact")
+    args = parser.parse_args(argv)
+
+    journal = FeedbackJournal(args.path)
+    if args.command == "export":
+        count = journal.export(args.out, args.format)
+        print(f"Exported {count} feedback rows to {args.out}")
+    elif args.command == "rates":
+        json.dump(journal.feedback_rates(), sys.stdout, indent=2)
+        print()
+    else:
+        removed = journal.compact(args.retention_days)
+        print(f"Removed {removed} rows")
+
+
+if __name__ == "__main__":
+    main()
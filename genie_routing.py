@@ -0,0 +1,167 @@
+"""
+Genie Routing
+
+Maps Teams teams, channels and command prefixes to Genie targets, each a Genie space in a
+Databricks workspace. Every target gets its own SDK client (and so its own HTTP connection
+pool), executor threads, rate limiter and circuit breaker, so load is spread across spaces
+and a slow or throttled warehouse only backs up the questions routed to it.
+
+Targets and routes are configured as JSON:
+
+    GENIE_TARGETS={"finance": {"space_id": "01ef...", "host": "https://finance.cloud.databricks.com",
+                               "token_env": "FINANCE_DATABRICKS_TOKEN", "max_workers": 8,
+                               "rate_limit_per_second": 5, "rate_limit_burst": 10}}
+    GENIE_ROUTES=[{"prefix": "/finance", "target": "finance"},
+                  {"team_id": "19:abc...@thread.tacv2", "target": "finance"}]
+
+A command prefix wins over a channel route, which wins over a team route. Every target can
+also be picked with "/<name>" (including "/default"), and a question that matches no route
+stays with the target of the user's current conversation - so "/finance" switches a user to
+the finance space until they switch again. New users start on the default target, built from
+DATABRICKS_HOST, DATABRICKS_TOKEN and DATABRICKS_SPACE_ID.
+"""
+
+import asyncio
+import json
+import os
+import time
+from typing import Dict, List, Optional, Tuple
+
+DEFAULT_TARGET = "default"
+
+
+class TargetSpec:
+    """Configuration of one Genie target"""
+
+    def __init__(
+        self,
+        name: str,
+        space_id: str,
+        host: str,
+        token: str,
+        max_workers: int = 16,
+        rate_limit_per_second: float = 0,
+        rate_limit_burst: int = 10,
+    ):
+        self.name = name
+        self.space_id = space_id
+        self.host = host
+        self.token = token
+        self.max_workers = max(1, max_workers)
+        self.rate_limit_per_second = rate_limit_per_second
+        self.rate_limit_burst = max(1, rate_limit_burst)
+
+
+class GenieRoute:
+    """Sends questions from a team, a channel, or with a command prefix to a target"""
+
+    def __init__(self, target: str, team_id: Optional[str] = None, channel_id: Optional[str] = None, prefix: Optional[str] = None):
+        self.target = target
+        self.team_id = team_id
+        self.channel_id = channel_id
+        self.prefix = prefix.lower() if prefix else None
+
+
+def parse_targets(raw: str, default: TargetSpec, max_workers: int, rate_limit_per_second: float, rate_limit_burst: int) -> Dict[str, TargetSpec]:
+    """Parse GENIE_TARGETS. Unset fields fall back to the default target's host and token
+    and to the configured per-target limits."""
+    targets = {default.name: default}
+    for name, spec in (json.loads(raw) if raw.strip() else {}).items():
+        if not spec.get("space_id"):
+            raise ValueError(f"Genie target '{name}' has no space_id")
+        token = os.getenv(spec["token_env"], "") if spec.get("token_env") else spec.get("token") or default.token
+        targets[name] = TargetSpec(
+            name,
+            spec["space_id"],
+            spec.get("host") or default.host,
+            token,
+            int(spec.get("max_workers", max_workers)),
+            float(spec.get("rate_limit_per_second", rate_limit_per_second)),
+            int(spec.get("rate_limit_burst", rate_limit_burst)),
+        )
+    return targets
+
+
+def parse_routes(raw: str, targets: Dict[str, TargetSpec]) -> List[GenieRoute]:
+    routes = []
+    for rule in json.loads(raw) if raw.strip() else []:
+        if rule.get("target") not in targets:
+            raise ValueError(f"Genie route {rule} points to an unknown target")
+        if not any(rule.get(key) for key in ("team_id", "channel_id", "prefix")):
+            raise ValueError(f"Genie route {rule} needs a team_id, channel_id or prefix")
+        routes.append(GenieRoute(rule["target"], rule.get("team_id"), rule.get("channel_id"), rule.get("prefix")))
+    return routes
+
+
+class GenieRouter:
+    """Resolves the target for a question from where it was asked and how it starts"""
+
+    def __init__(self, routes: List[GenieRoute], targets: List[str], default_target: str = DEFAULT_TARGET):
+        self.default_target = default_target
+        configured = {route.prefix for route in routes if route.prefix}
+        routes = routes + [GenieRoute(name, prefix=f"/{name}") for name in targets if f"/{name}".lower() not in configured]
+        # Longest prefixes first so "/fin-eu" is not taken by "/fin"
+        self._prefixes = sorted((route for route in routes if route.prefix), key=lambda route: -len(route.prefix))
+        self._channels = {route.channel_id: route.target for route in routes if route.channel_id}
+        self._teams = {route.team_id: route.target for route in routes if route.team_id}
+
+    def resolve(
+        self, team_id: Optional[str], channel_id: Optional[str], text: str, current: Optional[str] = None
+    ) -> Tuple[str, str]:
+        """Return (target name, question) with any routing prefix removed from the question.
+
+        current is the target of the user's conversation, used when no route matches.
+        """
+        lowered = text.lower()
+        for route in self._prefixes:
+            if lowered == route.prefix or lowered.startswith(route.prefix + " "):
+                return route.target, text[len(route.prefix):].strip()
+        if channel_id and channel_id in self._channels:
+            return self._channels[channel_id], text
+        if team_id and team_id in self._teams:
+            return self._teams[team_id], text
+        return current or self.default_target, text
+
+
+class RateLimiter:
+    """Token bucket limiting the Databricks calls made to one target.
+
+    acquire() waits for a token on the event loop, up to timeout seconds; a rate of 0
+    disables limiting.
+    """
+
+    def __init__(self, rate_per_second: float, burst: int):
+        self.rate = rate_per_second
+        self.burst = max(1, burst)
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self.waits = 0
+        self.wait_seconds = 0.0
+
+    async def acquire(self, timeout: float):
+        if self.rate <= 0:
+            return
+        started = time.monotonic()
+        waited = False
+        while True:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                if waited:
+                    self.waits += 1
+                    self.wait_seconds += now - started
+                return
+            delay = (1 - self._tokens) / self.rate
+            if now + delay - started > timeout:
+                raise asyncio.TimeoutError(f"Rate limit wait exceeded {timeout:.1f}s")
+            waited = True
+            await asyncio.sleep(delay)
+
+    def stats(self) -> Dict:
+        return {
+            "rate_per_second": self.rate or None,
+            "waits": self.waits,
+            "wait_seconds": round(self.wait_seconds, 3),
+        }
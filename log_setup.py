@@ -0,0 +1,147 @@
+"""
+Log Setup
+
+Configures the process's logging so that log statements on the event loop stay cheap.
+
+Records are handed to a queue as they are, without formatting, and a listener thread
+formats them and writes them to stderr, so a slow terminal or log shipper never blocks
+a turn. Before a record is queued, a filter applies sampling to DEBUG and INFO records
+and caps how often each log statement (logger plus message template) is emitted per
+minute; when a capped statement logs again, the record says how many were suppressed,
+so a storm of identical warnings costs one line per interval rather than one per event.
+If the listener falls behind, records are dropped and counted instead of queued without
+bound.
+
+Log calls should pass their arguments separately (logger.info("Asked %s", name)) so
+records that are filtered out are never formatted at all.
+"""
+
+import logging
+import queue
+import random
+import sys
+import time
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, Tuple
+
+
+class RateLimitFilter(logging.Filter):
+    """Samples low-severity records and rate limits each log statement.
+
+    sample_rate applies to records below WARNING; rate_limit_per_minute applies to every
+    record, per (logger name, message template). A limit of 0 disables rate limiting.
+    """
+
+    # Statements are keyed by their template; templates built at runtime would grow the
+    # table without bound, so it is reset if it ever gets this large
+    MAX_STATEMENTS = 10000
+
+    def __init__(self, rate_limit_per_minute: float = 0, sample_rate: float = 1.0):
+        super().__init__()
+        self.rate = rate_limit_per_minute / 60
+        self.burst = max(1.0, rate_limit_per_minute)
+        self.sample_rate = sample_rate
+        # (logger name, template) -> [tokens, last refill, suppressed since last emitted]
+        self._statements: Dict[Tuple[str, object], list] = {}
+        self.sampled_out = 0
+        self.suppressed = 0
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno < logging.WARNING and self.sample_rate < 1 and random.random() >= self.sample_rate:
+            self.sampled_out += 1
+            return False
+        if self.rate <= 0:
+            return True
+        key = (record.name, record.msg)
+        now = time.monotonic()
+        state = self._statements.get(key)
+        if state is None:
+            if len(self._statements) >= self.MAX_STATEMENTS:
+                self._statements.clear()
+            state = self._statements[key] = [self.burst, now, 0]
+        state[0] = min(self.burst, state[0] + (now - state[1]) * self.rate)
+        state[1] = now
+        if state[0] < 1:
+            state[2] += 1
+            self.suppressed += 1
+            return False
+        state[0] -= 1
+        if state[2]:
+            record.msg = "%s (%d similar messages suppressed)"
+            record.args = (record.getMessage(), state[2])
+            state[2] = 0
+        return True
+
+    def stats(self) -> Dict:
+        return {"sampled_out": self.sampled_out, "suppressed": self.suppressed}
+
+
+class AsyncLogHandler(QueueHandler):
+    """Queues records unformatted for a listener thread to format and write"""
+
+    def __init__(self, target: logging.Handler, max_queue: int = 10000):
+        super().__init__(queue.Queue(maxsize=max_queue))
+        self.dropped = 0
+        self._listener = QueueListener(self.queue, target, respect_handler_level=True)
+        self._listener.start()
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # The listener runs in this process, so the record (with its arguments and any
+        # traceback) can be passed as is; formatting happens on the listener thread
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def close(self):
+        """Write out queued records and stop the listener thread"""
+        if self._listener is not None:
+            self._listener.stop()
+            self._listener = None
+        super().close()
+
+    def stats(self) -> Dict:
+        return {"queued": self.queue.qsize(), "dropped": self.dropped}
+
+
+class LogSetup:
+    """The handler and filter installed by configure_logging"""
+
+    def __init__(self, handler: logging.Handler, rate_filter: RateLimitFilter):
+        self.handler = handler
+        self.filter = rate_filter
+
+    def close(self):
+        self.handler.close()
+
+    def stats(self) -> Dict:
+        stats = self.filter.stats()
+        if isinstance(self.handler, AsyncLogHandler):
+            stats.update(self.handler.stats())
+        return stats
+
+
+def configure_logging(
+    level: str = "INFO",
+    async_handler: bool = True,
+    rate_limit_per_minute: float = 0,
+    sample_rate: float = 1.0,
+    max_queue: int = 10000,
+    stream=None,
+) -> LogSetup:
+    """Replace the root logger's handlers with the (optionally asynchronous) stderr handler"""
+    # The default format uses none of these, so skip collecting them for every record
+    logging.logThreads = False
+    logging.logProcesses = False
+    logging.logMultiprocessing = False
+
+    output = logging.StreamHandler(stream or sys.stderr)
+    output.setFormatter(logging.Formatter(logging.BASIC_FORMAT))
+    handler: logging.Handler = AsyncLogHandler(output, max_queue) if async_handler else output
+    rate_filter = RateLimitFilter(rate_limit_per_minute, sample_rate)
+    handler.addFilter(rate_filter)
+    logging.basicConfig(level=level.upper(), handlers=[handler], force=True)
+    return LogSetup(handler, rate_filter)
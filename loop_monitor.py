@@ -0,0 +1,174 @@
+"""
+Event Loop Monitor
+
+Measures event loop lag continuously and captures what is blocking the loop when it
+stalls.
+
+A heartbeat task sleeps for a fixed interval and records how late it woke up; that delay
+is the lag every other coroutine saw at the same moment. A watchdog thread checks the
+heartbeat, and once it is overdue by more than the threshold it takes the stack of the
+event loop thread (sys._current_frames) while the blocking code is still running. Each
+stall is recorded once, with its stack and, when the loop recovers, its total duration,
+and stalls are also counted by the innermost frame in the bot's own code so the call
+sites that should move off the loop stand out.
+"""
+
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from typing import Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class Stall:
+    """One period in which the event loop was blocked for longer than the threshold"""
+
+    def __init__(self, stack: List[traceback.FrameSummary], location: Optional[str]):
+        self.detected_at = time.time()
+        self.stack = stack
+        self.location = location
+        self.lag: Optional[float] = None
+
+    def to_dict(self, max_frames: int = 15) -> Dict:
+        return {
+            "detected_at": self.detected_at,
+            "lag_ms": round(self.lag * 1000, 1) if self.lag is not None else None,
+            "location": self.location,
+            "stack": [f"{os.path.basename(frame.filename)}:{frame.lineno} in {frame.name}" for frame in self.stack[-max_frames:]],
+        }
+
+
+class LoopLagMonitor:
+    """Heartbeat task and watchdog thread for the running event loop.
+
+    on_lag(seconds) is called on the loop with every heartbeat's lag, e.g. to record it
+    in a histogram; on_stall(stall) is also called on the loop, at the heartbeat that ends
+    a stall the watchdog thread detected, so neither needs to be thread-safe. Stacks are attributed to the innermost frame under source_root.
+    """
+
+    def __init__(
+        self,
+        interval: float = 0.25,
+        threshold: float = 0.1,
+        samples: int = 2400,
+        max_stalls: int = 50,
+        source_root: Optional[str] = None,
+        on_lag: Optional[Callable[[float], None]] = None,
+        on_stall: Optional[Callable[[Stall], None]] = None,
+    ):
+        self.interval = interval
+        self.threshold = threshold
+        self.source_root = os.path.abspath(source_root or os.path.dirname(__file__))
+        self.on_lag = on_lag
+        self.on_stall = on_stall
+        self._samples: deque = deque(maxlen=samples)
+        self._stalls: deque = deque(maxlen=max_stalls)
+        self._stall_locations: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._loop_thread_id: Optional[int] = None
+        self._beat = time.monotonic()
+        self._pending: Optional[Stall] = None
+        self._stop = threading.Event()
+        self._watchdog: Optional[threading.Thread] = None
+        self.stall_count = 0
+        self.max_lag = 0.0
+
+    async def run(self):
+        """Record lag every interval until cancelled; starts the watchdog thread"""
+        self._loop_thread_id = threading.get_ident()
+        self._beat = time.monotonic()
+        self._stop.clear()
+        self._watchdog = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._watchdog.start()
+        try:
+            while True:
+                await asyncio.sleep(self.interval)
+                now = time.monotonic()
+                lag = max(0.0, now - self._beat - self.interval)
+                self._beat = now
+                self._record(lag)
+        finally:
+            self._stop.set()
+
+    def _record(self, lag: float):
+        self._samples.append(lag)
+        self.max_lag = max(self.max_lag, lag)
+        stall, self._pending = self._pending, None
+        if stall is not None:
+            stall.lag = lag
+            logger.warning(
+                "Event loop blocked for %.0f ms at %s:\n%s",
+                lag * 1000, stall.location or "unknown", "".join(traceback.format_list(stall.stack[-20:])),
+            )
+            if self.on_stall is not None:
+                self.on_stall(stall)
+        if self.on_lag is not None:
+            self.on_lag(lag)
+
+    def _watch(self):
+        check_every = max(0.005, self.threshold / 2)
+        reported_beat = None
+        while not self._stop.wait(check_every):
+            beat = self._beat
+            if beat == reported_beat or time.monotonic() - beat - self.interval < self.threshold:
+                continue
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is None:
+                continue
+            stack = self._callback_stack(traceback.extract_stack(frame))
+            del frame
+            reported_beat = beat
+            stall = Stall(stack, self._location(stack))
+            with self._lock:
+                self._stalls.append(stall)
+                if stall.location:
+                    self._stall_locations[stall.location] = self._stall_locations.get(stall.location, 0) + 1
+            self.stall_count += 1
+            self._pending = stall
+
+    @staticmethod
+    def _callback_stack(stack: List[traceback.FrameSummary]) -> List[traceback.FrameSummary]:
+        """Drop the event loop's own frames, keeping the callback that is running"""
+        for index in range(len(stack) - 1, -1, -1):
+            frame = stack[index]
+            if frame.name == "_run" and frame.filename.endswith(os.path.join("asyncio", "events.py")):
+                return stack[index + 1:]
+        return stack
+
+    def _location(self, stack: List[traceback.FrameSummary]) -> Optional[str]:
+        """Innermost frame in the bot's own code (not the standard library or packages)"""
+        for frame in reversed(stack):
+            path = os.path.abspath(frame.filename)
+            if path.startswith(self.source_root + os.sep) and "site-packages" not in path and path != os.path.abspath(__file__):
+                return f"{os.path.relpath(path, self.source_root)}:{frame.lineno} in {frame.name}"
+        return None
+
+    def stats(self, recent: int = 5) -> Dict:
+        """Lag percentiles (milliseconds) over recent heartbeats, and recent stalls with stacks"""
+        samples = sorted(self._samples)
+
+        def percentile(p: float) -> Optional[float]:
+            if not samples:
+                return None
+            return round(samples[min(len(samples) - 1, int(p * len(samples)))] * 1000, 2)
+
+        with self._lock:
+            stalls = list(self._stalls)[-recent:]
+            locations = sorted(self._stall_locations.items(), key=lambda item: -item[1])[:10]
+        return {
+            "interval_ms": self.interval * 1000,
+            "threshold_ms": self.threshold * 1000,
+            "lag_ms_p50": percentile(0.50),
+            "lag_ms_p95": percentile(0.95),
+            "lag_ms_p99": percentile(0.99),
+            "lag_ms_max": round(self.max_lag * 1000, 2),
+            "stalls": self.stall_count,
+            "stalls_by_location": dict(locations),
+            "recent_stalls": [stall.to_dict() for stall in reversed(stalls)],
+        }
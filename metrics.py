@@ -0,0 +1,131 @@
+"""
+Metrics
+
+Minimal in-process metrics rendered in the Prometheus text exposition format for the
+/metrics endpoint, without a client library dependency.
+
+Recording is a few list and dict operations on the event loop thread: a histogram
+observation is a bisect over the bucket bounds plus two additions, and a counter
+increment is one dict update. Gauges are callbacks evaluated only when /metrics is
+scraped, so values that already exist elsewhere (sessions, queue depths) cost nothing
+to keep up to date.
+"""
+
+from bisect import bisect_left
+from typing import Callable, Dict, List, Sequence, Tuple, Union
+
+# Seconds; covers fast local stages (render) through multi-minute Genie runs
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+GaugeValue = Union[float, Dict[Tuple[str, ...], float]]
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Histogram:
+    """Cumulative-bucket histogram; one bucket count list per label combination"""
+
+    def __init__(self, name: str, help_text: str, label_names: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(sorted(buckets))
+        # label values -> [per-bucket counts (last is +Inf), sum]
+        self._series: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, *labels: str):
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        for labels, (counts, total) in self._series.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += count
+                le = f'le="{bound}"'
+                lines.append(f"{self.name}_bucket{_labels(self.label_names, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.label_names, labels)} {total}")
+            lines.append(f"{self.name}_count{_labels(self.label_names, labels)} {cumulative}")
+        return lines
+
+
+class Counter:
+    """Monotonic counter per label combination"""
+
+    def __init__(self, name: str, help_text: str, label_names: Sequence[str] = ()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *labels: str, amount: float = 1):
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        for labels, value in self._values.items():
+            lines.append(f"{self.name}{_labels(self.label_names, labels)} {value}")
+        return lines
+
+
+class Gauge:
+    """Gauge read from a callback at scrape time.
+
+    The callback returns a number, or a dict of label values to numbers when the gauge
+    has labels.
+    """
+
+    def __init__(self, name: str, help_text: str, read: Callable[[], GaugeValue], label_names: Sequence[str] = ()):
+        self.name = name
+        self.help_text = help_text
+        self.read = read
+        self.label_names = tuple(label_names)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} gauge"]
+        value = self.read()
+        values = value if isinstance(value, dict) else {(): value}
+        for labels, number in values.items():
+            lines.append(f"{self.name}{_labels(self.label_names, labels)} {number}")
+        return lines
+
+
+class MetricsRegistry:
+    """Holds the process's metrics and renders them for scraping"""
+
+    def __init__(self):
+        self._metrics: List[Union[Histogram, Counter, Gauge]] = []
+
+    def histogram(self, name: str, help_text: str, label_names: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        metric = Histogram(name, help_text, label_names, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, help_text: str, label_names: Sequence[str] = ()) -> Counter:
+        metric = Counter(name, help_text, label_names)
+        self._metrics.append(metric)
+        return metric
+
+    def gauge(self, name: str, help_text: str, read: Callable[[], GaugeValue], label_names: Sequence[str] = ()) -> Gauge:
+        metric = Gauge(name, help_text, read, label_names)
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,184 @@
+"""
+Follow-up Prefetch
+
+Speculatively runs the follow-up questions Genie suggests with an answer, so that if
+the user picks one it can be served immediately.
+
+Prefetches run in a low-priority lane that is strictly capacity-gated: a prefetch is only
+admitted while live questions in flight are below the admission threshold, the lane has a
+free slot and Databricks is healthy, and running prefetches are cancelled as soon as live
+load reaches the threshold. A user's prefetches are also cancelled when they ask anything
+else. Follow-ups for one conversation run one at a time, in Genie's suggested order, since
+they are asked in the user's Genie conversation.
+"""
+
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+def question_key(question: str) -> str:
+    return " ".join(question.lower().split()).rstrip("?.! ")
+
+
+class Prefetch:
+    """One speculative follow-up run"""
+
+    def __init__(self, question: str, run):
+        self.question = question
+        self.run = run
+        self.task: Optional[asyncio.Task] = None
+        self.started_at = time.time()
+        self.claimed = False
+
+
+class FollowUpPrefetcher:
+    """Low-priority lane that prefetches suggested follow-ups per user conversation.
+
+    run_factory(user_id) creates the GenieRun for a prefetch. answer_fn(user_id,
+    conversation_id, question, run) asks Genie and returns (answer, conversation ID, message
+    ID), with no message ID when the run failed. live_load() returns the number of live
+    questions in flight and is_healthy(user_id) whether Databricks calls for the user's
+    Genie target are currently allowed.
+    """
+
+    def __init__(
+        self,
+        answer_fn: Callable[[str, str, str, object], Awaitable[Tuple]],
+        run_factory: Callable[[str], object],
+        live_load: Callable[[], int],
+        is_healthy: Callable[[str], bool],
+        admission_threshold: int = 4,
+        concurrency: int = 2,
+        max_per_answer: int = 1,
+        ttl: float = 600,
+    ):
+        self.answer_fn = answer_fn
+        self.run_factory = run_factory
+        self.live_load = live_load
+        self.is_healthy = is_healthy
+        self.admission_threshold = admission_threshold
+        self.concurrency = max(1, concurrency)
+        self.max_per_answer = max_per_answer
+        self.ttl = ttl
+        # user id -> (conversation id, {question key: Prefetch}, chain task)
+        self._users: Dict[str, Tuple[str, Dict[str, Prefetch], asyncio.Task]] = {}
+        self._active = 0
+        self.scheduled = 0
+        self.completed = 0
+        self.hits = 0
+        self.cancelled = 0
+        self.rejected = 0
+
+    def has_capacity(self, user_id: str) -> bool:
+        return (
+            self._active < self.concurrency
+            and self.live_load() < self.admission_threshold
+            and self.is_healthy(user_id)
+        )
+
+    def schedule(self, user_id: str, conversation_id: str, questions: List[str]):
+        """Prefetch the most likely follow-ups for a user's latest answer, capacity permitting"""
+        self.cancel(user_id, "superseded")
+        questions = [question for question in questions if question][: self.max_per_answer]
+        if not questions or not conversation_id:
+            return
+        if not self.has_capacity(user_id):
+            self.rejected += 1
+            return
+        prefetches: Dict[str, Prefetch] = {}
+        chain = asyncio.create_task(self._run_chain(user_id, conversation_id, questions, prefetches))
+        self._users[user_id] = (conversation_id, prefetches, chain)
+
+    async def _run_chain(self, user_id: str, conversation_id: str, questions: List[str], prefetches: Dict[str, Prefetch]):
+        for question in questions:
+            # Re-check admission before each follow-up; the lane never waits for capacity
+            if prefetches and not self.has_capacity(user_id):
+                self.rejected += 1
+                return
+            prefetch = Prefetch(question, self.run_factory(user_id))
+            prefetch.task = asyncio.create_task(self.answer_fn(user_id, conversation_id, question, prefetch.run))
+            prefetches[question_key(question)] = prefetch
+            self.scheduled += 1
+            self._active += 1
+            try:
+                await asyncio.shield(prefetch.task)
+                self.completed += 1
+            except asyncio.CancelledError:
+                if prefetch.claimed:
+                    # The user asked this follow-up; the caller now owns its task
+                    return
+                if not prefetch.task.done():
+                    # Cancelling the Genie task also cancels its warehouse statement
+                    prefetch.run.cancel_reason = "prefetch cancelled"
+                    prefetch.task.cancel()
+                    self.cancelled += 1
+                raise
+            except Exception as e:
+                logger.warning("Prefetch of '%s' failed: %s", question, e)
+                return
+            finally:
+                self._active -= 1
+
+    def take(self, user_id: str, conversation_id: Optional[str], question: str) -> Optional[Prefetch]:
+        """Claim a prefetched (or still running) follow-up matching the user's question.
+
+        The claimed prefetch is handed over to the caller, who awaits prefetch.task; the
+        user's other prefetches are cancelled.
+        """
+        entry = self._users.get(user_id)
+        if entry is None:
+            return None
+        prefetch_conversation, prefetches, _ = entry
+        prefetch = prefetches.get(question_key(question))
+        if (
+            prefetch is None
+            or prefetch_conversation != conversation_id
+            or prefetch.task is None
+            or prefetch.task.cancelled()
+            or time.time() - prefetch.started_at > self.ttl
+            or (prefetch.task.done() and prefetch.task.result()[2] is None)
+        ):
+            return None
+        prefetch.claimed = True
+        prefetches.pop(question_key(question))
+        self.hits += 1
+        self.cancel(user_id, "claimed")
+        return prefetch
+
+    def cancel(self, user_id: str, reason: str):
+        """Cancel a user's outstanding prefetches"""
+        entry = self._users.pop(user_id, None)
+        if entry is None:
+            return
+        _, _, chain = entry
+        if not chain.done():
+            logger.debug("Cancelling prefetch for %s (%s)", user_id, reason)
+            chain.cancel()
+
+    def preempt(self):
+        """Cancel every running prefetch once live load reaches the admission threshold"""
+        if self._users and self.live_load() >= self.admission_threshold:
+            for user_id, (_, _, chain) in list(self._users.items()):
+                if not chain.done():
+                    self.cancel(user_id, "live load")
+
+    async def close(self):
+        chains = [entry[2] for entry in self._users.values()]
+        for user_id in list(self._users):
+            self.cancel(user_id, "shutdown")
+        await asyncio.gather(*chains, return_exceptions=True)
+
+    def stats(self) -> Dict:
+        return {
+            "scheduled": self.scheduled,
+            "completed": self.completed,
+            "hits": self.hits,
+            "hit_ratio": round(self.hits / self.scheduled, 4) if self.scheduled else None,
+            "cancelled": self.cancelled,
+            "rejected_for_capacity": self.rejected,
+            "running": self._active,
+        }
@@ -0,0 +1,142 @@
+"""
+Profiler
+
+On-demand sampling profiler for the running bot, used by the /debug/profile endpoint.
+
+A background thread reads every thread's current stack (sys._current_frames) at a fixed
+interval and counts identical stacks, so the cost is one stack walk per thread per
+sample and the profiled code runs unmodified. The result is rendered as collapsed stacks
+("thread;outer;...;inner count" per line), the input format of flamegraph.pl, speedscope
+and similar tools.
+
+Memory growth is measured separately with tracemalloc, which is only tracing while a
+profile that asked for it is running: a snapshot is taken at the start and end and the
+difference is reported by allocating line, together with the sizes of the bot's
+per-user dicts.
+"""
+
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from typing import Dict, List, Optional, Tuple
+
+
+def _frame_label(code) -> str:
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class SamplingProfiler:
+    """Samples the stacks of all threads (or only thread_id) every interval seconds"""
+
+    def __init__(self, interval: float = 0.005, thread_id: Optional[int] = None, max_depth: int = 128):
+        self.interval = interval
+        self.thread_id = thread_id
+        self.max_depth = max_depth
+        self._stacks: Dict[Tuple[str, ...], int] = {}
+        self._labels: Dict[object, str] = {}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.samples = 0
+        self.started_at: Optional[float] = None
+        self.duration = 0.0
+
+    def start(self):
+        self.started_at = time.monotonic()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.duration = time.monotonic() - self.started_at if self.started_at is not None else 0.0
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id or (self.thread_id is not None and thread_id != self.thread_id):
+                    continue
+                stack = []
+                while frame is not None and len(stack) < self.max_depth:
+                    code = frame.f_code
+                    label = self._labels.get(code)
+                    if label is None:
+                        label = self._labels[code] = _frame_label(code)
+                    stack.append(label)
+                    frame = frame.f_back
+                stack.append(names.get(thread_id, str(thread_id)))
+                key = tuple(reversed(stack))
+                self._stacks[key] = self._stacks.get(key, 0) + 1
+            self.samples += 1
+
+    def collapsed(self) -> str:
+        """Collapsed stacks, most frequent first"""
+        lines = sorted(self._stacks.items(), key=lambda item: -item[1])
+        return "".join(f"{';'.join(stack)} {count}\n" for stack, count in lines)
+
+    def top_functions(self, limit: int = 20) -> List[Dict]:
+        """Functions by samples in which they were on top of the stack (self time)"""
+        counts: Dict[str, int] = {}
+        for stack, count in self._stacks.items():
+            counts[stack[-1]] = counts.get(stack[-1], 0) + count
+        total = sum(counts.values()) or 1
+        return [
+            {"function": name, "samples": count, "share": round(count / total, 4)}
+            for name, count in sorted(counts.items(), key=lambda item: -item[1])[:limit]
+        ]
+
+
+def container_sizes(owner: object) -> Dict[str, Dict]:
+    """Entry counts and shallow sizes (bytes) of an object's dict attributes"""
+    sizes = {}
+    for name, value in vars(owner).items():
+        if isinstance(value, dict):
+            sizes[name] = {"entries": len(value), "bytes": sys.getsizeof(value)}
+    return sizes
+
+
+class MemoryDiff:
+    """tracemalloc snapshot difference over a profile, plus growth of an object's dicts"""
+
+    def __init__(self, owner: Optional[object] = None, frames: int = 1):
+        self.owner = owner
+        self._started_tracing = not tracemalloc.is_tracing()
+        if self._started_tracing:
+            tracemalloc.start(frames)
+        self._before = tracemalloc.take_snapshot()
+        self._sizes_before = container_sizes(owner) if owner is not None else {}
+
+    def finish(self, limit: int = 25) -> Dict:
+        after = tracemalloc.take_snapshot()
+        traced, peak = tracemalloc.get_traced_memory()
+        if self._started_tracing:
+            tracemalloc.stop()
+        filters = [tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, __file__)]
+        diff = after.filter_traces(filters).compare_to(self._before.filter_traces(filters), "lineno")
+        sizes_after = container_sizes(self.owner) if self.owner is not None else {}
+        return {
+            "traced_bytes": traced,
+            "peak_bytes": peak,
+            "growth_by_line": [
+                {
+                    "location": f"{os.path.basename(stat.traceback[0].filename)}:{stat.traceback[0].lineno}",
+                    "size_diff_bytes": stat.size_diff,
+                    "count_diff": stat.count_diff,
+                    "size_bytes": stat.size,
+                }
+                for stat in diff[:limit]
+            ],
+            "containers": {
+                name: {
+                    "entries_before": self._sizes_before.get(name, {}).get("entries", 0),
+                    "entries_after": size["entries"],
+                    "bytes_before": self._sizes_before.get(name, {}).get("bytes", 0),
+                    "bytes_after": size["bytes"],
+                }
+                for name, size in sizes_after.items()
+            },
+        }
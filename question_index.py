@@ -0,0 +1,217 @@
+"""
+Question Index
+
+Local near-duplicate index over recently answered questions, so a paraphrase such as
+"last week's sales" can reuse the answer Genie already gave to "sales last week".
+
+Questions are normalized into word sets (lowercased, possessives and plurals folded,
+filler words dropped) and summarized with MinHash signatures. Locality-sensitive hashing
+over signature bands finds candidate questions in constant time; candidates are then
+scored by the exact Jaccard similarity of their word sets, which is the confidence
+reported to users. Questions whose numbers differ ("top 10" and "top 20") never match.
+
+Answers are generated with the asking user's identity, so a first-person question ("my
+open tickets", "what did we sell") is only ever reused for the user who asked it, and
+first-person words count towards similarity rather than being dropped as filler.
+Answers are kept within a memory budget, oldest evicted first; an answer larger than a
+tenth of the budget is not indexed. Everything runs in process; no external service is
+needed.
+"""
+
+import re
+import sys
+import time
+import zlib
+from collections import OrderedDict, deque
+from typing import Dict, FrozenSet, List, Optional
+
+import numpy as np
+
+STOP_WORDS = frozenset(
+    "a an the of for in on at to by from with and or is are was were be been what whats which who "
+    "how many much show give tell list please can you could would do does did "
+    "there their its it this that these those about as per".split()
+)
+
+# Words that make a question depend on who asks it
+FIRST_PERSON_WORDS = frozenset("i me my mine myself we us our ours ourselves".split())
+
+_TOKEN = re.compile(r"[a-z0-9]+(?:\.[0-9]+)?")
+_NUMBER = re.compile(r"^[0-9.]+$")
+_SHIFT = np.uint64(32)
+
+
+def question_tokens(question: str) -> FrozenSet[str]:
+    """Normalize a question into the set of words used for similarity"""
+    text = question.lower().replace("'s", "").replace("’s", "")
+    tokens = set()
+    for token in _TOKEN.findall(text):
+        if token in STOP_WORDS:
+            continue
+        if len(token) > 3 and token.endswith("s") and not token.endswith("ss") and not _NUMBER.match(token):
+            token = token[:-1]
+        tokens.add(token)
+    return frozenset(tokens)
+
+
+def is_personal(tokens: FrozenSet[str]) -> bool:
+    """Whether a question's answer depends on who asked it"""
+    return not tokens.isdisjoint(FIRST_PERSON_WORDS)
+
+
+class QuestionMatch:
+    """A previously answered question similar enough to reuse"""
+
+    def __init__(self, question: str, answer: str, similarity: float, answered_at: float):
+        self.question = question
+        self.answer = answer
+        self.similarity = similarity
+        self.answered_at = answered_at
+
+    @property
+    def age_seconds(self) -> float:
+        return time.time() - self.answered_at
+
+
+class QuestionIndex:
+    """MinHash/LSH index of recent questions and their answers.
+
+    num_perm hash functions are split into bands of rows_per_band; two questions become
+    candidates when any band of their signatures is identical.
+    """
+
+    def __init__(
+        self,
+        threshold: float = 0.9,
+        ttl_seconds: float = 3600,
+        max_entries: int = 5000,
+        max_bytes: int = 64 * 1024 * 1024,
+        num_perm: int = 64,
+        rows_per_band: int = 8,
+        latency_samples: int = 1000,
+    ):
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.rows_per_band = rows_per_band
+        self.bands = num_perm // rows_per_band
+        rng = np.random.default_rng(0x6E1E)
+        self._a = rng.integers(1, 2**63, size=self.bands * rows_per_band, dtype=np.uint64) | np.uint64(1)
+        self._b = rng.integers(0, 2**63, size=self.bands * rows_per_band, dtype=np.uint64)
+        # entry id -> (question, tokens, band keys, answer, answered_at, owner); owner is None if shared
+        self._entries: "OrderedDict[int, tuple]" = OrderedDict()
+        self._buckets: Dict[tuple, set] = {}
+        self._by_tokens: Dict[tuple, int] = {}
+        self._next_id = 0
+        self._bytes = 0
+        self.too_large = 0
+        self.lookups = 0
+        self.hits = 0
+        self._latencies: deque = deque(maxlen=latency_samples)
+
+    def _band_keys(self, tokens: FrozenSet[str]) -> List[tuple]:
+        hashes = np.fromiter((zlib.crc32(token.encode("utf-8")) for token in tokens), dtype=np.uint64, count=len(tokens))
+        # Multiply-shift hashing; uint64 arithmetic wraps, which is what the scheme relies on
+        signature = ((np.outer(hashes, self._a) + self._b) >> _SHIFT).min(axis=0)
+        return [
+            (band, signature[band * self.rows_per_band:(band + 1) * self.rows_per_band].tobytes())
+            for band in range(self.bands)
+        ]
+
+    def add(self, question: str, answer: str, owner: Optional[str] = None):
+        """Index an answered question, replacing any entry for the same word set.
+
+        owner is the user who asked; a first-person question is only reused for that user.
+        """
+        tokens = question_tokens(question)
+        if not tokens:
+            return
+        size = sys.getsizeof(answer)
+        if size > self.max_bytes // 10:
+            self.too_large += 1
+            return
+        owner = owner if is_personal(tokens) else None
+        if (tokens, owner) in self._by_tokens:
+            self._remove(self._by_tokens[(tokens, owner)])
+        entry_id = self._next_id
+        self._next_id += 1
+        keys = self._band_keys(tokens)
+        self._entries[entry_id] = (question, tokens, keys, answer, time.time(), owner)
+        self._by_tokens[(tokens, owner)] = entry_id
+        for key in keys:
+            self._buckets.setdefault(key, set()).add(entry_id)
+        self._bytes += size
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            self._remove(next(iter(self._entries)))
+
+    def lookup(self, question: str, owner: Optional[str] = None) -> Optional[QuestionMatch]:
+        """Return the most similar unexpired question at or above the threshold, if any.
+
+        Shared questions match for everyone; first-person questions only for their owner.
+        """
+        started = time.perf_counter()
+        self.lookups += 1
+        match = None
+        tokens = question_tokens(question)
+        if tokens:
+            numbers = {token for token in tokens if _NUMBER.match(token)}
+            cutoff = time.time() - self.ttl_seconds
+            candidates = set()
+            for key in self._band_keys(tokens):
+                candidates.update(self._buckets.get(key, ()))
+            best = 0.0
+            for entry_id in candidates:
+                indexed_question, indexed_tokens, _, answer, answered_at, indexed_owner = self._entries[entry_id]
+                if answered_at < cutoff:
+                    self._remove(entry_id)
+                    continue
+                if indexed_owner is not None and indexed_owner != owner:
+                    continue
+                if {token for token in indexed_tokens if _NUMBER.match(token)} != numbers:
+                    continue
+                similarity = len(tokens & indexed_tokens) / len(tokens | indexed_tokens)
+                if similarity >= self.threshold and similarity > best:
+                    best = similarity
+                    match = QuestionMatch(indexed_question, answer, similarity, answered_at)
+        if match is not None:
+            self.hits += 1
+        self._latencies.append(time.perf_counter() - started)
+        return match
+
+    def _remove(self, entry_id: int):
+        entry = self._entries.pop(entry_id, None)
+        if entry is None:
+            return
+        del self._by_tokens[(entry[1], entry[5])]
+        self._bytes -= sys.getsizeof(entry[3])
+        for key in entry[2]:
+            bucket = self._buckets.get(key)
+            if bucket is not None:
+                bucket.discard(entry_id)
+                if not bucket:
+                    del self._buckets[key]
+
+    def stats(self) -> Dict:
+        """Hit rate and lookup latency percentiles (milliseconds) over recent lookups"""
+        latencies = sorted(self._latencies)
+
+        def percentile(p: float) -> Optional[float]:
+            if not latencies:
+                return None
+            return round(latencies[min(len(latencies) - 1, int(p * len(latencies)))] * 1000, 3)
+
+        return {
+            "entries": len(self._entries),
+            "answer_bytes": self._bytes,
+            "too_large": self.too_large,
+            "lookups": self.lookups,
+            "hits": self.hits,
+            "hit_rate": round(self.hits / self.lookups, 4) if self.lookups else None,
+            "lookup_ms_p50": percentile(0.50),
+            "lookup_ms_p95": percentile(0.95),
+            "lookup_ms_max": percentile(1.0),
+        }
+
+    def __len__(self):
+        return len(self._entries)
@@ -0,0 +1,299 @@
+"""
+Result Store
+
+Keeps each user's last tabular Genie result in memory as a typed pandas DataFrame so
+follow-ups such as "sort by revenue desc", "top 10", "just region = EMEA" or
+"sum revenue by region" can be answered locally, without a new Genie message or
+warehouse query.
+
+Numeric columns are held as NumPy-backed numeric dtypes and repetitive text columns as
+categoricals. The store is an LRU bounded by the deep memory usage of the frames it
+holds; the least recently used results are evicted first.
+"""
+
+import re
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+FLOAT_TYPE_NAMES = ("DECIMAL", "DOUBLE", "FLOAT")
+INTEGER_TYPE_NAMES = ("INT", "BIGINT", "LONG")
+
+# Text columns whose distinct values are at most this fraction of their rows become categoricals
+CATEGORY_MAX_RATIO = 0.5
+
+_ORDER = r"(?:\s+(?P<order>asc|ascending|desc|descending))?"
+SORT_COMMAND = re.compile(r"^sort\s+(?:(?:that|this|it|them)\s+)?by\s+(?P<column>.+?)" + _ORDER + r"$", re.IGNORECASE)
+TOP_COMMAND = re.compile(
+    r"^(?:show\s+)?(?P<end>top|bottom|first|last)\s+(?P<count>\d+)(?:\s+rows)?(?:\s+by\s+(?P<column>.+?))?(?:\s+only)?$",
+    re.IGNORECASE,
+)
+FILTER_COMMAND = re.compile(
+    r"^(?:filter|just|only|where)\s+(?:(?:to|on|for)\s+)?(?P<column>.+?)\s*"
+    r"(?P<op>==|=|!=|>=|<=|>|<|\s+contains\s+)\s*(?P<value>.+)$",
+    re.IGNORECASE,
+)
+SUM_COMMAND = re.compile(r"^(?:sum|total)(?:\s+(?:of\s+)?(?P<column>.+?))?\s+by\s+(?P<group>.+)$", re.IGNORECASE)
+RESET_VIEW_COMMANDS = ("original", "show original", "undo", "reset view", "show all rows")
+
+
+def _normalize(name: str) -> str:
+    return re.sub(r"[\s_]+", " ", name.strip().strip("`'\"").lower())
+
+
+class StoredResult:
+    """A user's last tabular result: the original frame, the current view and its schema"""
+
+    def __init__(self, base: pd.DataFrame, schema: List[Dict], query_description: str = "", question: str = ""):
+        self.base = base
+        self.schema = schema
+        self.view = base
+        self.view_schema = schema
+        self.query_description = query_description
+        self.question = question
+        self.steps: List[str] = []
+
+    @property
+    def nbytes(self) -> int:
+        nbytes = int(self.base.memory_usage(deep=True).sum())
+        if self.view is not self.base:
+            nbytes += int(self.view.memory_usage(deep=True).sum())
+        return nbytes
+
+    def resolve_column(self, name: str) -> Optional[str]:
+        """Match a user-typed column name to a column of the current view.
+
+        Accepts the exact name, case and underscore/space differences, or a unique prefix.
+        """
+        wanted = _normalize(name)
+        if not wanted:
+            return None
+        columns = list(self.view.columns)
+        for column in columns:
+            if _normalize(column) == wanted:
+                return column
+        prefixed = [column for column in columns if _normalize(column).startswith(wanted)]
+        return prefixed[0] if len(prefixed) == 1 else None
+
+    def is_numeric(self, column: str) -> bool:
+        return pd.api.types.is_numeric_dtype(self.view[column])
+
+    def apply(self, view: pd.DataFrame, step: str, schema: Optional[List[Dict]] = None):
+        self.view = view
+        if schema is not None:
+            self.view_schema = schema
+        self.steps.append(step)
+
+    def reset_view(self):
+        self.view = self.base
+        self.view_schema = self.schema
+        self.steps = []
+
+
+def result_to_frame(answer_json: Dict, question: str = "") -> Optional[StoredResult]:
+    """Convert a tabular Genie answer into a typed DataFrame. Returns None for non-tabular answers."""
+    columns_info = answer_json.get("columns")
+    if not isinstance(columns_info, dict) or "columns" not in columns_info:
+        return None
+    schema = [{"name": col["name"], "type_name": col.get("type_name")} for col in columns_info["columns"]]
+    rows = (answer_json.get("data") or {}).get("data_array") or []
+    names = [col["name"] for col in schema]
+    if len(set(names)) != len(names):
+        return None
+
+    column_values = list(zip(*rows)) if rows else [()] * len(schema)
+    data = {}
+    for col, values in zip(schema, column_values):
+        series = pd.Series(values, dtype=object)
+        if col["type_name"] in INTEGER_TYPE_NAMES:
+            series = pd.to_numeric(series, errors="coerce").astype("Int64")
+        elif col["type_name"] in FLOAT_TYPE_NAMES:
+            series = pd.to_numeric(series, errors="coerce").astype("float64")
+        elif len(series) and series.nunique(dropna=True) <= CATEGORY_MAX_RATIO * len(series):
+            series = series.astype("category")
+        data[col["name"]] = series
+    frame = pd.DataFrame(data, columns=names)
+    return StoredResult(frame, schema, answer_json.get("query_description") or "", question)
+
+
+def frame_to_answer(result: StoredResult) -> Dict:
+    """Convert the current view back into the answer JSON shape used by the renderers"""
+    view = result.view
+    data_columns = []
+    for col in result.view_schema:
+        series = view[col["name"]]
+        if col["type_name"] in INTEGER_TYPE_NAMES:
+            values = [None if pd.isna(value) else int(value) for value in series.tolist()]
+        elif pd.api.types.is_numeric_dtype(series):
+            values = [None if value is None or np.isnan(value) else value for value in series.astype("float64").tolist()]
+        else:
+            values = [None if pd.isna(value) else str(value) for value in series.astype(object).tolist()]
+        data_columns.append(values)
+    rows = [list(row) for row in zip(*data_columns)] if data_columns else []
+    return {
+        "columns": {"columns": [dict(col) for col in result.view_schema]},
+        "data": {"data_array": rows},
+        "query_description": result.query_description,
+    }
+
+
+def _parse_value(raw: str):
+    return raw.strip().strip("'\"")
+
+
+def run_command(result: StoredResult, command: str) -> Optional[str]:
+    """Apply a re-slicing command to the result's current view.
+
+    Returns a short description of the step, or None if the text is not a command this
+    result can answer (unknown syntax or an unrecognized column), so it can go to Genie.
+    """
+    text = command.strip().rstrip(".?!")
+    if text.lower() in RESET_VIEW_COMMANDS:
+        result.reset_view()
+        return "original result"
+
+    match = SORT_COMMAND.match(text)
+    if match:
+        column = result.resolve_column(match.group("column"))
+        if column is None:
+            return None
+        descending = (match.group("order") or "").lower().startswith("desc")
+        result.apply(
+            result.view.sort_values(column, ascending=not descending, kind="stable", na_position="last"),
+            f"sorted by {column} {'descending' if descending else 'ascending'}",
+        )
+        return result.steps[-1]
+
+    match = TOP_COMMAND.match(text)
+    if match:
+        count = int(match.group("count"))
+        from_top = match.group("end").lower() in ("top", "first")
+        if match.group("column"):
+            column = result.resolve_column(match.group("column"))
+            if column is None or not result.is_numeric(column):
+                return None
+            view = result.view.nlargest(count, column) if from_top else result.view.nsmallest(count, column)
+            step = f"{match.group('end').lower()} {count} by {column}"
+        else:
+            view = result.view.head(count) if from_top else result.view.tail(count)
+            step = f"{match.group('end').lower()} {count} {'row' if count == 1 else 'rows'}"
+        result.apply(view, step)
+        return step
+
+    match = SUM_COMMAND.match(text)
+    if match:
+        group = result.resolve_column(match.group("group"))
+        if group is None:
+            return None
+        if match.group("column"):
+            column = result.resolve_column(match.group("column"))
+            if column is None or column == group or not result.is_numeric(column):
+                return None
+            value_columns = [column]
+        else:
+            value_columns = [name for name in result.view.columns if name != group and result.is_numeric(name)]
+            if not value_columns:
+                return None
+        view = (
+            result.view.groupby(group, observed=True, sort=False, dropna=False)[value_columns]
+            .sum(min_count=1)
+            .reset_index()
+        )
+        schema = [col for col in result.view_schema if col["name"] == group] + [
+            col for col in result.view_schema if col["name"] in value_columns
+        ]
+        step = f"sum of {', '.join(value_columns)} by {group}"
+        result.apply(view, step, schema)
+        return step
+
+    match = FILTER_COMMAND.match(text)
+    if match:
+        column = result.resolve_column(match.group("column"))
+        if column is None:
+            return None
+        op = match.group("op").strip().lower()
+        value = _parse_value(match.group("value"))
+        series = result.view[column]
+        if op == "contains":
+            mask = series.astype(str).str.contains(value, case=False, regex=False, na=False)
+        elif result.is_numeric(column):
+            try:
+                number = float(value.replace(",", ""))
+            except ValueError:
+                return None
+            mask = {
+                "=": series == number,
+                "==": series == number,
+                "!=": series != number,
+                ">": series > number,
+                ">=": series >= number,
+                "<": series < number,
+                "<=": series <= number,
+            }[op]
+        else:
+            if op not in ("=", "==", "!="):
+                return None
+            equal = series.astype(str).str.lower() == value.lower()
+            mask = ~equal if op == "!=" else equal
+        mask = mask.fillna(False).astype(bool)
+        step = f"{column} {op} {value}"
+        result.apply(result.view[mask.to_numpy()], step)
+        return step
+
+    return None
+
+
+class ResultStore:
+    """Per-user LRU of StoredResults, bounded by the deep memory usage of their frames"""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._results: "OrderedDict[str, StoredResult]" = OrderedDict()
+        self._sizes: Dict[str, int] = {}
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def put(self, user_id: str, result: StoredResult):
+        """Store a user's latest result, evicting least recently used results to stay in budget"""
+        self.discard(user_id)
+        size = result.nbytes
+        if size > self.max_bytes:
+            return
+        self._results[user_id] = result
+        self._sizes[user_id] = size
+        self.nbytes += size
+        self._evict()
+
+    def get(self, user_id: str) -> Optional[StoredResult]:
+        result = self._results.get(user_id)
+        if result is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._results.move_to_end(user_id)
+        return result
+
+    def update_size(self, user_id: str):
+        """Re-account a result after its view changed"""
+        result = self._results.get(user_id)
+        if result is None:
+            return
+        size = result.nbytes
+        self.nbytes += size - self._sizes[user_id]
+        self._sizes[user_id] = size
+        self._evict()
+
+    def discard(self, user_id: str):
+        if self._results.pop(user_id, None) is not None:
+            self.nbytes -= self._sizes.pop(user_id)
+
+    def _evict(self):
+        while self.nbytes > self.max_bytes and self._results:
+            user_id, _ = self._results.popitem(last=False)
+            self.nbytes -= self._sizes.pop(user_id)
+
+    def __len__(self):
+        return len(self._results)
@@ -0,0 +1,121 @@
+"""
+Sample Answers
+
+Pre-computed Genie answers for the configured SAMPLE_QUESTIONS. Nearly every new user
+clicks one of the sample questions shown in the welcome message, so the answers are
+refreshed in the background (at startup and then on a fixed interval) and served
+instantly instead of each click waiting on a cold Genie run.
+
+Refreshes run with bounded concurrency and yield to live traffic: a refresh waits while
+the bot is busy answering users, so background work never competes with them.
+"""
+
+import asyncio
+import json
+import logging
+import time
+from typing import Awaitable, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def question_key(question: str) -> str:
+    return " ".join(question.lower().split()).rstrip("?.! ")
+
+
+class SampleAnswer:
+    """The latest successful answer to a sample question"""
+
+    def __init__(self, question: str, answer: str, duration: float):
+        self.question = question
+        self.answer = answer
+        self.duration = duration
+        self.refreshed_at = time.time()
+
+    @property
+    def age_seconds(self) -> float:
+        return time.time() - self.refreshed_at
+
+
+class SampleAnswerCache:
+    """Background refresher and store of answers to the sample questions.
+
+    answer_fn(question) returns Genie's answer JSON. is_busy() reports whether live
+    questions are in flight; a refresh is deferred while it returns True, for at most
+    max_defer seconds.
+    """
+
+    def __init__(
+        self,
+        questions: List[str],
+        answer_fn: Callable[[str], Awaitable[str]],
+        refresh_interval: float,
+        max_age: float,
+        concurrency: int = 1,
+        is_busy: Optional[Callable[[], bool]] = None,
+        busy_poll_interval: float = 5,
+        max_defer: float = 300,
+    ):
+        self.questions = questions
+        self.answer_fn = answer_fn
+        self.refresh_interval = refresh_interval
+        self.max_age = max_age
+        self.is_busy = is_busy or (lambda: False)
+        self.busy_poll_interval = busy_poll_interval
+        self.max_defer = max_defer
+        self._semaphore = asyncio.Semaphore(max(1, concurrency))
+        self._answers: Dict[str, SampleAnswer] = {}
+        self.refreshes = 0
+        self.failures = 0
+        self.served = 0
+
+    def get(self, question: str) -> Optional[SampleAnswer]:
+        """Return the stored answer for a sample question if it is fresh enough to serve"""
+        answer = self._answers.get(question_key(question))
+        if answer is None or answer.age_seconds > self.max_age:
+            return None
+        self.served += 1
+        return answer
+
+    async def run(self):
+        """Refresh every sample question now and then on the refresh interval, until cancelled"""
+        while True:
+            await self.refresh_all()
+            await asyncio.sleep(self.refresh_interval)
+
+    async def refresh_all(self):
+        await asyncio.gather(*(self._refresh(question) for question in self.questions))
+
+    async def _refresh(self, question: str):
+        async with self._semaphore:
+            deferred_until = time.monotonic() + self.max_defer
+            while self.is_busy() and time.monotonic() < deferred_until:
+                await asyncio.sleep(self.busy_poll_interval)
+
+            started = time.monotonic()
+            try:
+                answer = await self.answer_fn(question)
+                parsed = json.loads(answer)
+                if "error" in parsed:
+                    raise RuntimeError(parsed["error"])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # Keep serving the previous answer until it ages out
+                self.failures += 1
+                logger.warning("Could not refresh sample question '%s': %s", question, e)
+                return
+
+            duration = time.monotonic() - started
+            self._answers[question_key(question)] = SampleAnswer(question, answer, duration)
+            self.refreshes += 1
+            logger.info("Refreshed sample question '%s' in %.1fs", question, duration)
+
+    def stats(self) -> Dict:
+        return {
+            "questions": len(self.questions),
+            "ready": sum(1 for answer in self._answers.values() if answer.age_seconds <= self.max_age),
+            "refreshes": self.refreshes,
+            "failures": self.failures,
+            "served": self.served,
+        }
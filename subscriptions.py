@@ -0,0 +1,366 @@
+"""
+Subscriptions
+
+Daily question subscriptions ("subscribe <question> daily at HH:MM") stored in SQLite and
+run by an in-process scheduler.
+
+Subscriptions due in the same window that ask the same question are coalesced into one
+Genie run whose answer is delivered to every subscriber. First-person questions ("my
+pipelines") are the exception: their answers depend on who asks, so they run once per
+subscriber, with that subscriber's identity. Each run is given a stable slot within the
+window before its due time (derived from a hash of the question, and of the user for
+first-person questions), so the 9 a.m. subscriptions are spread across the preceding
+window instead of all hitting the Genie space at once. Answers are therefore delivered
+on time or up to one window early, never late.
+Subscriptions whose deliveries keep failing (e.g. the bot was removed from the chat)
+are removed.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from datetime import date, datetime, timedelta, timezone
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from question_index import is_personal, question_tokens
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS subscriptions (
+    id INTEGER PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    user_name TEXT,
+    question TEXT NOT NULL,
+    time_of_day TEXT NOT NULL,
+    timezone TEXT NOT NULL,
+    reference TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    last_run_date TEXT,
+    user_email TEXT,
+    failures INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS subscriptions_user ON subscriptions (user_id);
+"""
+
+# Columns added after the first release, with their definitions, for existing databases
+MIGRATED_COLUMNS = {"user_email": "TEXT", "failures": "INTEGER NOT NULL DEFAULT 0"}
+
+
+def question_key(question: str) -> str:
+    return " ".join(question.lower().split()).rstrip("?.! ")
+
+
+def resolve_timezone(name: Optional[str]) -> ZoneInfo:
+    try:
+        return ZoneInfo(name or "UTC")
+    except (ZoneInfoNotFoundError, ValueError):
+        return ZoneInfo("UTC")
+
+
+class Subscription:
+    """A user's daily question, with the conversation reference used to deliver it"""
+
+    def __init__(
+        self,
+        id: int,
+        user_id: str,
+        user_name: str,
+        question: str,
+        time_of_day: str,
+        timezone_name: str,
+        reference: Dict,
+        created_at: str,
+        last_run_date: Optional[str] = None,
+        user_email: Optional[str] = None,
+        failures: int = 0,
+    ):
+        self.id = id
+        self.user_id = user_id
+        self.user_name = user_name
+        self.question = question
+        self.time_of_day = time_of_day
+        self.timezone_name = timezone_name
+        self.reference = reference
+        self.created_at = created_at
+        self.last_run_date = last_run_date
+        self.user_email = user_email
+        self.failures = failures  # Consecutive failed deliveries
+
+    def next_due(self) -> Tuple[datetime, date]:
+        """Return the next due time (UTC) that has not run yet, and its local date"""
+        tz = resolve_timezone(self.timezone_name)
+        hour, minute = (int(part) for part in self.time_of_day.split(":"))
+        if self.last_run_date:
+            local_date = date.fromisoformat(self.last_run_date) + timedelta(days=1)
+        else:
+            # The first run is the first occurrence after the subscription was created
+            created = datetime.fromisoformat(self.created_at).astimezone(tz)
+            local_date = created.date()
+            if (created.hour, created.minute) >= (hour, minute):
+                local_date += timedelta(days=1)
+        due = datetime(local_date.year, local_date.month, local_date.day, hour, minute, tzinfo=tz)
+        return due.astimezone(timezone.utc), local_date
+
+
+class SubscriptionStore:
+    """SQLite-backed subscriptions, mirrored in memory for the scheduler.
+
+    Methods block on SQLite; call them from an executor when on the event loop.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._subscriptions: Dict[int, Subscription] = {}
+
+    def load(self):
+        with self._lock:
+            conn = self._connection()
+            rows = conn.execute(
+                "SELECT id, user_id, user_name, question, time_of_day, timezone, reference, created_at, last_run_date, "
+                "user_email, failures FROM subscriptions"
+            ).fetchall()
+            self._subscriptions = {
+                row[0]: Subscription(*row[:6], json.loads(row[6]), *row[7:]) for row in rows
+            }
+        logger.info("Loaded %s subscriptions from %s", len(self._subscriptions), self.path)
+
+    def add(
+        self,
+        user_id: str,
+        user_name: str,
+        question: str,
+        time_of_day: str,
+        timezone_name: str,
+        reference: Dict,
+        user_email: Optional[str] = None,
+    ) -> Subscription:
+        created_at = datetime.now(timezone.utc).isoformat()
+        with self._lock:
+            cursor = self._connection().execute(
+                "INSERT INTO subscriptions (user_id, user_name, question, time_of_day, timezone, reference, created_at, user_email) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (user_id, user_name, question, time_of_day, timezone_name, json.dumps(reference), created_at, user_email),
+            )
+            subscription = Subscription(
+                cursor.lastrowid, user_id, user_name, question, time_of_day, timezone_name, reference, created_at,
+                user_email=user_email,
+            )
+            self._subscriptions[subscription.id] = subscription
+        return subscription
+
+    def remove(self, user_id: str, subscription_id: Optional[int] = None) -> int:
+        """Remove one of a user's subscriptions, or all of them when subscription_id is None"""
+        with self._lock:
+            ids = [
+                sub.id for sub in self._subscriptions.values()
+                if sub.user_id == user_id and subscription_id in (None, sub.id)
+            ]
+            self._connection().executemany("DELETE FROM subscriptions WHERE id = ?", [(sub_id,) for sub_id in ids])
+            for sub_id in ids:
+                del self._subscriptions[sub_id]
+        return len(ids)
+
+    def mark_run(self, subscription_ids: List[int], run_date: date):
+        with self._lock:
+            self._connection().executemany(
+                "UPDATE subscriptions SET last_run_date = ? WHERE id = ?",
+                [(run_date.isoformat(), sub_id) for sub_id in subscription_ids],
+            )
+            for sub_id in subscription_ids:
+                if sub_id in self._subscriptions:
+                    self._subscriptions[sub_id].last_run_date = run_date.isoformat()
+
+    def record_delivery(self, subscription_id: int, run_date: date, delivered: bool, max_failures: int) -> bool:
+        """Mark a run as done and count consecutive failed deliveries.
+
+        Returns True if the subscription was removed after max_failures failures in a row.
+        """
+        with self._lock:
+            subscription = self._subscriptions.get(subscription_id)
+            if subscription is None:
+                return False
+            failures = 0 if delivered else subscription.failures + 1
+            conn = self._connection()
+            if max_failures > 0 and failures >= max_failures:
+                conn.execute("DELETE FROM subscriptions WHERE id = ?", (subscription_id,))
+                del self._subscriptions[subscription_id]
+                return True
+            conn.execute(
+                "UPDATE subscriptions SET last_run_date = ?, failures = ? WHERE id = ?",
+                (run_date.isoformat(), failures, subscription_id),
+            )
+            subscription.last_run_date = run_date.isoformat()
+            subscription.failures = failures
+            return False
+
+    def for_user(self, user_id: str) -> List[Subscription]:
+        with self._lock:
+            subscriptions = [sub for sub in self._subscriptions.values() if sub.user_id == user_id]
+        return sorted(subscriptions, key=lambda sub: (sub.time_of_day, sub.id))
+
+    def all(self) -> List[Subscription]:
+        with self._lock:
+            return list(self._subscriptions.values())
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            self._conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(SCHEMA)
+            existing = {row[1] for row in self._conn.execute("PRAGMA table_info(subscriptions)")}
+            for column, definition in MIGRATED_COLUMNS.items():
+                if column not in existing:
+                    self._conn.execute(f"ALTER TABLE subscriptions ADD COLUMN {column} {definition}")
+        return self._conn
+
+
+class SubscriptionScheduler:
+    """Runs due subscriptions, one Genie call per question per window.
+
+    answer_fn(question, subscriber) returns Genie's answer JSON; subscriber is the
+    Subscription to ask as for a first-person question, or None for a shared run.
+    deliver_fn(subscription, answer) sends it to that subscriber. Runs more than
+    missed_grace seconds past due (e.g. while the bot was down) are skipped rather than
+    delivered late, and a subscription is removed after max_failures failed deliveries
+    in a row.
+    """
+
+    def __init__(
+        self,
+        store: SubscriptionStore,
+        answer_fn: Callable[[str, Optional[Subscription]], Awaitable[str]],
+        deliver_fn: Callable[[Subscription, str], Awaitable[None]],
+        window: float = 900,
+        concurrency: int = 2,
+        tick_interval: float = 30,
+        missed_grace: float = 7200,
+        max_failures: int = 5,
+    ):
+        self.store = store
+        self.answer_fn = answer_fn
+        self.deliver_fn = deliver_fn
+        self.window = max(1.0, window)
+        self.tick_interval = tick_interval
+        self.missed_grace = missed_grace
+        self.max_failures = max_failures
+        self._semaphore = asyncio.Semaphore(max(1, concurrency))
+        self._running: Dict[Tuple[Optional[str], str, int], asyncio.Task] = {}
+        self.genie_runs = 0
+        self.deliveries = 0
+        self.failed_deliveries = 0
+        self.removed = 0
+
+    @staticmethod
+    def owner(subscription: Subscription) -> Optional[str]:
+        """The user a subscription's run is asked as, or None if it is shared"""
+        return subscription.user_id if is_personal(question_tokens(subscription.question)) else None
+
+    def run_at(self, subscription: Subscription, due: datetime) -> datetime:
+        """Stable slot for a question (and user, if first-person) within the window before its due time"""
+        owner = self.owner(subscription)
+        slot_key = question_key(subscription.question) if owner is None else f"{owner}\n{question_key(subscription.question)}"
+        offset = (zlib.crc32(slot_key.encode("utf-8")) % 1000) / 1000 * self.window
+        return due - timedelta(seconds=self.window - offset)
+
+    def due_groups(self) -> Dict[Tuple[Optional[str], str, int], List[Tuple[Subscription, datetime, date]]]:
+        """Group subscriptions by question and due window, and by user for first-person questions"""
+        groups: Dict[Tuple[Optional[str], str, int], List[Tuple[Subscription, datetime, date]]] = {}
+        for subscription in self.store.all():
+            due, local_date = subscription.next_due()
+            bucket = int(due.timestamp() // self.window)
+            groups.setdefault((self.owner(subscription), question_key(subscription.question), bucket), []).append(
+                (subscription, due, local_date)
+            )
+        return groups
+
+    async def run(self):
+        """Check for due subscriptions every tick_interval seconds, until cancelled"""
+        try:
+            while True:
+                try:
+                    await self.tick(datetime.now(timezone.utc))
+                except Exception as e:
+                    logger.error("Subscription scheduler tick failed: %s", e)
+                await asyncio.sleep(self.tick_interval)
+        finally:
+            for task in self._running.values():
+                task.cancel()
+
+    async def tick(self, now: datetime):
+        loop = asyncio.get_running_loop()
+        for key, members in self.due_groups().items():
+            if key in self._running:
+                continue
+            earliest_due = min(due for _, due, _ in members)
+            if (now - earliest_due).total_seconds() > self.missed_grace:
+                logger.warning("Skipping missed subscription run '%s' due %s", members[0][0].question, earliest_due.isoformat())
+                for subscription, _, local_date in members:
+                    await loop.run_in_executor(None, self.store.mark_run, [subscription.id], local_date)
+                continue
+            if now >= self.run_at(members[0][0], earliest_due):
+                task = asyncio.create_task(self._run_group(members, key[0] is not None))
+                self._running[key] = task
+                task.add_done_callback(lambda _, key=key: self._running.pop(key, None))
+
+    async def _run_group(self, members: List[Tuple[Subscription, datetime, date]], personal: bool):
+        question = members[0][0].question
+        async with self._semaphore:
+            started = time.monotonic()
+            try:
+                answer = await self.answer_fn(question, members[0][0] if personal else None)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error("Subscription run for '%s' failed: %s", question, e)
+                answer = json.dumps({"error": "❌ Could not run your subscribed question this time."})
+            self.genie_runs += 1
+            logger.info(
+                "Ran subscribed question '%s' for %s subscribers in %.1fs",
+                question, len(members), time.monotonic() - started,
+            )
+
+        loop = asyncio.get_running_loop()
+        for subscription, _, local_date in members:
+            delivered = False
+            try:
+                await self.deliver_fn(subscription, answer)
+                self.deliveries += 1
+                delivered = True
+            except Exception as e:
+                self.failed_deliveries += 1
+                logger.error("Could not deliver subscription %s to %s: %s", subscription.id, subscription.user_id, e)
+            removed = await loop.run_in_executor(
+                None, self.store.record_delivery, subscription.id, local_date, delivered, self.max_failures
+            )
+            if removed:
+                self.removed += 1
+                logger.warning(
+                    "Removed subscription %s for %s after %s failed deliveries in a row",
+                    subscription.id, subscription.user_id, self.max_failures,
+                )
+
+    def stats(self) -> Dict:
+        return {
+            "subscriptions": len(self.store.all()),
+            "running": len(self._running),
+            "genie_runs": self.genie_runs,
+            "deliveries": self.deliveries,
+            "failed_deliveries": self.failed_deliveries,
+            "removed": self.removed,
+        }
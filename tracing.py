@@ -0,0 +1,275 @@
+"""
+Tracing
+
+Lightweight per-turn tracing. Each Bot Framework turn is a root span keyed by its
+activity ID, with child spans for the Databricks and Bot Connector calls made while
+handling it, so a slow answer can be followed from the incoming activity through each
+Genie call to the reply.
+
+Sampling is decided once per turn (head-based): an unsampled turn costs a random number
+and a context variable write, and its child spans are a shared no-op. Finished spans
+are handed to a background thread that writes them as JSON lines or posts them to an
+OpenTelemetry collector over OTLP/HTTP (JSON encoding), so exporting never blocks the
+event loop. Spans are dropped rather than queued without bound if the exporter falls
+behind.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import queue
+import random
+import threading
+import time
+from contextvars import ContextVar
+from typing import Dict, List, Optional
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+_current_span: ContextVar[Optional["Span"]] = ContextVar("current_span", default=None)
+
+
+class Span:
+    """A timed operation within a trace"""
+
+    __slots__ = ("trace_id", "span_id", "parent_id", "name", "start_ns", "end_ns", "attributes", "error", "_tracer", "_token")
+    sampled = True
+
+    def __init__(self, tracer: "Tracer", name: str, trace_id: str, parent_id: Optional[str], attributes: Optional[Dict]):
+        self._tracer = tracer
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.attributes = {key: value for key, value in (attributes or {}).items() if value is not None}
+        self.error: Optional[str] = None
+        self._token = None
+
+    def set_attribute(self, key: str, value):
+        if value is not None:
+            self.attributes[key] = value
+
+    def record_error(self, error: BaseException):
+        self.error = f"{type(error).__name__}: {error}"
+
+    def end(self):
+        if self.end_ns is None:
+            self.end_ns = time.time_ns()
+            self._tracer._export(self)
+
+    def __enter__(self) -> "Span":
+        self._token = _current_span.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc is not None:
+            self.record_error(exc)
+        self.end()
+        _current_span.reset(self._token)
+        return False
+
+    def to_dict(self) -> Dict:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start_unix_nano": self.start_ns,
+            "duration_ms": round((self.end_ns - self.start_ns) / 1e6, 3),
+            "attributes": self.attributes,
+            "error": self.error,
+        }
+
+
+class _NoopSpan:
+    """Stands in for spans of unsampled traces, or when tracing is off"""
+
+    __slots__ = ("_token",)
+    sampled = False
+    trace_id = None
+
+    def __init__(self):
+        self._token = None
+
+    def set_attribute(self, key: str, value):
+        pass
+
+    def record_error(self, error: BaseException):
+        pass
+
+    def end(self):
+        pass
+
+    def __enter__(self) -> "_NoopSpan":
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+class _UnsampledRoot(_NoopSpan):
+    """Marks the current turn as unsampled so its child spans are skipped"""
+
+    __slots__ = ()
+
+    def __enter__(self) -> "_UnsampledRoot":
+        self._token = _current_span.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        _current_span.reset(self._token)
+        return False
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class Tracer:
+    """Creates spans and decides per trace whether it is sampled"""
+
+    def __init__(self, exporter: Optional["SpanExporter"], sample_rate: float = 0.1):
+        self.exporter = exporter
+        self.sample_rate = sample_rate if exporter is not None else 0.0
+
+    def start_trace(self, name: str, key: Optional[str] = None, attributes: Optional[Dict] = None):
+        """Start a root span. With a key (e.g. the activity ID) the trace ID is derived from
+        it, so the trace for an activity can be found from its ID."""
+        if self.sample_rate <= 0 or random.random() >= self.sample_rate:
+            return _UnsampledRoot()
+        trace_id = hashlib.md5(key.encode("utf-8")).hexdigest() if key else os.urandom(16).hex()
+        return Span(self, name, trace_id, None, attributes)
+
+    def start_span(self, name: str, attributes: Optional[Dict] = None):
+        """Start a child of the current span; a no-op outside a sampled trace"""
+        parent = _current_span.get()
+        if parent is None or not parent.sampled:
+            return NOOP_SPAN
+        return Span(self, name, parent.trace_id, parent.span_id, attributes)
+
+    @staticmethod
+    def current_span():
+        return _current_span.get() or NOOP_SPAN
+
+    def _export(self, span: Span):
+        if self.exporter is not None:
+            self.exporter.export(span)
+
+    def close(self):
+        if self.exporter is not None:
+            self.exporter.close()
+
+
+class SpanExporter:
+    """Exports finished spans from a background thread, in batches.
+
+    kind is "jsonl" (one JSON object per line, appended to path) or "otlp" (OTLP/HTTP JSON
+    posted to endpoint).
+    """
+
+    def __init__(
+        self,
+        kind: str,
+        path: str = "traces.jsonl",
+        endpoint: str = "http://localhost:4318/v1/traces",
+        service_name: str = "genie-bot",
+        batch_size: int = 256,
+        flush_interval: float = 2.0,
+        max_queue: int = 10000,
+    ):
+        if kind not in ("jsonl", "otlp"):
+            raise ValueError(f"Unknown trace exporter '{kind}'")
+        self.kind = kind
+        self.path = path
+        self.endpoint = endpoint
+        self.service_name = service_name
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue: "queue.Queue[Optional[Span]]" = queue.Queue(maxsize=max_queue)
+        self.exported = 0
+        self.dropped = 0
+        self._thread = threading.Thread(target=self._run, name="span-exporter", daemon=True)
+        self._thread.start()
+
+    def export(self, span: Span):
+        try:
+            self._queue.put_nowait(span)
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            batch: List[Span] = []
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                try:
+                    span = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if span is None:
+                    stopping = True
+                    break
+                batch.append(span)
+            if batch:
+                try:
+                    self._write(batch)
+                    self.exported += len(batch)
+                except Exception as e:
+                    self.dropped += len(batch)
+                    logger.warning("Could not export %s spans: %s", len(batch), e)
+
+    def _write(self, batch: List[Span]):
+        if self.kind == "jsonl":
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write("".join(json.dumps(span.to_dict(), default=str) + "\n" for span in batch))
+            return
+        response = requests.post(self.endpoint, json=self._otlp_payload(batch), timeout=5)
+        response.raise_for_status()
+
+    def _otlp_payload(self, batch: List[Span]) -> Dict:
+        def attribute(key: str, value) -> Dict:
+            if isinstance(value, bool):
+                return {"key": key, "value": {"boolValue": value}}
+            if isinstance(value, int):
+                return {"key": key, "value": {"intValue": str(value)}}
+            if isinstance(value, float):
+                return {"key": key, "value": {"doubleValue": value}}
+            return {"key": key, "value": {"stringValue": str(value)}}
+
+        spans = []
+        for span in batch:
+            otlp_span = {
+                "traceId": span.trace_id,
+                "spanId": span.span_id,
+                "name": span.name,
+                "kind": 2 if span.parent_id is None else 3,  # SERVER for turns, CLIENT for calls
+                "startTimeUnixNano": str(span.start_ns),
+                "endTimeUnixNano": str(span.end_ns),
+                "attributes": [attribute(key, value) for key, value in span.attributes.items()],
+                "status": {"code": 2, "message": span.error} if span.error else {"code": 1},
+            }
+            if span.parent_id:
+                otlp_span["parentSpanId"] = span.parent_id
+            spans.append(otlp_span)
+        return {
+            "resourceSpans": [{
+                "resource": {"attributes": [attribute("service.name", self.service_name)]},
+                "scopeSpans": [{"scope": {"name": "genie-bot"}, "spans": spans}],
+            }]
+        }
+
+    def close(self, timeout: float = 5.0):
+        """Flush queued spans and stop the export thread"""
+        try:
+            self._queue.put(None, timeout=timeout)
+        except queue.Full:
+            pass
+        self._thread.join(timeout)
+
+    def stats(self) -> Dict:
+        return {"exported": self.exported, "dropped": self.dropped, "queued": self._queue.qsize()}
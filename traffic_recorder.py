@@ -0,0 +1,305 @@
+"""
+Traffic Recorder
+
+Opt-in recording of production traffic for offline, repeatable profiling. Incoming
+activities and every Databricks SDK call made while answering them (arguments, latency,
+and the response or error class) are written to a cassette that benchmarks/replay.py
+plays back through the bot against local stand-ins.
+
+A cassette is gzip-compressed JSON lines: a header per recording session followed by
+"activity" and "call" entries, each stamped with its wall-clock time. Email addresses are
+replaced everywhere (activities, questions, Genie messages and query results) with
+pseudonyms salted per session, so one person keeps the same pseudonym within a
+recording but addresses cannot be recovered by hashing guesses. Activities are
+scrubbed of the other identifying fields Teams sends the same way: user, bot and
+mentioned names, user and AAD object IDs, tenant IDs, team, channel and conversation
+names, and "<at>Name</at>" mention text. Team and channel IDs are kept, since Genie
+routing is configured by them.
+
+Recording is done from a background thread: the bot only queues references to the
+activity body and SDK response objects, and converting, scrubbing, serializing and
+compressing happen off the event loop. Entries are dropped rather than queued without
+bound if the writer falls behind, and recording stops once the cassette reaches its
+size limit.
+
+Offline usage:
+python3 traffic_recorder.py summary --path traffic.jsonl.gz
+"""
+
+import argparse
+import gzip
+import hashlib
+import json
+import logging
+import os
+import queue
+import re
+import threading
+import time
+import zlib
+from typing import Dict, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+CASSETTE_VERSION = 1
+EMAIL_PATTERN = re.compile(r"[A-Za-z0-9._%+-]+@[A-Za-z0-9-]+(?:\.[A-Za-z0-9-]+)*\.[A-Za-z]{2,}")
+MENTION_PATTERN = re.compile(r"<at>(.*?)</at>")
+
+# Identifying activity fields, as (path, pseudonym prefix); every occurrence of their values is replaced
+ACTIVITY_IDENTIFIERS = (
+    (("from", "id"), "user-"),
+    (("from", "name"), "User "),
+    (("from", "aadObjectId"), "aad-"),
+    (("recipient", "name"), "Bot "),
+    (("recipient", "aadObjectId"), "aad-"),
+    (("conversation", "tenantId"), "tenant-"),
+    (("conversation", "name"), "Conversation "),
+    (("channelData", "tenant", "id"), "tenant-"),
+    (("channelData", "team", "name"), "Team "),
+    (("channelData", "team", "aadGroupId"), "aad-"),
+    (("channelData", "channel", "name"), "Channel "),
+)
+
+
+class Scrubber:
+    """Replaces email addresses and names with stable, salted pseudonyms"""
+
+    def __init__(self, salt: Optional[bytes] = None):
+        self.salt = salt or os.urandom(16)
+
+    def pseudonym(self, value: str) -> str:
+        return hashlib.blake2b(value.lower().encode("utf-8"), key=self.salt, digest_size=5).hexdigest()
+
+    def _email(self, match: re.Match) -> str:
+        return f"user-{self.pseudonym(match.group(0))}@example.invalid"
+
+    def _mention(self, match: re.Match) -> str:
+        return f"<at>User {self.pseudonym(match.group(1))}</at>"
+
+    def scrub(self, value):
+        """A copy of a JSON-like value with every email address and "<at>Name</at>" mention replaced"""
+        if isinstance(value, str):
+            if "<at>" in value:
+                value = MENTION_PATTERN.sub(self._mention, value)
+            return EMAIL_PATTERN.sub(self._email, value) if "@" in value else value
+        if isinstance(value, dict):
+            return {key: self.scrub(item) for key, item in value.items()}
+        if isinstance(value, (list, tuple)):
+            return [self.scrub(item) for item in value]
+        return value
+
+    def scrub_activity(self, activity: Dict) -> Dict:
+        """A copy of an activity with emails, names and user and tenant IDs pseudonymized.
+
+        A value is replaced wherever it appears (e.g. the sender's ID in a card action's
+        data), so references within the activity stay consistent.
+        """
+        replacements: Dict[str, str] = {}
+        for path, prefix in ACTIVITY_IDENTIFIERS:
+            value = activity
+            for key in path:
+                value = value.get(key) if isinstance(value, dict) else None
+            if isinstance(value, str) and value:
+                replacements[value] = f"{prefix}{self.pseudonym(value)}"
+        for entity in activity.get("entities") or []:
+            mentioned = entity.get("mentioned") if isinstance(entity, dict) else None
+            if isinstance(mentioned, dict):
+                for key, prefix in (("id", "user-"), ("name", "User "), ("aadObjectId", "aad-")):
+                    if isinstance(mentioned.get(key), str) and mentioned[key]:
+                        replacements[mentioned[key]] = f"{prefix}{self.pseudonym(mentioned[key])}"
+        return self._replace(self.scrub(activity), replacements)
+
+    def _replace(self, value, replacements: Dict[str, str]):
+        if isinstance(value, str):
+            return replacements.get(value, value)
+        if isinstance(value, dict):
+            return {key: self._replace(item, replacements) for key, item in value.items()}
+        if isinstance(value, list):
+            return [self._replace(item, replacements) for item in value]
+        return value
+
+
+def response_dict(response) -> Optional[Dict]:
+    """REST representation of a Databricks SDK response (long-running waiters unwrapped)"""
+    if response is None:
+        return None
+    if hasattr(response, "bind") and hasattr(response, "response"):
+        response = response.response
+    if hasattr(response, "as_dict"):
+        return response.as_dict()
+    if isinstance(response, dict):
+        return response
+    return {"value": str(response)}
+
+
+class TrafficRecorder:
+    """Writes activities and Databricks calls to a gzip JSON lines cassette from a background thread"""
+
+    def __init__(
+        self,
+        path: str = "traffic.jsonl.gz",
+        max_bytes: int = 100 * 1024 * 1024,
+        batch_size: int = 256,
+        flush_interval: float = 2.0,
+        max_queue: int = 10000,
+    ):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.scrubber = Scrubber()
+        self._queue: "queue.Queue[Optional[tuple]]" = queue.Queue(maxsize=max_queue)
+        self.recorded = 0
+        self.dropped = 0
+        self.bytes_written = 0
+        self.full = False
+        self._thread = threading.Thread(target=self._run, name="traffic-recorder", daemon=True)
+        self._thread.start()
+
+    def record_activity(self, body: Dict):
+        """Queue an incoming activity, as the JSON body posted to /api/messages"""
+        self._put(("activity", time.time(), body))
+
+    def record_call(self, call: str, args: tuple, seconds: float, response=None, error_class: Optional[str] = None, error: Optional[BaseException] = None):
+        """Queue a Databricks SDK call with its response, or the class of the error it failed with"""
+        self._put(("call", time.time(), call, args, seconds, response, error_class, str(error) if error is not None else None))
+
+    def _put(self, entry: tuple):
+        if self.full:
+            return
+        try:
+            self._queue.put_nowait(entry)
+        except queue.Full:
+            self.dropped += 1
+
+    def _entry(self, item: tuple) -> Dict:
+        if item[0] == "activity":
+            _, ts, body = item
+            return {"kind": "activity", "ts": round(ts, 3), "activity": self.scrubber.scrub_activity(body)}
+        _, ts, call, args, seconds, response, error_class, error = item
+        entry = {"kind": "call", "ts": round(ts, 3), "call": call, "args": self.scrubber.scrub(list(args)), "seconds": round(seconds, 4)}
+        if error_class is not None:
+            entry["error_class"] = error_class
+            entry["error"] = self.scrubber.scrub(error)
+        else:
+            entry["response"] = self.scrubber.scrub(response_dict(response))
+        return entry
+
+    def _run(self):
+        try:
+            raw = open(self.path, "ab")
+        except OSError as e:
+            logger.error("Cannot open traffic cassette %s, recording disabled: %s", self.path, e)
+            self.full = True
+            return
+        # Each session is its own gzip member; readers see the members as one stream
+        cassette = gzip.GzipFile(fileobj=raw, mode="wb")
+        header = {"kind": "header", "version": CASSETTE_VERSION, "ts": round(time.time(), 3)}
+        cassette.write((json.dumps(header, separators=(",", ":")) + "\n").encode("utf-8"))
+        stopping = False
+        try:
+            while not stopping:
+                batch: List[tuple] = []
+                deadline = time.monotonic() + self.flush_interval
+                while len(batch) < self.batch_size:
+                    try:
+                        item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                    except queue.Empty:
+                        break
+                    if item is None:
+                        stopping = True
+                        break
+                    batch.append(item)
+                if not batch or self.full:
+                    continue
+                lines = []
+                for item in batch:
+                    try:
+                        lines.append(json.dumps(self._entry(item), separators=(",", ":"), default=str))
+                    except Exception as e:
+                        self.dropped += 1
+                        logger.warning("Could not record %s entry: %s", item[0], e)
+                if not lines:
+                    continue
+                try:
+                    cassette.write(("\n".join(lines) + "\n").encode("utf-8"))
+                    # A sync flush keeps everything written so far readable if the process dies
+                    cassette.flush(zlib.Z_SYNC_FLUSH)
+                    self.recorded += len(lines)
+                except OSError as e:
+                    self.dropped += len(lines)
+                    logger.warning("Could not write %s traffic entries: %s", len(lines), e)
+                self.bytes_written = raw.tell()
+                if self.bytes_written >= self.max_bytes:
+                    self.full = True
+                    logger.warning("Traffic cassette %s reached %s bytes; recording stopped", self.path, self.bytes_written)
+        finally:
+            cassette.close()
+            raw.close()
+
+    def close(self, timeout: float = 5.0):
+        """Write queued entries, finish the gzip member and stop the writer thread"""
+        try:
+            self._queue.put(None, timeout=timeout)
+        except queue.Full:
+            pass
+        self._thread.join(timeout)
+
+    def stats(self) -> Dict:
+        return {
+            "path": self.path,
+            "recorded": self.recorded,
+            "dropped": self.dropped,
+            "queued": self._queue.qsize(),
+            "bytes": self.bytes_written,
+            "full": self.full,
+        }
+
+
+def read_cassette(path: str) -> Iterator[Dict]:
+    """Entries of a cassette in recorded order, across all sessions; a truncated tail is ignored"""
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        try:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+        except (EOFError, json.JSONDecodeError):
+            # The process was stopped without closing the cassette; everything flushed is usable
+            return
+
+
+def summarize(path: str) -> Dict:
+    """Sessions, activities by type and calls by name in a cassette"""
+    summary: Dict = {"sessions": 0, "activities": {}, "calls": {}, "errors": {}, "first_ts": None, "last_ts": None}
+    for entry in read_cassette(path):
+        if entry["kind"] == "header":
+            summary["sessions"] += 1
+            continue
+        summary["first_ts"] = summary["first_ts"] or entry["ts"]
+        summary["last_ts"] = entry["ts"]
+        if entry["kind"] == "activity":
+            activity_type = entry["activity"].get("type", "unknown")
+            summary["activities"][activity_type] = summary["activities"].get(activity_type, 0) + 1
+        else:
+            summary["calls"][entry["call"]] = summary["calls"].get(entry["call"], 0) + 1
+            if "error_class" in entry:
+                summary["errors"][entry["error_class"]] = summary["errors"].get(entry["error_class"], 0) + 1
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect traffic cassettes")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    summary_parser = subparsers.add_parser("summary", help="print what a cassette contains")
+    summary_parser.add_argument("--path", default="traffic.jsonl.gz")
+    args = parser.parse_args()
+
+    if args.command == "summary":
+        summary = summarize(args.path)
+        if summary["first_ts"] is not None:
+            summary["seconds"] = round(summary["last_ts"] - summary["first_ts"], 1)
+        print(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    main()